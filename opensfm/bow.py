@@ -6,19 +6,52 @@ from __future__ import unicode_literals
 import os.path
 import numpy as np
 import cv2
+import scipy.sparse
+from repoze.lru import LRUCache
+
 from opensfm import context
 
 
 class BagOfWords:
-    def __init__(self, words, frequencies):
+    def __init__(self, words, frequencies, index_file=None):
+        """Vocabulary of visual words.
+
+        The FLANN index over the words is only built when mapping
+        descriptors to words. If index_file is given, the index is
+        loaded from it, or saved to it once built.
+        """
         self.words = words
         self.frequencies = frequencies
         self.weights = np.log(frequencies.sum() / frequencies)
-        FLANN_INDEX_KDTREE = 1
-        flann_params = dict(algorithm=FLANN_INDEX_KDTREE,
-                            trees=8,
-                            checks=300)
-        self.index = context.flann_Index(words, flann_params)
+        self.index_file = index_file
+        self._index = None
+
+    @property
+    def index(self):
+        if self._index is None:
+            if self.index_file and os.path.isfile(self.index_file):
+                self._index = context.flann_Index()
+                if not self._index.load(self.words, self.index_file):
+                    raise IOError('Unable to load FLANN index {}'.format(
+                        self.index_file))
+            else:
+                FLANN_INDEX_KDTREE = 1
+                flann_params = dict(algorithm=FLANN_INDEX_KDTREE,
+                                    trees=8,
+                                    checks=300)
+                self._index = context.flann_Index(self.words, flann_params)
+                if self.index_file:
+                    self._save_index()
+        return self._index
+
+    def _save_index(self):
+        """Save the index, atomically for concurrent processes."""
+        dirname = os.path.dirname(self.index_file)
+        if dirname and not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        tmp_file = '{}.{}.tmp'.format(self.index_file, os.getpid())
+        self._index.save(tmp_file)
+        os.rename(tmp_file, self.index_file)
 
     def map_to_words(self, descriptors, k, matcher_type='FLANN'):
         if matcher_type == 'FLANN':
@@ -43,6 +76,75 @@ class BagOfWords:
         return np.fabs(h1 - h2).sum()
 
 
+class BowDatabase(object):
+    """BoW histograms of images, with their inverted file.
+
+    Histograms are the rows of a CSR matrix, and the inverted file
+    listing the images of each word is the same matrix in CSC format.
+    Each image also has a signature of the words it was computed
+    from, to detect outdated histograms.
+    """
+
+    def __init__(self, bow_file, num_words):
+        self.bow_file = bow_file
+        self.images = []
+        self.signatures = []
+        self.histograms = scipy.sparse.csr_matrix((0, num_words))
+        self.image_index = {}
+
+    def signature(self, image):
+        """Signature of the histogram of an image, or None if missing."""
+        if image not in self.image_index:
+            return None
+        return self.signatures[self.image_index[image]]
+
+    def update(self, histograms, signatures):
+        """Add or replace the histograms of images.
+
+        Args:
+            histograms: dict of image -> dense histogram, or None for
+                images without enough words
+            signatures: dict of image -> signature
+        """
+        num_words = self.histograms.shape[1]
+        keep = [i for i, im in enumerate(self.images) if im not in histograms]
+        rows = [scipy.sparse.csr_matrix((1, num_words)) if h is None
+                else scipy.sparse.csr_matrix(h) for h in histograms.values()]
+        self.histograms = scipy.sparse.vstack(
+            [self.histograms[keep]] + rows, format='csr')
+        self.images = [self.images[i] for i in keep] + list(histograms)
+        self.signatures = [self.signatures[i] for i in keep] +\
+            [signatures[im] for im in histograms]
+        self.image_index = {im: i for i, im in enumerate(self.images)}
+
+    def inverted_file(self, rows):
+        """Inverted file of a subset of the images.
+
+        Returns a CSC matrix whose column of a word lists the images
+        having that word, as positions in rows, with their weights.
+        """
+        return self.histograms[rows].tocsc()
+
+
+def save_bow_database(filepath, database):
+    h = database.histograms
+    np.savez(filepath, bow_file=database.bow_file,
+             images=np.array(database.images),
+             signatures=np.array(database.signatures),
+             data=h.data, indices=h.indices, indptr=h.indptr, shape=h.shape)
+
+
+def load_bow_database(filepath):
+    with np.load(filepath) as s:
+        database = BowDatabase(str(s['bow_file']), s['shape'][1])
+        database.images = [str(im) for im in s['images']]
+        database.signatures = [str(sig) for sig in s['signatures']]
+        database.histograms = scipy.sparse.csr_matrix(
+            (s['data'], s['indices'], s['indptr']), shape=tuple(s['shape']))
+    database.image_index = {im: i for i, im in enumerate(database.images)}
+    return database
+
+
 def load_bow_words_and_frequencies(config):
     if config['bow_file'] == 'bow_hahog_root_uchar_10000.npz':
         assert config['feature_type'] == 'HAHOG'
@@ -65,6 +167,15 @@ def load_vlad_words_and_frequencies(config):
     return vlad['words'], vlad['frequencies']
 
 
-def load_bows(config):
-    words, frequencies = load_bow_words_and_frequencies(config)
-    return BagOfWords(words, frequencies)
+def load_bows(config, index_file=None):
+    """Load the BoW vocabulary, once per process."""
+    key = (config['bow_file'], index_file)
+    bows = _bows_cache.get(key)
+    if bows is None:
+        words, frequencies = load_bow_words_and_frequencies(config)
+        bows = BagOfWords(words, frequencies, index_file)
+        _bows_cache.put(key, bows)
+    return bows
+
+
+_bows_cache = LRUCache(1)
@@ -24,8 +24,8 @@ class Command:
     def run(self, args):
         start = time.time()
         data = dataset.DataSet(args.dataset)
-        tracks_manager = data.load_tracks_manager()
-        graph = tracking.as_graph(tracks_manager)
+        tracks_manager = data.load_read_only_tracks_manager()
+        graph = tracking.as_inliers_graph(tracks_manager)
         reconstructions = data.load_reconstruction(args.input)
         camera_priors = data.load_camera_models()
         gcp = data.load_ground_control_points()
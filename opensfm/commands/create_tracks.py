@@ -15,17 +15,34 @@ class Command:
 
     def add_arguments(self, parser):
         parser.add_argument('dataset', help='dataset to process')
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='add the images missing from the existing tracks, '
+                 'keeping existing tracks')
 
     def run(self, args):
         data = dataset.DataSet(args.dataset)
 
         start = timer()
-        features, colors = tracking.load_features(data, data.images())
-        features_end = timer()
-        matches = tracking.load_matches(data, data.images())
-        matches_end = timer()
-        tracks_manager = tracking.create_tracks_manager(features, colors, matches,
-                                                        data.config)
+        if args.incremental and data.tracks_exists():
+            features_end = matches_end = start
+            tracks_manager = data.load_tracks_manager()
+            shots = set(tracks_manager.get_shot_ids())
+            new_images = [im for im in data.images() if im not in shots]
+            tracking.update_tracks_manager(
+                tracks_manager, data, data.images(), new_images, data.config)
+        elif data.config['tracks_streaming']:
+            features_end = matches_end = start
+            tracks_manager = tracking.create_tracks_manager_streaming(
+                data, data.images(), data.config)
+        else:
+            features, colors = tracking.load_features(data, data.images())
+            features_end = timer()
+            matches = tracking.load_matches(data, data.images())
+            matches_end = timer()
+            tracks_manager = tracking.create_tracks_manager(
+                features, colors, matches, data.config)
         tracks_end = timer()
         data.save_tracks_manager(tracks_manager)
         end = timer()
@@ -3,7 +3,6 @@ from timeit import default_timer as timer
 
 import numpy as np
 
-from opensfm import bow
 from opensfm import dataset
 from opensfm import features
 from opensfm import io
@@ -59,10 +58,13 @@ def detect(args):
     need_words = data.config['matcher_type'] == 'WORDS' or data.config['matching_bow_neighbors'] > 0
     has_words = not need_words or data.words_exist(image)
     has_features = data.features_exist(image)
+    need_flann = data.config['matcher_type'] == 'FLANN' and data.config['flann_persist_index']
 
     if has_features and has_words:
         logger.info('Skip recomputing {} features for image {}'.format(
             data.feature_type().upper(), image))
+        if need_flann and not data.flann_index_exists(image):
+            save_flann_index(data, image)
         return
 
     logger.info('Extracting {} features for image {}'.format(
@@ -91,12 +93,15 @@ def detect(args):
     data.save_features(image, p_sorted, f_sorted, c_sorted)
 
     if need_words:
-        bows = bow.load_bows(data.config)
+        bows = data.load_bows()
         n_closest = data.config['bow_words_to_match']
         closest_words = bows.map_to_words(
             f_sorted, n_closest, data.config['bow_matcher_type'])
         data.save_words(image, closest_words)
 
+    if need_flann:
+        save_flann_index(data, image)
+
     end = timer()
     report = {
         "image": image,
@@ -104,3 +109,11 @@ def detect(args):
         "wall_time": end - start,
     }
     data.save_report(io.json_dumps(report), 'features/{}.json'.format(image))
+
+
+def save_flann_index(data, image):
+    """Build the FLANN index of an image from its saved features."""
+    logger.info('Building FLANN index for image {}'.format(image))
+    _, descriptors, _ = data.load_features(image)
+    index = features.build_flann_index(descriptors, data.config)
+    data.save_flann_index(image, index)
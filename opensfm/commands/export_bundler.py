@@ -36,7 +36,7 @@ class Command:
             images = reconstructions[0].shots.keys()
         else:
             reconstructions = data.load_reconstruction()
-            track_manager = data.load_tracks_manager()
+            track_manager = data.load_read_only_tracks_manager()
             images = data.images()
 
         io.export_bundler(images, reconstructions, track_manager,
@@ -402,7 +402,7 @@ def export_cameras_reconstruction(data, db, path, camera_map):
 def export_shots_reconstruction(data, db, path, camera_map, images_map,
                                 features_map, points_map):
     reconstructions = data.load_reconstruction()
-    tracks_manager = data.load_tracks_manager()
+    tracks_manager = data.load_read_only_tracks_manager()
 
     with io.open_wt(os.path.join(path, 'images.txt')) as fout:
         for reconstruction in reconstructions:
@@ -439,7 +439,7 @@ def export_shots_reconstruction(data, db, path, camera_map, images_map,
 
 def export_points_reconstruction(data, db, path, camera_map, images_map):
     reconstructions = data.load_reconstruction()
-    tracks_manager = data.load_tracks_manager()
+    tracks_manager = data.load_read_only_tracks_manager()
 
     points_map = {}
     with io.open_wt(os.path.join(path, 'points3D.txt')) as fout:
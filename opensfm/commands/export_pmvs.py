@@ -54,7 +54,7 @@ class Command:
             if args.undistorted:
                 tracks_manager = udata.load_undistorted_tracks_manager()
             else:
-                tracks_manager = data.load_tracks_manager()
+                tracks_manager = data.load_read_only_tracks_manager()
             image_graph = tracking.as_weighted_graph(tracks_manager)
         except IOError:
             image_graph = None
@@ -20,14 +20,23 @@ class Command:
 
     def add_arguments(self, parser):
         parser.add_argument('dataset', help='dataset to process')
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='only match images without matches, keeping existing matches')
 
     def run(self, args):
         data = dataset.DataSet(args.dataset)
         images = data.images()
 
         start = timer()
-        pairs_matches, preport = matching.match_images(data, images, images)
-        matching.save_matches(data, images, pairs_matches)
+        if args.incremental:
+            new_images, pairs_matches, preport = \
+                matching.match_images_incremental(data, images)
+            matching.save_matches(data, new_images, pairs_matches)
+        else:
+            pairs_matches, preport = matching.match_images(data, images, images)
+            matching.save_matches(data, images, pairs_matches)
         end = timer()
 
         with open(data.profile_log(), 'a') as fout:
@@ -18,7 +18,7 @@ class Command:
     def run(self, args):
         start = time.time()
         data = dataset.DataSet(args.dataset)
-        tracks_manager = data.load_tracks_manager()
+        tracks_manager = data.load_read_only_tracks_manager()
         reconstructions = data.load_reconstruction()
 
         all_shot_ids = set(tracks_manager.get_shot_ids())
@@ -14,13 +14,21 @@ class Command:
 
     def add_arguments(self, parser):
         parser.add_argument('dataset', help='dataset to process')
+        parser.add_argument(
+            '--extend',
+            action='store_true',
+            help='add the images missing from the existing reconstructions')
 
     def run(self, args):
         start = time.time()
         data = dataset.DataSet(args.dataset)
-        tracks_manager = data.load_tracks_manager()
-        report, reconstructions = reconstruction.\
-            incremental_reconstruction(data, tracks_manager)
+        tracks_manager = data.load_read_only_tracks_manager()
+        if args.extend and data.reconstruction_exists():
+            report, reconstructions = reconstruction.extend_reconstruction(
+                data, tracks_manager, data.load_reconstruction())
+        else:
+            report, reconstructions = reconstruction.\
+                incremental_reconstruction(data, tracks_manager)
         end = time.time()
         with open(data.profile_log(), 'a') as fout:
             fout.write('reconstruct: {0}\n'.format(end - start))
@@ -51,7 +51,7 @@ class Command:
         udata = dataset.UndistortedDataSet(data, args.output)
         reconstructions = data.load_reconstruction(args.reconstruction)
         if data.tracks_exists(args.tracks):
-            tracks_manager = data.load_tracks_manager(args.tracks)
+            tracks_manager = data.load_read_only_tracks_manager(args.tracks)
         else:
             tracks_manager = None
 
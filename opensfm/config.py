@@ -12,6 +12,7 @@ feature_root: 1               # If 1, apply square root mapping to features
 feature_min_frames: 4000      # If fewer frames are detected, sift_peak_threshold/surf_hessian_threshold is reduced.
 feature_process_size: 2048    # Resize the image if its size is larger than specified. Set to -1 for original size
 feature_use_adaptive_suppression: no
+features_format: npz           # Format used when saving features: npz (compressed) or npy (uncompressed, descriptors are memory-mapped when loading)
 
 # Params for SIFT
 sift_peak_threshold: 0.1     # Smaller value -> more features
@@ -46,6 +47,7 @@ symmetric_matching: yes       # Match symmetricly or one-way
 flann_branching: 8           # See OpenCV doc
 flann_iterations: 10          # See OpenCV doc
 flann_checks: 20             # Smaller -> Faster (but might lose good matches)
+flann_persist_index: no      # Build FLANN indexes during detect_features and save them in the features folder
 
 # Params for BoW matching
 bow_file: bow_hahog_root_uchar_10000.npz
@@ -84,9 +86,12 @@ triangulation_min_ray_angle: 1.0        # Minimum angle between views to accept
 triangulation_type: FULL                # Triangulation type : either considering all rays (FULL), or sing a RANSAC variant (ROBUST)
 resection_threshold: 0.004              # Outlier threshold for resection in radians
 resection_min_inliers: 10               # Minimum number of resection inliers to accept it
+resection_batch_size: 1                 # Number of best candidate images resected in parallel at each step of the incremental reconstruction, bundle adjusted together
 
 # Params for track creation
 min_track_length: 2             # Minimum number of features/images per track
+tracks_streaming: no            # Read matches and features one image at a time when creating tracks, to reduce peak memory
+tracks_format: text             # Format used when saving tracks files: text (tracks.csv) or binary (tracks.bin). Loading detects the format
 
 # Params for bundle adjustment
 loss_function: SoftLOneLoss     # Loss function for the ceres problem (see: http://ceres-solver.org/modeling.html#lossfunction)
@@ -29,8 +29,12 @@ else:
 
 
 # Parallel processes
-def parallel_map(func, args, num_proc, max_batch_size=1):
-    """Run function for all arguments using multiple processes."""
+def parallel_map(func, args, num_proc, max_batch_size=1, backend='loky'):
+    """Run function for all arguments using multiple processes.
+
+    Use backend='threading' for functions that release the GIL, to share
+    memory instead of pickling arguments and results.
+    """
     # De-activate/Restore any inner OpenCV threading
     threads_used = cv2.getNumThreads()
     cv2.setNumThreads(0)
@@ -39,7 +43,7 @@ def parallel_map(func, args, num_proc, max_batch_size=1):
     if num_proc <= 1:
         res = list(map(func, args))
     else:
-        with parallel_backend('loky', n_jobs=num_proc):
+        with parallel_backend(backend, n_jobs=num_proc):
             batch_size = max(1, int(len(args) / (num_proc * 2)))
             batch_size = min(batch_size, max_batch_size) if max_batch_size else batch_size
             res = Parallel(batch_size=batch_size)(delayed(func)(arg) for arg in args)
@@ -5,11 +5,13 @@ import json
 import logging
 import pickle
 import gzip
+import shutil
 
 import numpy as np
 import six
 
 from opensfm import io
+from opensfm import bow
 from opensfm import config
 from opensfm import geo
 from opensfm import tracking
@@ -303,21 +305,139 @@ class DataSet(object):
         """
         return os.path.join(self._feature_path(), image + '.npz')
 
+    def _feature_folder(self, image):
+        """
+        Return path of the uncompressed feature folder for specified image
+        :param image: Image name, with extension (i.e. 123.jpg)
+        """
+        return os.path.join(self._feature_path(), image + '.features')
+
     def _save_features(self, filepath, points, descriptors, colors=None):
         io.mkdir_p(self._feature_path())
         features.save_features(filepath, points, descriptors, colors, self.config)
 
     def features_exist(self, image):
         return os.path.isfile(self._feature_file(image)) or\
-            os.path.isfile(self._feature_file_legacy(image))
+            os.path.isfile(self._feature_file_legacy(image)) or\
+            os.path.isdir(self._feature_folder(image))
 
     def load_features(self, image):
+        if os.path.isdir(self._feature_folder(image)):
+            return features.load_features_uncompressed(self._feature_folder(image), self.config)
         if os.path.isfile(self._feature_file_legacy(image)):
             return features.load_features(self._feature_file_legacy(image), self.config)
         return features.load_features(self._feature_file(image), self.config)
 
+    def load_points_colors(self, image):
+        """Load the points and colors of an image, without the descriptors."""
+        if os.path.isdir(self._feature_folder(image)):
+            return features.load_points_colors_uncompressed(self._feature_folder(image), self.config)
+        if os.path.isfile(self._feature_file_legacy(image)):
+            return features.load_points_colors(self._feature_file_legacy(image), self.config)
+        return features.load_points_colors(self._feature_file(image), self.config)
+
     def save_features(self, image, points, descriptors, colors):
-        self._save_features(self._feature_file(image), points, descriptors, colors)
+        if self.config['features_format'] == 'npy':
+            if os.path.isfile(self._feature_file(image)):
+                os.remove(self._feature_file(image))
+            io.mkdir_p(self._feature_folder(image))
+            features.save_features_uncompressed(
+                self._feature_folder(image), points, descriptors, colors, self.config)
+        else:
+            if os.path.isdir(self._feature_folder(image)):
+                shutil.rmtree(self._feature_folder(image))
+            self._save_features(self._feature_file(image), points, descriptors, colors)
+
+    def _descriptors_file(self, image):
+        """Return path of the file holding the descriptors of an image"""
+        if os.path.isdir(self._feature_folder(image)):
+            return os.path.join(self._feature_folder(image), 'descriptors.npy')
+        if os.path.isfile(self._feature_file_legacy(image)):
+            return self._feature_file_legacy(image)
+        return self._feature_file(image)
+
+    def _flann_index_file(self, image):
+        return os.path.join(self._feature_path(), image + '.flann')
+
+    def _flann_index_signature_file(self, image):
+        return os.path.join(self._feature_path(), image + '.flann.json')
+
+    def _flann_index_signature(self, image):
+        """Features file and FLANN parameters an index is built from."""
+        descriptors_file = self._descriptors_file(image)
+        stat = os.stat(descriptors_file)
+        return {
+            'features_file': os.path.basename(descriptors_file),
+            'features_size': stat.st_size,
+            'features_mtime': stat.st_mtime,
+            'flann_branching': self.config['flann_branching'],
+            'flann_iterations': self.config['flann_iterations'],
+        }
+
+    def flann_index_exists(self, image):
+        """Check that a FLANN index is saved and up to date with the features."""
+        if not os.path.isfile(self._flann_index_file(image)) or\
+                not os.path.isfile(self._flann_index_signature_file(image)):
+            return False
+        with io.open_rt(self._flann_index_signature_file(image)) as fin:
+            signature = io.json_load(fin)
+        return signature == self._flann_index_signature(image)
+
+    def load_flann_index(self, image, descriptors):
+        """Load the FLANN index of an image, or None if missing or outdated.
+
+        :param descriptors: the loaded descriptors of the image
+        """
+        if not self.flann_index_exists(image):
+            return None
+        return features.load_flann_index(descriptors, self._flann_index_file(image))
+
+    def save_flann_index(self, image, index):
+        io.mkdir_p(self._feature_path())
+        index.save(self._flann_index_file(image))
+        with io.open_wt(self._flann_index_signature_file(image)) as fout:
+            io.json_dump(self._flann_index_signature(image), fout)
+
+    def _vlad_file(self, image):
+        return os.path.join(self._feature_path(), image + '.vlad.npz')
+
+    def _vlad_signature(self, image):
+        """Features, masks and VLAD words a VLAD vector is computed from."""
+        descriptors_file = self._descriptors_file(image)
+        return np.array([
+            os.path.basename(descriptors_file),
+            str(os.stat(descriptors_file).st_mtime),
+            self.config['vlad_file'],
+        ] + self._features_mask_signature(image))
+
+    def _features_mask_signature(self, image):
+        """Mask and segmentation files and labels the features mask uses."""
+        ignore_values = self.segmentation_ignore_values(image)
+        files = [self.mask_files.get(image)]
+        if ignore_values:
+            files.append(self._segmentation_file(image))
+        signature = [str(os.stat(f).st_mtime) if f and os.path.isfile(f)
+                     else '' for f in files]
+        return signature + [str(list(ignore_values))]
+
+    def vlad_exists(self, image):
+        """Check that a VLAD vector is saved and up to date with the features."""
+        if not os.path.isfile(self._vlad_file(image)):
+            return False
+        with np.load(self._vlad_file(image)) as s:
+            return np.array_equal(s['signature'], self._vlad_signature(image))
+
+    def load_vlad(self, image):
+        """Load the VLAD vector of an image, or None if missing or outdated."""
+        if not self.vlad_exists(image):
+            return None
+        with np.load(self._vlad_file(image)) as s:
+            return s['vlad']
+
+    def save_vlad(self, image, vlad):
+        io.mkdir_p(self._feature_path())
+        np.savez(self._vlad_file(image), vlad=vlad,
+                 signature=self._vlad_signature(image))
 
     def _words_file(self, image):
         return os.path.join(self._feature_path(), image + '.words.npz')
@@ -332,52 +452,162 @@ class DataSet(object):
     def save_words(self, image, words):
         np.savez_compressed(self._words_file(image), words=words.astype(np.uint16))
 
+    def words_signature(self, image):
+        """Signature of the words of an image, changing when they are saved."""
+        return str(os.stat(self._words_file(image)).st_mtime)
+
+    def _bow_path(self):
+        """Return path of the BoW database directory"""
+        return os.path.join(self.data_path, 'bow')
+
+    def _bow_index_file(self):
+        return os.path.join(self._bow_path(), self.config['bow_file'] + '.flann')
+
+    def _bow_database_file(self):
+        return os.path.join(self._bow_path(), 'database.npz')
+
+    def load_bows(self):
+        """Load the BoW vocabulary, with its FLANN index stored in the dataset."""
+        return bow.load_bows(self.config, self._bow_index_file())
+
+    def load_bow_database(self):
+        """Load the BoW database, or None if missing or for another vocabulary."""
+        if not os.path.isfile(self._bow_database_file()):
+            return None
+        database = bow.load_bow_database(self._bow_database_file())
+        if database.bow_file != self.config['bow_file']:
+            return None
+        return database
+
+    def save_bow_database(self, database):
+        io.mkdir_p(self._bow_path())
+        bow.save_bow_database(self._bow_database_file(), database)
+
     def _matches_path(self):
         """Return path of matches directory"""
         return os.path.join(self.data_path, 'matches')
 
     def _matches_file(self, image):
         """File for matches for an image"""
+        return os.path.join(self._matches_path(), '{}_matches.bin'.format(image))
+
+    def _matches_file_legacy(self, image):
+        """Legacy pickled file for matches for an image"""
         return os.path.join(self._matches_path(), '{}_matches.pkl.gz'.format(image))
 
     def matches_exists(self, image):
-        return os.path.isfile(self._matches_file(image))
+        return os.path.isfile(self._matches_file(image)) or\
+            os.path.isfile(self._matches_file_legacy(image))
 
-    def load_matches(self, image):
-        with gzip.open(self._matches_file(image), 'rb') as fin:
+    def load_matches(self, image, images=None):
+        """Load the matches of an image.
+
+        :param images: load only the matches with these images. Default: all
+        """
+        if not os.path.isfile(self._matches_file(image)) and\
+                os.path.isfile(self._matches_file_legacy(image)):
+            return self._load_matches_legacy(image, images)
+        with open(self._matches_file(image), 'rb') as fin:
+            return io.read_matches(fin, images)
+
+    def matched_images(self, image):
+        """List the images matched with an image, without loading the matches."""
+        if not os.path.isfile(self._matches_file(image)) and\
+                os.path.isfile(self._matches_file_legacy(image)):
+            return list(self._load_matches_legacy(image))
+        with open(self._matches_file(image), 'rb') as fin:
+            return list(io.read_matches_index(fin))
+
+    def _load_matches_legacy(self, image, images=None):
+        with gzip.open(self._matches_file_legacy(image), 'rb') as fin:
             matches = pickle.load(fin)
+        if images is not None:
+            matches = {im2: matches[im2] for im2 in images if im2 in matches}
         return matches
 
     def save_matches(self, image, matches):
+        """Save the matches of an image.
+
+        The file is written under a temporary name and then renamed, so
+        that several processes can save matches concurrently and readers
+        never see a partially written file.
+        """
         io.mkdir_p(self._matches_path())
-        with gzip.open(self._matches_file(image), 'wb') as fout:
-            pickle.dump(matches, fout)
+        filepath = self._matches_file(image)
+        temporary = '{}.{}.tmp'.format(filepath, os.getpid())
+        with open(temporary, 'wb') as fout:
+            io.write_matches(fout, matches)
+        os.rename(temporary, filepath)
+        if os.path.isfile(self._matches_file_legacy(image)):
+            os.remove(self._matches_file_legacy(image))
 
     def find_matches(self, im1, im2):
         if self.matches_exists(im1):
-            im1_matches = self.load_matches(im1)
+            im1_matches = self.load_matches(im1, [im2])
             if im2 in im1_matches:
                 return im1_matches[im2]
         if self.matches_exists(im2):
-            im2_matches = self.load_matches(im2)
+            im2_matches = self.load_matches(im2, [im1])
             if im1 in im2_matches:
                 if len(im2_matches[im1]):
                     return im2_matches[im1][:, [1, 0]]
         return []
 
-    def _tracks_manager_file(self, filename=None):
-        """Return path of tracks file"""
-        return os.path.join(self.data_path, filename or 'tracks.csv')
+    def _tracks_manager_file(self, filename=None, subfolder='', saving=False):
+        """Return path of tracks file.
+
+        By default, text tracks are stored in tracks.csv and binary tracks
+        in tracks.bin. The file of the configured tracks_format is read,
+        unless only the file of the other format exists.
+        """
+        if filename:
+            return os.path.join(self.data_path, filename)
+        names = ['tracks.csv', 'tracks.bin']
+        if self.config['tracks_format'] == 'binary':
+            names.reverse()
+        paths = [os.path.join(self.data_path, subfolder, n) for n in names]
+        if (not saving and not os.path.isfile(paths[0]) and
+                os.path.isfile(paths[1])):
+            return paths[1]
+        return paths[0]
 
     def load_tracks_manager(self, filename=None):
-        """Return the tracks manager"""
+        """Return the tracks manager.
+
+        Both the text and the binary formats are accepted.
+        """
         return pysfm.TracksManager.instanciate_from_file(self._tracks_manager_file(filename))
 
+    def load_mapped_tracks_manager(self, filename=None):
+        """Return a read-only tracks manager mapping the tracks file.
+
+        The file must have been saved in binary format. Pages of the
+        file are shared between processes and observations are read
+        on access instead of being loaded upfront.
+        """
+        return pysfm.MappedTracksManager(self._tracks_manager_file(filename))
+
+    def load_read_only_tracks_manager(self, filename=None):
+        """Return a tracks manager that is only read.
+
+        The tracks file is memory-mapped if saved in version 2 binary
+        format, so that processes share its pages, and loaded otherwise.
+        """
+        try:
+            return self.load_mapped_tracks_manager(filename)
+        except RuntimeError:
+            return self.load_tracks_manager(filename)
+
     def tracks_exists(self, filename=None):
         return os.path.isfile(self._tracks_manager_file(filename))
 
     def save_tracks_manager(self, tracks_manager, filename=None):
-        tracks_manager.write_to_file(self._tracks_manager_file(filename))
+        """Save the tracks manager using the configured tracks_format."""
+        filepath = self._tracks_manager_file(filename, saving=True)
+        if self.config['tracks_format'] == 'binary':
+            tracks_manager.write_to_binary_file(filepath)
+        else:
+            tracks_manager.write_to_file(filepath)
 
     def _reconstruction_file(self, filename):
         """Return path of reconstruction file"""
@@ -760,10 +990,13 @@ class UndistortedDataSet(object):
             return o['points'], o['normals'], o['colors'], o['labels'], o['detections']
 
     def load_undistorted_tracks_manager(self):
-        return self.base.load_tracks_manager(os.path.join(self.subfolder, 'tracks.csv'))
+        return self.base.load_read_only_tracks_manager(
+            self.base._tracks_manager_file(subfolder=self.subfolder))
 
     def save_undistorted_tracks_manager(self, tracks_manager):
-        return self.base.save_tracks_manager(tracks_manager, os.path.join(self.subfolder, 'tracks.csv'))
+        return self.base.save_tracks_manager(
+            tracks_manager, self.base._tracks_manager_file(
+                subfolder=self.subfolder, saving=True))
 
     def load_undistorted_reconstruction(self):
         return self.base.load_reconstruction(
@@ -4,6 +4,7 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import logging
+from collections import defaultdict
 
 import numpy as np
 from repoze.lru import LRUCache
@@ -21,8 +22,39 @@ class FeatureLoader(object):
         self.features_cache = LRUCache(200)
         self.words_cache = LRUCache(200)
         self.masks_cache = LRUCache(1000)
+        self.mask_indices_cache = LRUCache(1000)
+        self.bearings_cache = LRUCache(200)
         self.index_cache = LRUCache(200)
         self.masked_index_cache = LRUCache(200)
+        self.reset_stats()
+
+    def _caches(self):
+        return {
+            'points': self.points_cache,
+            'features': self.features_cache,
+            'words': self.words_cache,
+            'masks': self.masks_cache,
+            'bearings': self.bearings_cache,
+            'index': self.index_cache,
+            'masked_index': self.masked_index_cache,
+        }
+
+    def reset_stats(self):
+        """Start counting cache hits and feature reads from now."""
+        self.reads = defaultdict(int)
+        self.stats_start = {name: (cache.hits, cache.misses)
+                            for name, cache in self._caches().items()}
+
+    def stats(self):
+        """Cache hits and misses, and feature reads per image since reset_stats."""
+        caches = {}
+        for name, cache in self._caches().items():
+            hits, misses = self.stats_start[name]
+            caches[name] = {
+                'hits': cache.hits - hits,
+                'misses': cache.misses - misses,
+            }
+        return {'caches': caches, 'reads': dict(self.reads)}
 
     def clear_cache(self):
         self.points_cache.clear()
@@ -30,6 +62,8 @@ class FeatureLoader(object):
         self.features_cache.clear()
         self.words_cache.clear()
         self.masks_cache.clear()
+        self.mask_indices_cache.clear()
+        self.bearings_cache.clear()
 
     def load_mask(self, data, image, points=None):
         masks = self.masks_cache.get(image)
@@ -42,11 +76,34 @@ class FeatureLoader(object):
             self.masks_cache.put(image, masks)
         return masks
 
+    def load_mask_indices(self, data, image):
+        """Indexes of the unmasked features, or None if there is no mask."""
+        indices = self.mask_indices_cache.get(image)
+        if indices is None:
+            mask = self.load_mask(data, image)
+            if mask is None:
+                return None
+            indices = np.flatnonzero(mask)
+            self.mask_indices_cache.put(image, indices)
+        return indices
+
+    def load_bearings(self, data, image, camera, masked=False):
+        """Bearings of the feature points of an image."""
+        key = (image, camera.id, masked)
+        bearings = self.bearings_cache.get(key)
+        if bearings is None:
+            points, _ = self.load_points_colors(data, image, masked)
+            if points is None:
+                return None
+            bearings = camera.pixel_bearing_many(points[:, :2])
+            self.bearings_cache.put(key, bearings)
+        return bearings
+
     def load_points_colors(self, data, image, masked=False):
         points = self.points_cache.get(image)
         colors = self.colors_cache.get(image)
         if points is None or colors is None:
-            points, _, colors = self._load_features_nocache(data, image)
+            points, colors = self._load_points_colors_nocache(data, image)
             self.points_cache.put(image, points)
             self.colors_cache.put(image, colors)
         if masked:
@@ -79,12 +136,24 @@ class FeatureLoader(object):
         if cached is None:
             _, features, _ = self.load_points_features_colors(data, image,
                                                               masked)
-            index = ft.build_flann_index(features, data.config)
+            index = self._load_persisted_index(data, image, features, masked)
+            if index is None:
+                index = ft.build_flann_index(features, data.config)
             cache.put(image, (features, index))
         else:
             features, index = cached
         return index
 
+    def _load_persisted_index(self, data, image, features, masked):
+        """Load the index saved by detect_features, if valid for features."""
+        if not data.config['flann_persist_index']:
+            return None
+        if masked:
+            mask = self.load_mask(data, image)
+            if mask is not None and not mask.all():
+                return None
+        return data.load_flann_index(image, features)
+
     def load_words(self, data, image, masked):
         words = self.words_cache.get(image)
         if words is None:
@@ -96,7 +165,17 @@ class FeatureLoader(object):
                 words = words[mask]
         return words
 
+    def _load_points_colors_nocache(self, data, image):
+        self.reads[image] += 1
+        points, colors = data.load_points_colors(image)
+        if points is None:
+            logger.error('Could not load features for image {}'.format(image))
+        else:
+            points = np.array(points[:, :3], dtype=float)
+        return points, colors
+
     def _load_features_nocache(self, data, image):
+        self.reads[image] += 1
         points, features, colors = data.load_features(image)
         if points is None:
             logger.error('Could not load features for image {}'.format(image))
@@ -3,6 +3,7 @@
 import time
 import logging
 import numpy as np
+import os
 import sys
 import cv2
 
@@ -310,6 +311,17 @@ def build_flann_index(features, config):
     return context.flann_Index(features, flann_params)
 
 
+def load_flann_index(features, filepath):
+    """ Load a FLANN index saved with index.save(filepath)
+
+    The features must be the ones the index was built with.
+    """
+    index = context.flann_Index()
+    if not index.load(features, filepath):
+        raise IOError('Unable to load FLANN index {}'.format(filepath))
+    return index
+
+
 FEATURES_VERSION = 1
 FEATURES_HEADER = 'OPENSFM_FEATURES_VERSION'
 
@@ -321,6 +333,15 @@ def load_features(filepath, config):
     return getattr(sys.modules[__name__], '_load_features_v%d' % version)(s, config)
 
 
+def load_points_colors(filepath, config):
+    """ Load points and colors from filename, without the descriptors """
+    s = np.load(filepath)
+    points = s['points']
+    if _features_file_version(s) == 0:
+        points[:, 2:3] = config['reprojection_error_sd']
+    return points, s['colors'].astype(float)
+
+
 def _features_file_version(obj):
     """ Retrieve features file version. Return 0 if none """
     if FEATURES_HEADER in obj:
@@ -334,11 +355,7 @@ def _load_features_v0(s, config):
 
     Scale (desc[2]) set to reprojection_error_sd by default (legacy behaviour)
     """
-    feature_type = config['feature_type']
-    if feature_type == 'HAHOG' and config['hahog_normalize_to_uchar']:
-        descriptors = s['descriptors'].astype(np.float32)
-    else:
-        descriptors = s['descriptors']
+    descriptors = _convert_descriptors(s['descriptors'], config)
     points = s['points']
     points[:, 2:3] = config['reprojection_error_sd']
     return points, descriptors, s['colors'].astype(float)
@@ -349,24 +366,64 @@ def _load_features_v1(s, config):
 
     Scale is not properly set higher in the pipeline, default is gone.
     """
-    feature_type = config['feature_type']
-    if feature_type == 'HAHOG' and config['hahog_normalize_to_uchar']:
-        descriptors = s['descriptors'].astype(np.float32)
-    else:
-        descriptors = s['descriptors']
+    descriptors = _convert_descriptors(s['descriptors'], config)
     return s['points'], descriptors, s['colors'].astype(float)
 
 
 def save_features(filepath, points, desc, colors, config):
+    np.savez_compressed(filepath,
+                        points=points.astype(np.float32),
+                        descriptors=desc.astype(_descriptors_data_type(config)),
+                        colors=colors,
+                        OPENSFM_FEATURES_VERSION=FEATURES_VERSION)
+
+
+def _descriptors_data_type(config):
     feature_type = config['feature_type']
     if ((feature_type == 'AKAZE' and config['akaze_descriptor'] in ['MLDB_UPRIGHT', 'MLDB'])
             or (feature_type == 'HAHOG' and config['hahog_normalize_to_uchar'])
             or (feature_type == 'ORB')):
-        feature_data_type = np.uint8
+        return np.uint8
     else:
-        feature_data_type = np.float32
-    np.savez_compressed(filepath,
-                        points=points.astype(np.float32),
-                        descriptors=desc.astype(feature_data_type),
-                        colors=colors,
-                        OPENSFM_FEATURES_VERSION=FEATURES_VERSION)
+        return np.float32
+
+
+def _convert_descriptors(descriptors, config):
+    feature_type = config['feature_type']
+    if feature_type == 'HAHOG' and config['hahog_normalize_to_uchar']:
+        return descriptors.astype(np.float32, copy=False)
+    else:
+        return descriptors
+
+
+def save_features_uncompressed(dirpath, points, desc, colors, config):
+    """ Save features as separate uncompressed arrays in the dirpath folder
+
+    Each array is stored in its own .npy file, so that points and colors
+    can be read without the descriptors, and the descriptors can be
+    memory-mapped.  Files always use the latest features file version.
+
+    Descriptors are stored in the data type they are loaded with, so that
+    the memory-mapped array is used as is instead of being converted to a
+    private copy.
+    """
+    np.save(os.path.join(dirpath, 'points.npy'), points.astype(np.float32))
+    desc = desc.astype(_descriptors_data_type(config))
+    np.save(os.path.join(dirpath, 'descriptors.npy'),
+            _convert_descriptors(desc, config))
+    np.save(os.path.join(dirpath, 'colors.npy'), colors)
+
+
+def load_features_uncompressed(dirpath, config):
+    """ Load features from dirpath, memory-mapping the descriptors """
+    points, colors = load_points_colors_uncompressed(dirpath, config)
+    descriptors = np.load(os.path.join(dirpath, 'descriptors.npy'),
+                          mmap_mode='r')
+    return points, _convert_descriptors(descriptors, config), colors
+
+
+def load_points_colors_uncompressed(dirpath, config):
+    """ Load points and colors from dirpath, without the descriptors """
+    points = np.load(os.path.join(dirpath, 'points.npy'))
+    colors = np.load(os.path.join(dirpath, 'colors.npy'))
+    return points, colors.astype(float)
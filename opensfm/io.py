@@ -8,6 +8,7 @@ import io
 import json
 import logging
 import os
+import struct
 import sys
 
 import cv2
@@ -526,6 +527,85 @@ def write_ground_control_points(gcp, fileobj, reference):
     json_dump(obj, fileobj)
 
 
+MATCHES_HEADER = b'OPENSFM_MATCHES'
+MATCHES_VERSION = 1
+
+
+def write_matches(fileobj, matches):
+    """Write the matches of an image to an indexed binary file.
+
+    The file starts with an index giving the offset and number of
+    matches of each pair, followed by the matches as int32 pairs of
+    feature ids, so that a single pair can be read with a seek.
+
+    Args:
+        fileobj: a binary file object
+        matches: dict of image name -> array of (feature1, feature2) ids
+    """
+    names = [im2.encode('utf-8') for im2 in matches]
+    arrays = [np.asarray(m, dtype='<i4').reshape(-1, 2)
+              for m in matches.values()]
+
+    index_size = len(MATCHES_HEADER) + struct.calcsize('<IQ')
+    index_size += sum(struct.calcsize('<IQQ') + len(n) for n in names)
+
+    fileobj.write(MATCHES_HEADER)
+    fileobj.write(struct.pack('<IQ', MATCHES_VERSION, len(names)))
+    offset = index_size
+    for name, m in zip(names, arrays):
+        fileobj.write(struct.pack('<I', len(name)))
+        fileobj.write(name)
+        fileobj.write(struct.pack('<QQ', offset, len(m)))
+        offset += m.nbytes
+    for m in arrays:
+        fileobj.write(m.tobytes())
+
+
+def read_matches_index(fileobj):
+    """Read the index of a binary matches file.
+
+    Returns:
+        dict of image name -> (offset, number of matches)
+    """
+    def unpack(fmt):
+        return struct.unpack(fmt, fileobj.read(struct.calcsize(fmt)))
+
+    if fileobj.read(len(MATCHES_HEADER)) != MATCHES_HEADER:
+        raise IOError('Not a binary matches file')
+    version, num_pairs = unpack('<IQ')
+    if version != MATCHES_VERSION:
+        raise IOError('Unsupported matches file version {}'.format(version))
+
+    index = {}
+    for _ in range(num_pairs):
+        length, = unpack('<I')
+        name = fileobj.read(length).decode('utf-8')
+        index[name] = unpack('<QQ')
+    return index
+
+
+def read_matches(fileobj, images=None):
+    """Read the matches of a binary matches file.
+
+    Args:
+        fileobj: a binary file object, opened at the start of the file
+        images: read only the matches with these images. Default: all
+
+    Returns:
+        dict of image name -> array of (feature1, feature2) ids
+    """
+    index = read_matches_index(fileobj)
+    if images is not None:
+        index = {im2: index[im2] for im2 in images if im2 in index}
+
+    matches = {}
+    for im2, (offset, count) in sorted(index.items(), key=lambda x: x[1]):
+        fileobj.seek(offset)
+        m = np.frombuffer(fileobj.read(8 * count), dtype='<i4')
+        matches[im2] = m.reshape(-1, 2).astype(int)
+    return matches
+
+
 def mkdir_p(path):
     '''Make a directory including parent directories.
     '''
@@ -1,6 +1,10 @@
+from __future__ import division
+
 import numpy as np
 import cv2
 import logging
+import scipy.sparse
+import scipy.sparse.csgraph
 
 from timeit import default_timer as timer
 from collections import defaultdict
@@ -40,11 +44,46 @@ def match_images(data, ref_images, cand_images):
         ref_images, cand_images, exifs, data)
 
     # Match them !
-    return match_images_with_pairs(data, exifs, ref_images, pairs), preport
+    matches, cache_report = _match_images_with_pairs(
+        data, exifs, ref_images, pairs)
+    preport['feature_cache'] = cache_report
+    return matches, preport
+
+
+def match_images_incremental(data, images):
+    """ Perform pair matchings of the images not matched yet.
+
+    Images having a matches file are already matched : their matches
+    are kept as is, and only pairs with at least one new image are
+    matched. Candidates are selected for the new images against all
+    images, and the matches of a pair are stored with its new image.
+
+    Returns the new images, the matches of their pairs and the report.
+    """
+    new_images = [im for im in images if not data.matches_exists(im)]
+    new_images_set = set(new_images)
+    num_pairs_reused = sum(len(data.matched_images(im))
+                           for im in images if im not in new_images_set)
+    logger.info('Matching {} new images, reusing {} matched pairs'.format(
+        len(new_images), num_pairs_reused))
+
+    if new_images:
+        matches, preport = match_images(data, new_images, images)
+    else:
+        matches, preport = {}, {}
+    preport['num_new_images'] = len(new_images)
+    preport['num_pairs_reused'] = num_pairs_reused
+    return new_images, matches, preport
 
 
 def match_images_with_pairs(data, exifs, ref_images, pairs):
     """ Perform pair matchings given pairs. """
+    matches, _ = _match_images_with_pairs(data, exifs, ref_images, pairs)
+    return matches
+
+
+def _match_images_with_pairs(data, exifs, ref_images, pairs):
+    """ Perform pair matchings given pairs, and report feature cache usage. """
 
     # Store per each image in ref for processing
     per_image = {im: [] for im in ref_images}
@@ -55,16 +94,21 @@ def match_images_with_pairs(data, exifs, ref_images, pairs):
     ctx.data = data
     ctx.cameras = ctx.data.load_camera_models()
     ctx.exifs = exifs
-    args = list(match_arguments(per_image, ctx))
 
     # Perform all pair matchings in parallel
     start = timer()
     logger.info('Matching {} image pairs'.format(len(pairs)))
     mem_per_process = 512
-    jobs_per_process = 2
+    blocks_per_process = 4
     processes = context.processes_that_fit_in_memory(data.config['processes'], mem_per_process)
     logger.info("Computing pair matching with %d processes" % processes)
-    matches = context.parallel_map(match_unwrap_args, args, processes, jobs_per_process)
+    max_block_images = feature_loader.instance.features_cache.size // 2
+    blocks = schedule_matching(per_image, processes * blocks_per_process,
+                               max_block_images)
+    args = list(match_arguments(blocks, ctx))
+    results = context.parallel_map(match_block_unwrap_args, args, processes)
+    matches = [m for block_matches, _ in results for m in block_matches]
+    cache_report = feature_cache_report([stats for _, stats in results])
     logger.info(
         'Matched {} pairs for {} ref_images {} '
         'in {} seconds ({} seconds/pair).'.format(
@@ -80,7 +124,90 @@ def match_images_with_pairs(data, exifs, ref_images, pairs):
         for im2, m in im1_matches.items():
             resulting_pairs[im1, im2] = m
 
-    return resulting_pairs
+    return resulting_pairs, cache_report
+
+
+def schedule_matching(per_image, num_blocks, max_block_images):
+    """Group the images to match in blocks of images sharing candidates.
+
+    Images are ordered with a reverse Cuthill-McKee ordering of the pair
+    graph, which puts images matched together close to each other, and
+    the ordering is cut in blocks of about the same number of pairs that
+    involve at most max_block_images images. Each block is matched by a
+    single worker, whose feature cache then holds the images shared by
+    the pairs of the block.
+
+    Args:
+        per_image: dict of image -> list of candidate images
+        num_blocks: number of blocks to aim for
+        max_block_images: maximum number of images involved in a block
+
+    Returns:
+        list of blocks, each a list of (image, candidates), largest first
+    """
+    if not per_image:
+        return []
+
+    images = sorted(set(per_image).union(*per_image.values()))
+    index = {im: i for i, im in enumerate(images)}
+    edges = np.array([(index[im1], index[im2])
+                      for im1, candidates in per_image.items()
+                      for im2 in candidates], dtype=int).reshape(-1, 2)
+    graph = scipy.sparse.coo_matrix(
+        (np.ones(len(edges)), (edges[:, 0], edges[:, 1])),
+        shape=(len(images), len(images))).tocsr()
+    order = scipy.sparse.csgraph.reverse_cuthill_mckee(
+        graph + graph.T, symmetric_mode=True)
+
+    pairs_per_block = max(1, int(np.ceil(len(edges) / max(1, num_blocks))))
+    blocks, block, block_images, block_pairs = [], [], set(), 0
+    for i in order:
+        im1 = images[i]
+        if im1 not in per_image:
+            continue
+        candidates = per_image[im1]
+        needed = block_images.union(candidates, [im1])
+        if block and (block_pairs >= pairs_per_block or
+                      len(needed) > max_block_images):
+            blocks.append(block)
+            needed = set(candidates).union([im1])
+            block, block_pairs = [], 0
+        block.append((im1, candidates))
+        block_images = needed
+        block_pairs += len(candidates)
+    if block:
+        blocks.append(block)
+
+    return sorted(blocks, key=lambda b: -sum(len(c) for _, c in b))
+
+
+def feature_cache_report(blocks_stats):
+    """Merge the feature cache statistics of matched blocks."""
+    caches = defaultdict(lambda: {'hits': 0, 'misses': 0})
+    reads = defaultdict(int)
+    for stats in blocks_stats:
+        for name, cache_stats in stats['caches'].items():
+            caches[name]['hits'] += cache_stats['hits']
+            caches[name]['misses'] += cache_stats['misses']
+        for image, count in stats['reads'].items():
+            reads[image] += count
+
+    for name, cache_stats in caches.items():
+        lookups = cache_stats['hits'] + cache_stats['misses']
+        cache_stats['hit_rate'] = cache_stats['hits'] / lookups if lookups else 0
+        if lookups:
+            logger.info('Feature cache {}: {:.1%} hit rate'.format(
+                name, cache_stats['hit_rate']))
+    max_reads = max(reads.values()) if reads else 0
+    logger.info('Read features of {} images at most {} times'.format(
+        len(reads), max_reads))
+
+    return {
+        'caches': dict(caches),
+        'num_reads': sum(reads.values()),
+        'num_images_read': len(reads),
+        'max_reads_per_image': max_reads,
+    }
 
 
 def log_projection_types(pairs, exifs, cameras):
@@ -126,11 +253,23 @@ class Context:
     pass
 
 
-def match_arguments(pairs, ctx):
+def match_arguments(blocks, ctx):
     """ Generate arguments for parralel processing of pair matching """
-    pairs = sorted(pairs.items(), key=lambda x: -len(x[1]))
-    for im, candidates in pairs:
-        yield im, candidates, ctx
+    for block in blocks:
+        yield block, ctx
+
+
+def match_block_unwrap_args(args):
+    """Wrapper for parallel processing of a block of images.
+
+    Compute all pair matchings of the images of a block, and the feature
+    cache statistics of the block.
+    """
+    block, ctx = args
+    feature_loader.instance.reset_stats()
+    matches = [match_unwrap_args((im1, candidates, ctx))
+               for im1, candidates in block]
+    return matches, feature_loader.instance.stats()
 
 
 def match_unwrap_args(args):
@@ -141,15 +280,10 @@ def match_unwrap_args(args):
     log.setup()
     im1, candidates, ctx = args
 
-    im1_matches = {}
-    p1, f1, _ = feature_loader.instance.load_points_features_colors(ctx.data, im1)
     camera1 = ctx.cameras[ctx.exifs[im1]['camera']]
-
-    for im2 in candidates:
-        p2, f2, _ = feature_loader.instance.load_points_features_colors(ctx.data, im2)
-        camera2 = ctx.cameras[ctx.exifs[im2]['camera']]
-
-        im1_matches[im2] = match(im1, im2, camera1, camera2, ctx.data)
+    cameras2 = {im2: ctx.cameras[ctx.exifs[im2]['camera']]
+                for im2 in candidates}
+    im1_matches = match_many(im1, candidates, camera1, cameras2, ctx.data)
 
     num_matches = sum(1 for m in im1_matches.values() if len(m) > 0)
     logger.debug('Image {} matches: {} out of {}'.format(
@@ -160,15 +294,60 @@ def match_unwrap_args(args):
 
 def match(im1, im2, camera1, camera2, data):
     """Perform matching for a pair of images."""
-    # Apply mask to features if any
+    return match_many(im1, [im2], camera1, {im2: camera2}, data)[im2]
+
+
+def match_many(im1, candidates, camera1, cameras2, data):
+    """Perform matching of an image against several candidate images.
+
+    Descriptor matching against all the candidates is batched when the
+    matcher allows it, then each pair is filtered and robustly matched
+    as a single pair would be.
+
+    Args:
+        im1: the image to match
+        candidates: list of images to match im1 with
+        camera1: camera of im1
+        cameras2: dict of candidate image -> camera
+        data: dataset
+
+    Returns:
+        dict of candidate image -> array of (feature1, feature2) ids
+    """
     time_start = timer()
-    p1, f1, _ = feature_loader.instance.load_points_features_colors(
-        data, im1, masked=True)
-    p2, f2, _ = feature_loader.instance.load_points_features_colors(
-        data, im2, masked=True)
+    points, descriptor_matches = match_descriptors_many(im1, candidates, data)
+    time_2d_matching = (timer() - time_start) / max(1, len(candidates))
+
+    results = {}
+    for im2 in candidates:
+        if im2 not in descriptor_matches:
+            results[im2] = []
+            continue
+        results[im2] = _robust_match_pair(
+            im1, im2, camera1, cameras2[im2], points[im1], points[im2],
+            descriptor_matches[im2], time_2d_matching, data)
+    return results
 
-    if p1 is None or len(p1) < 2 or p2 is None or len(p2) < 2:
-        return []
+
+def match_descriptors_many(im1, candidates, data):
+    """Match the descriptors of an image with the ones of several images.
+
+    Returns:
+        tuple: dict of image -> masked points, and dict of candidate
+        image -> descriptor matches, for candidates that could be matched
+    """
+    load = feature_loader.instance.load_points_features_colors
+    p1, f1, _ = load(data, im1, masked=True)
+    if p1 is None or len(p1) < 2:
+        return {}, {}
+
+    points, features = {im1: p1}, {}
+    for im2 in candidates:
+        p2, f2, _ = load(data, im2, masked=True)
+        if p2 is not None and len(p2) >= 2:
+            points[im2], features[im2] = p2, f2
+    images2 = [im2 for im2 in candidates if im2 in features]
+    features2 = [features[im2] for im2 in images2]
 
     config = data.config
     matcher_type = config['matcher_type'].upper()
@@ -176,29 +355,48 @@ def match(im1, im2, camera1, camera2, data):
 
     if matcher_type == 'WORDS':
         w1 = feature_loader.instance.load_words(data, im1, masked=True)
-        w2 = feature_loader.instance.load_words(data, im2, masked=True)
-        if w1 is None or w2 is None:
-            return []
-
-        if symmetric_matching:
-            matches = match_words_symmetric(f1, w1, f2, w2, config)
-        else:
-            matches = match_words(f1, w1, f2, w2, config)
+        if w1 is None:
+            return points, {}
+        matches = {}
+        for im2 in images2:
+            w2 = feature_loader.instance.load_words(data, im2, masked=True)
+            if w2 is None:
+                continue
+            if symmetric_matching:
+                matches[im2] = match_words_symmetric(
+                    f1, w1, features[im2], w2, config)
+            else:
+                matches[im2] = match_words(f1, w1, features[im2], w2, config)
+        return points, matches
     elif matcher_type == 'FLANN':
         i1 = feature_loader.instance.load_features_index(data, im1, masked=True)
+        matches_ij = match_flann_many(i1, features2, config)
         if symmetric_matching:
-            i2 = feature_loader.instance.load_features_index(data, im2, masked=True)
-            matches = match_flann_symmetric(f1, i1, f2, i2, config)
-        else:
-            matches = match_flann(i1, f2, config)
+            for k, im2 in enumerate(images2):
+                i2 = feature_loader.instance.load_features_index(
+                    data, im2, masked=True)
+                matches_ij[k] = _symmetric_matches(
+                    matches_ij[k], match_flann(i2, f1, config))
     elif matcher_type == 'BRUTEFORCE':
         if symmetric_matching:
-            matches = match_brute_force_symmetric(f1, f2, config)
+            matches_ji = match_brute_force_many(features2, f1, config)
+            matches_ij = [_symmetric_matches(match_brute_force(f1, f2, config), m)
+                          for f2, m in zip(features2, matches_ji)]
         else:
-            matches = match_brute_force(f1, f2, config)
+            matches_ij = [match_brute_force(f1, f2, config) for f2 in features2]
     else:
         raise ValueError("Invalid matcher_type: {}".format(matcher_type))
 
+    return points, dict(zip(images2, matches_ij))
+
+
+def _robust_match_pair(im1, im2, camera1, camera2, p1, p2, matches,
+                       time_2d_matching, data):
+    """Filter and robustly match the descriptor matches of a pair."""
+    time_start = timer() - time_2d_matching
+    config = data.config
+    matcher_type = config['matcher_type'].upper()
+
     # Adhoc filters
     if config['matching_use_filters']:
         matches = apply_adhoc_filters(data, matches,
@@ -206,7 +404,6 @@ def match(im1, im2, camera1, camera2, data):
                                       im2, camera2, p2)
 
     matches = np.array(matches, dtype=int)
-    time_2d_matching = timer() - time_start
     t = timer()
 
     symmetric = 'symmetric' if config['symmetric_matching'] \
@@ -222,16 +419,22 @@ def match(im1, im2, camera1, camera2, data):
         return []
 
     # robust matching
-    rmatches = robust_match(p1, p2, camera1, camera2, matches, config)
-    rmatches = np.array([[a, b] for a, b in rmatches])
+    if _is_undistorted_perspective(camera1, camera2):
+        rmatches = robust_match_fundamental(p1, p2, matches, config)[1]
+    else:
+        b1 = feature_loader.instance.load_bearings(data, im1, camera1, masked=True)
+        b2 = feature_loader.instance.load_bearings(data, im2, camera2, masked=True)
+        rmatches = robust_match_calibrated(p1, p2, camera1, camera2, matches,
+                                           config, b1, b2)
+    rmatches = np.asarray(rmatches, dtype=int).reshape(-1, 2)
     time_robust_matching = timer() - t
     time_total = timer() - time_start
 
     # From indexes in filtered sets, to indexes in original sets of features
-    m1 = feature_loader.instance.load_mask(data, im1)
-    m2 = feature_loader.instance.load_mask(data, im2)
-    if m1 is not None and m2 is not None:
-        rmatches = unfilter_matches(rmatches, m1, m2)
+    i1 = feature_loader.instance.load_mask_indices(data, im1)
+    i2 = feature_loader.instance.load_mask_indices(data, im2)
+    if i1 is not None and i2 is not None:
+        rmatches = np.column_stack((i1[rmatches[:, 0]], i2[rmatches[:, 1]]))
 
     logger.debug(
         'Matching {} and {}.  Matcher: {} ({}) '
@@ -248,6 +451,19 @@ def match(im1, im2, camera1, camera2, data):
     return np.array(rmatches, dtype=int)
 
 
+def _symmetric_matches(matches_ij, matches_ji):
+    """Keep matches found in both directions.
+
+    Args:
+        matches_ij: matches (feature i, feature j) from image i to image j
+        matches_ji: matches (feature j, feature i) from image j to image i
+    """
+    matches_ij = [(a, b) for a, b in matches_ij]
+    matches_ji = [(b, a) for a, b in matches_ji]
+
+    return list(set(matches_ij).intersection(set(matches_ji)))
+
+
 def match_words(f1, words1, f2, words2, config):
     """Match using words and apply Lowe's ratio filter.
 
@@ -276,10 +492,7 @@ def match_words_symmetric(f1, words1, f2, words2, config):
     """
     matches_ij = match_words(f1, words1, f2, words2, config)
     matches_ji = match_words(f2, words2, f1, words1, config)
-    matches_ij = [(a, b) for a, b in matches_ij]
-    matches_ji = [(b, a) for a, b in matches_ji]
-
-    return list(set(matches_ij).intersection(set(matches_ji)))
+    return _symmetric_matches(matches_ij, matches_ji)
 
 
 def match_flann(index, f2, config):
@@ -290,11 +503,34 @@ def match_flann(index, f2, config):
         f2: feature descriptors of the second image
         config: config parameters
     """
+    return match_flann_many(index, [f2], config)[0]
+
+
+def match_flann_many(index, features, config):
+    """Match several images using FLANN and apply Lowe's ratio filter.
+
+    Gives the same matches as calling match_flann for each image, but the
+    descriptors of all the images are searched in a single call.
+
+    Args:
+        index: flann index if the first image
+        features: list of feature descriptors of the other images
+        config: config parameters
+    """
+    if not features:
+        return []
     search_params = dict(checks=config['flann_checks'])
-    results, dists = index.knnSearch(f2, 2, params=search_params)
+    results, dists = index.knnSearch(np.vstack(features), 2, params=search_params)
     squared_ratio = config['lowes_ratio']**2  # Flann returns squared L2 distances
     good = dists[:, 0] < squared_ratio * dists[:, 1]
-    return list(zip(results[good, 0], good.nonzero()[0]))
+
+    matches = []
+    offsets = np.cumsum([0] + [len(f) for f in features])
+    for begin, end in zip(offsets[:-1], offsets[1:]):
+        good_image = good[begin:end]
+        matches.append(list(zip(results[begin:end][good_image, 0],
+                                good_image.nonzero()[0])))
+    return matches
 
 
 def match_flann_symmetric(fi, indexi, fj, indexj, config):
@@ -307,10 +543,9 @@ def match_flann_symmetric(fi, indexi, fj, indexj, config):
         indexj: flann index of the second image
         config: config parameters
     """
-    matches_ij = [(a, b) for a, b in match_flann(indexi, fj, config)]
-    matches_ji = [(b, a) for a, b in match_flann(indexj, fi, config)]
-
-    return list(set(matches_ij).intersection(set(matches_ji)))
+    matches_ij = match_flann(indexi, fj, config)
+    matches_ji = match_flann(indexj, fi, config)
+    return _symmetric_matches(matches_ij, matches_ji)
 
 
 def match_brute_force(f1, f2, config):
@@ -321,22 +556,41 @@ def match_brute_force(f1, f2, config):
         f2: feature descriptors of the second image
         config: config parameters
     """
-    assert(f1.dtype.type == f2.dtype.type)
-    if (f1.dtype.type == np.uint8):
+    return match_brute_force_many([f1], f2, config)[0]
+
+
+def match_brute_force_many(features, f2, config):
+    """Brute force matching of several images and Lowe's ratio filtering.
+
+    Gives the same matches as calling match_brute_force for each image,
+    but the descriptors of all the images are matched in a single call.
+
+    Args:
+        features: list of feature descriptors of the query images
+        f2: feature descriptors of the second image
+        config: config parameters
+    """
+    if not features:
+        return []
+    assert(all(f1.dtype.type == f2.dtype.type for f1 in features))
+    if (f2.dtype.type == np.uint8):
         matcher_type = 'BruteForce-Hamming'
     else:
         matcher_type = 'BruteForce'
     matcher = cv2.DescriptorMatcher_create(matcher_type)
-    matches = matcher.knnMatch(f1, f2, k=2)
+    matches = matcher.knnMatch(np.vstack(features), f2, k=2)
 
     ratio = config['lowes_ratio']
-    good_matches = []
+    offsets = np.cumsum([0] + [len(f) for f in features])
+    good_matches = [[] for _ in features]
     for match in matches:
         if match and len(match) == 2:
             m, n = match
             if m.distance < ratio * n.distance:
-                good_matches.append(m)
-    return _convert_matches_to_vector(good_matches)
+                image = np.searchsorted(offsets, m.queryIdx, side='right') - 1
+                m.queryIdx -= int(offsets[image])
+                good_matches[image].append(m)
+    return [_convert_matches_to_vector(good) for good in good_matches]
 
 
 def _convert_matches_to_vector(matches):
@@ -358,10 +612,9 @@ def match_brute_force_symmetric(fi, fj, config):
         fj: feature descriptors of the second image
         config: config parameters
     """
-    matches_ij = [(a, b) for a, b in match_brute_force(fi, fj, config)]
-    matches_ji = [(b, a) for a, b in match_brute_force(fj, fi, config)]
-
-    return list(set(matches_ij).intersection(set(matches_ji)))
+    matches_ij = match_brute_force(fi, fj, config)
+    matches_ji = match_brute_force(fj, fi, config)
+    return _symmetric_matches(matches_ij, matches_ji)
 
 
 def robust_match_fundamental(p1, p2, matches, config):
@@ -386,7 +639,7 @@ def robust_match_fundamental(p1, p2, matches, config):
 def _compute_inliers_bearings(b1, b2, T, threshold=0.01):
     R = T[:, :3]
     t = T[:, 3]
-    p = np.array(pygeometry.triangulate_two_bearings_midpoint_many(b1, b2, R, t))
+    p = pygeometry.triangulate_two_bearings_midpoint_many(b1, b2, R, t)
 
     br1 = p.copy()
     br1 /= np.linalg.norm(br1, axis=1)[:, np.newaxis]
@@ -399,16 +652,25 @@ def _compute_inliers_bearings(b1, b2, T, threshold=0.01):
     return ok1 * ok2
 
 
-def robust_match_calibrated(p1, p2, camera1, camera2, matches, config):
-    """Filter matches by estimating the Essential matrix via RANSAC."""
+def robust_match_calibrated(p1, p2, camera1, camera2, matches, config,
+                            bearings1=None, bearings2=None):
+    """Filter matches by estimating the Essential matrix via RANSAC.
+
+    The bearings of all the points of each image can be given to avoid
+    computing the ones of the matched points.
+    """
 
     if len(matches) < 8:
         return np.array([])
 
-    p1 = p1[matches[:, 0]][:, :2].copy()
-    p2 = p2[matches[:, 1]][:, :2].copy()
-    b1 = camera1.pixel_bearing_many(p1)
-    b2 = camera2.pixel_bearing_many(p2)
+    if bearings1 is None:
+        b1 = camera1.pixel_bearing_many(p1[matches[:, 0]][:, :2].copy())
+    else:
+        b1 = bearings1[matches[:, 0]]
+    if bearings2 is None:
+        b2 = camera2.pixel_bearing_many(p2[matches[:, 1]][:, :2].copy())
+    else:
+        b2 = bearings2[matches[:, 1]]
 
     threshold = config['robust_matching_calib_threshold']
     T = multiview.relative_pose_ransac(
@@ -433,20 +695,25 @@ def robust_match(p1, p2, camera1, camera2, matches, config):
     If cameras are perspective without distortion, then the Fundamental
     matrix is used.  Otherwise, we use the Essential matrix.
     """
-    if (camera1.projection_type == 'perspective'
-            and camera1.k1 == 0.0 and camera1.k2 == 0.0
-            and camera2.projection_type == 'perspective'
-            and camera2.k1 == 0.0 and camera2.k2 == 0.0):
+    if _is_undistorted_perspective(camera1, camera2):
         return robust_match_fundamental(p1, p2, matches, config)[1]
     else:
         return robust_match_calibrated(p1, p2, camera1, camera2, matches, config)
 
 
+def _is_undistorted_perspective(camera1, camera2):
+    return (camera1.projection_type == 'perspective'
+            and camera1.k1 == 0.0 and camera1.k2 == 0.0
+            and camera2.projection_type == 'perspective'
+            and camera2.k1 == 0.0 and camera2.k2 == 0.0)
+
+
 def unfilter_matches(matches, m1, m2):
     """Given matches and masking arrays, get matches with un-masked indexes."""
+    matches = np.asarray(matches, dtype=int).reshape(-1, 2)
     i1 = np.flatnonzero(m1)
     i2 = np.flatnonzero(m2)
-    return np.array([(i1[match[0]], i2[match[1]]) for match in matches])
+    return np.column_stack((i1[matches[:, 0]], i2[matches[:, 1]]))
 
 
 def apply_adhoc_filters(data, matches, im1, camera1, p1, im2, camera2, p2):
@@ -454,10 +721,13 @@ def apply_adhoc_filters(data, matches, im1, camera1, p1, im2, camera2, p2):
         for removing static data in images.
 
     """
+    matches = np.asarray(matches, dtype=int).reshape(-1, 2)
+    meta1 = data.load_exif(im1)
+    meta2 = data.load_exif(im2)
     matches = _non_static_matches(p1, p2, matches, data.config)
     matches = _not_on_pano_poles_matches(p1, p2, matches, camera1, camera2)
-    matches = _not_on_vermont_watermark(p1, p2, matches, im1, im2, data)
-    matches = _not_on_blackvue_watermark(p1, p2, matches, im1, im2, data)
+    matches = _not_on_vermont_watermark(p1, p2, matches, meta1, meta2)
+    matches = _not_on_blackvue_watermark(p1, p2, matches, meta1, meta2)
     return matches
 
 
@@ -468,11 +738,8 @@ def _non_static_matches(p1, p2, matches, config):
     watermarks or dust, but not discard entirely static images.
     """
     threshold = 0.001
-    res = []
-    for match in matches:
-        d = p1[match[0]] - p2[match[1]]
-        if d[0]**2 + d[1]**2 >= threshold**2:
-            res.append(match)
+    d = p1[matches[:, 0], :2] - p2[matches[:, 1], :2]
+    res = matches[d[:, 0]**2 + d[:, 1]**2 >= threshold**2]
 
     static_ratio_threshold = 0.85
     static_ratio_removed = 1 - len(res) / max(len(matches), 1)
@@ -492,54 +759,50 @@ def _not_on_pano_poles_matches(p1, p2, matches, camera1, camera2):
     is_pano1 = (camera1.projection_type == 'equirectangular')
     is_pano2 = (camera2.projection_type == 'equirectangular')
     if is_pano1 or is_pano2:
-        res = []
-        for match in matches:
-            if ((not is_pano1 or min_lat < p1[match[0]][1] < max_lat) and
-                    (not is_pano2 or min_lat < p2[match[1]][1] < max_lat)):
-                res.append(match)
-        return res
+        valid = np.ones(len(matches), dtype=bool)
+        if is_pano1:
+            y1 = p1[matches[:, 0], 1]
+            valid &= (min_lat < y1) & (y1 < max_lat)
+        if is_pano2:
+            y2 = p2[matches[:, 1], 1]
+            valid &= (min_lat < y2) & (y2 < max_lat)
+        return matches[valid]
     else:
         return matches
 
 
-def _not_on_vermont_watermark(p1, p2, matches, im1, im2, data):
+def _not_on_vermont_watermark(p1, p2, matches, meta1, meta2):
     """Filter Vermont images watermark."""
-    meta1 = data.load_exif(im1)
-    meta2 = data.load_exif(im2)
-
     if meta1['make'] == 'VTrans_Camera' and meta1['model'] == 'VTrans_Camera':
-        matches = [m for m in matches if _vermont_valid_mask(p1[m[0]])]
+        matches = matches[_vermont_valid_mask(p1[matches[:, 0]])]
     if meta2['make'] == 'VTrans_Camera' and meta2['model'] == 'VTrans_Camera':
-        matches = [m for m in matches if _vermont_valid_mask(p2[m[1]])]
+        matches = matches[_vermont_valid_mask(p2[matches[:, 1]])]
     return matches
 
 
 def _vermont_valid_mask(p):
-    """Check if pixel inside the valid region.
+    """Check if pixels are inside the valid region.
 
     Pixel coord Y should be larger than 50.
     In normalized coordinates y > (50 - h / 2) / w
     """
-    return p[1] > -0.255
+    return p[:, 1] > -0.255
 
 
-def _not_on_blackvue_watermark(p1, p2, matches, im1, im2, data):
+def _not_on_blackvue_watermark(p1, p2, matches, meta1, meta2):
     """Filter Blackvue's watermark."""
-    meta1 = data.load_exif(im1)
-    meta2 = data.load_exif(im2)
-
     if meta1['make'].lower() == 'blackvue':
-        matches = [m for m in matches if _blackvue_valid_mask(p1[m[0]])]
+        matches = matches[_blackvue_valid_mask(p1[matches[:, 0]])]
     if meta2['make'].lower() == 'blackvue':
-        matches = [m for m in matches if _blackvue_valid_mask(p2[m[1]])]
+        matches = matches[_blackvue_valid_mask(p2[matches[:, 1]])]
     return matches
 
 
 def _blackvue_valid_mask(p):
-    """Check if pixel inside the valid region.
+    """Check if pixels are inside the valid region.
 
     Pixel coord Y should be smaller than h - 70.
     In normalized coordinates y < (h - 70 - h / 2) / w,
     with h = 2160 and w = 3840
     """
-    return p[1] < 0.263
+    return p[:, 1] < 0.263
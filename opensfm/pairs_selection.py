@@ -8,7 +8,6 @@ import scipy.spatial as spatial
 
 from opensfm import bow
 from opensfm import vlad
-from opensfm import context
 from opensfm import feature_loader
 
 logger = logging.getLogger(__name__)
@@ -38,34 +37,72 @@ def match_candidates_by_distance(images_ref, images_cand, exifs, reference,
     max_distance = max_distance or 99999999.
     k = min(len(images_cand), max_neighbors)
 
-    points = np.zeros((len(images_cand), 3))
-    for i, image in enumerate(images_cand):
-        gps = exifs[image]['gps']
-        points[i] = reference.to_topocentric(
-            gps['latitude'], gps['longitude'], 0)
-
-    tree = spatial.cKDTree(points)
-
-    pairs = set()
-    for image_ref in images_ref:
-        nn = k+1 if image_ref in images_cand else k
-
-        gps = exifs[image_ref]['gps']
-        point = reference.to_topocentric(
-            gps['latitude'], gps['longitude'], 0)
-        distances, neighbors = tree.query(
-            point, k=nn, distance_upper_bound=max_distance)
-
-        if type(neighbors) == int:      # special case with only one NN
-            neighbors = [neighbors]
-
-        for j in neighbors:
-            if j >= len(images_cand):
-                continue
-            image_cand = images_cand[j]
-            if image_cand != image_ref:
-                pairs.add(tuple(sorted((image_ref, image_cand))))
-    return pairs
+    points_cand = _topocentric_positions(images_cand, exifs, reference)
+    points_ref = _topocentric_positions(images_ref, exifs, reference)
+    tree = spatial.cKDTree(points_cand)
+    return _pairs_from_tree(images_ref, images_cand, points_ref, tree, k,
+                            max_distance)
+
+
+def _topocentric_positions(images, exifs, reference):
+    """Topocentric positions of images at zero altitude."""
+    latlon = np.array([(exifs[im]['gps']['latitude'],
+                        exifs[im]['gps']['longitude']) for im in images])
+    latlon = latlon.reshape(-1, 2)
+    x, y, z = reference.to_topocentric(latlon[:, 0], latlon[:, 1], 0)
+    return np.column_stack((x, y, z))
+
+
+def _pairs_from_tree(images_ref, images_cand, points_ref, tree, k,
+                     max_distance=np.inf):
+    """Pairs of each reference image with its k nearest candidates.
+
+    Reference images that are also candidates look for k + 1 neighbors
+    since they are their own nearest neighbor.  All reference images are
+    queried at once, in two batches depending on that.
+
+    Returns:
+        set of pairs of images, sorted by name
+    """
+    cand_index = {im: i for i, im in enumerate(images_cand)}
+    is_cand = np.array([im in cand_index for im in images_ref], dtype=bool)
+
+    refs, neighbors = [], []
+    for in_cand, nn in ((False, k), (True, k + 1)):
+        selected = np.flatnonzero(is_cand == in_cand)
+        if len(selected) == 0:
+            continue
+        _, found = tree.query(points_ref[selected], k=nn,
+                              distance_upper_bound=max_distance)
+        found = found.reshape(len(selected), nn)
+        refs.append(np.repeat(selected, nn))
+        neighbors.append(found.ravel())
+    if not refs:
+        return set()
+    refs = np.concatenate(refs)
+    neighbors = np.concatenate(neighbors)
+
+    valid = neighbors < len(images_cand)
+    return _unique_pairs(images_ref, refs[valid],
+                         images_cand, neighbors[valid])
+
+
+def _unique_pairs(images1, indexes1, images2, indexes2):
+    """Set of image pairs (images1[i], images2[j]) sorted by name.
+
+    Pairs of an image with itself are dropped and duplicates are removed
+    on integer indexes before converting them to names.
+    """
+    images = sorted(set(images1) | set(images2))
+    index = {im: i for i, im in enumerate(images)}
+    map1 = np.array([index[im] for im in images1], dtype=int)
+    map2 = np.array([index[im] for im in images2], dtype=int)
+
+    a = map1[np.asarray(indexes1, dtype=int)]
+    b = map2[np.asarray(indexes2, dtype=int)]
+    pairs = np.column_stack((np.minimum(a, b), np.maximum(a, b)))
+    pairs = np.unique(pairs[a != b], axis=0)
+    return set((images[i], images[j]) for i, j in pairs)
 
 
 def match_candidates_with_bow(data, images_ref, images_cand,
@@ -105,14 +142,11 @@ def compute_bow_affinity(data, images_ref, images_cand,
             max_gps_neighbors, max_gps_distance)
 
     # construct BoW histograms
-    logger.info("Computing %d BoW histograms" % len(need_load))
-    histograms = load_histograms(data, need_load)
+    logger.info("Loading %d BoW histograms" % len(need_load))
+    database = load_bow_database(data, need_load)
 
-    # parallel VLAD neighbors computation
-    args, processes, batch_size = create_parallel_matching_args(
-        data, preempted_candidates, histograms)
-    logger.info("Computing BoW candidates with %d processes" % processes)
-    return context.parallel_map(match_bow_unwrap_args, args, processes, batch_size)
+    logger.info("Computing BoW candidates")
+    return bow_database_distances(preempted_candidates, database)
 
 
 def match_candidates_with_vlad(data, images_ref, images_cand,
@@ -154,11 +188,8 @@ def compute_vlad_affinity(data, images_ref, images_cand,
     logger.info("Computing %d VLAD histograms" % len(need_load))
     histograms = vlad_histograms(need_load, data)
 
-    # parallel VLAD neighbors computation
-    args, processes, batch_size = create_parallel_matching_args(
-        data, preempted_candidates, histograms)
-    logger.info("Computing VLAD candidates with %d processes" % processes)
-    return context.parallel_map(match_vlad_unwrap_args, args, processes, batch_size)
+    logger.info("Computing VLAD candidates")
+    return histogram_distances(preempted_candidates, histograms)
 
 
 def preempt_candidates(images_ref, images_cand,
@@ -176,10 +207,11 @@ def preempt_candidates(images_ref, images_cand,
                                                  max_gps_neighbors,
                                                  max_gps_distance)
         preempted_cand = defaultdict(list)
+        refs = set(images_ref)
         for p in gps_pairs:
-            if p[0] in images_ref:
+            if p[0] in refs:
                 preempted_cand[p[0]].append(p[1])
-            if p[1] in images_ref:
+            if p[1] in refs:
                 preempted_cand[p[1]].append(p[0])
 
     # reduce sets of images from which to load histograms (RAM saver)
@@ -203,33 +235,137 @@ def construct_pairs(results, max_neighbors, exifs, enforce_other_cameras):
     return pairs
 
 
-def create_parallel_matching_args(data, preempted_cand, histograms):
-    """Create arguments to matching function"""
-    args = list(match_histogram_arguments(preempted_cand, histograms))
+def histogram_distances(candidates, histograms):
+    """L2 distances between the histograms of images and of their candidates.
 
-     # parallel VLAD neighbors computation
-    per_process = 512
-    processes = context.processes_that_fit_in_memory(data.config['processes'], per_process)
-    batch_size = max(1, len(args)/(2*processes))
-    return args, processes, batch_size
+    Histograms are stacked in a matrix, and images sharing the same list
+    of candidates are processed by blocks, whose distances come from a
+    single matrix product.
 
+    Args:
+        candidates: dict of image -> list of candidate images
+        histograms: dict of image -> histogram
 
-def match_histogram_arguments(candidates, histograms):
-    """ Generate arguments for parralel processing of BoW """
+    Returns:
+        list of (image, distances, other images), as returned by
+        vlad.vlad_distances
+    """
+    images = list(histograms)
+    index = {im: i for i, im in enumerate(images)}
+    matrix = np.array([histograms[im] for im in images], dtype=float)
+    squared_norms = (matrix**2).sum(axis=1)
+
+    max_block = 2**22
+    neighbors = {}
+    for cands, refs in _group_candidates(candidates, index):
+        block_size = max(1, max_block // max(1, len(cands)))
+        cands_matrix = matrix[cands]
+        for begin in range(0, len(refs), block_size):
+            r = refs[begin:begin + block_size]
+            squared = (squared_norms[r, np.newaxis] + squared_norms[cands] -
+                       2 * matrix[r].dot(cands_matrix.T))
+            _add_neighbors(neighbors, r, cands, np.sqrt(np.maximum(squared, 0)))
+    return _neighbors_results(candidates, index, images, neighbors)
+
+
+def bow_database_distances(candidates, database):
+    """L1 distances between the BoW histograms of images and of their candidates.
+
+    Histograms sum to one, so that |a - b| = |a| + |b| - 2 sum(min(a, b)),
+    where the sum only involves the words shared by a and b. It is
+    computed with the inverted file of the candidates, only visiting
+    the candidates sharing words with each image.
+
+    Args:
+        candidates: dict of image -> list of candidate images
+        database: the bow.BowDatabase of the images
+
+    Returns:
+        list of (image, distances, other images), as returned by
+        bow_distances
+    """
+    histograms = database.histograms
+    has_words = np.diff(histograms.indptr) > 0
+    index = {im: i for im, i in database.image_index.items()
+             if has_words[i]}
+    sums = np.asarray(histograms.sum(axis=1)).ravel()
+
+    max_visits = 2**24
+    neighbors = {}
+    for cands, refs in _group_candidates(candidates, index):
+        inverted = database.inverted_file(cands)
+        postings = np.diff(inverted.indptr)
+        refs_histograms = histograms[refs]
+        entries_ref = np.repeat(np.arange(len(refs)),
+                                np.diff(refs_histograms.indptr))
+        entries_visits = postings[refs_histograms.indices]
+        ref_visits = np.bincount(entries_ref, weights=entries_visits,
+                                 minlength=len(refs))
+
+        # Cut blocks of references visiting a bounded number of postings
+        ref_cost = np.maximum(ref_visits, len(cands))
+        block_ids = (np.cumsum(ref_cost) - ref_cost) // max_visits
+        bounds = np.flatnonzero(np.diff(block_ids)) + 1
+        for begin, end in zip(np.r_[0, bounds], np.r_[bounds, len(refs)]):
+            first, last = refs_histograms.indptr[[begin, end]]
+            words = refs_histograms.indices[first:last]
+            weights = refs_histograms.data[first:last]
+            entries = entries_ref[first:last] - begin
+            counts = postings[words]
+
+            # Positions in the inverted file of the postings of each entry
+            offsets = np.repeat(inverted.indptr[words] - np.cumsum(counts) +
+                                counts, counts) + np.arange(counts.sum())
+            shared = np.minimum(np.repeat(weights, counts),
+                                inverted.data[offsets])
+            pairs = (np.repeat(entries, counts) * len(cands) +
+                     inverted.indices[offsets])
+            scores = np.bincount(pairs, weights=shared,
+                                 minlength=(end - begin) * len(cands))
+
+            r = refs[begin:end]
+            distances = (sums[r, np.newaxis] + sums[cands] -
+                         2 * scores.reshape(len(r), len(cands)))
+            _add_neighbors(neighbors, r, cands, np.maximum(distances, 0))
+    return _neighbors_results(candidates, index, database.images, neighbors)
+
+
+def _group_candidates(candidates, index):
+    """Group images sharing the same list of candidates.
+
+    Images and candidates without an index are skipped.
+
+    Returns:
+        list of (candidates indexes, images indexes) arrays
+    """
+    converted, groups = {}, defaultdict(list)
     for im, cands in candidates.items():
-        yield (im, cands, histograms)
-
-
-def match_bow_unwrap_args(args):
-    """ Wrapper for parralel processing of BoW """
-    image, other_images, histograms = args
-    return bow_distances(image, other_images, histograms)
-
-
-def match_vlad_unwrap_args(args):
-    """ Wrapper for parralel processing of VLAD """
-    image, other_images, histograms = args
-    return vlad.vlad_distances(image, other_images, histograms)
+        if im not in index:
+            continue
+        if id(cands) not in converted:
+            converted[id(cands)] = np.array(
+                [index[im2] for im2 in cands if im2 in index], dtype=int)
+        groups[id(cands)].append(index[im])
+    return [(converted[key], np.array(refs, dtype=int))
+            for key, refs in groups.items()]
+
+
+def _add_neighbors(neighbors, refs, cands, distances):
+    """Store the distances of images to their candidates, except themselves."""
+    for i, ref in enumerate(refs):
+        other = cands != ref
+        neighbors[ref] = distances[i, other], cands[other]
+
+
+def _neighbors_results(candidates, index, images, neighbors):
+    results = []
+    for im in candidates:
+        if im not in index:
+            results.append((im, [], []))
+            continue
+        distances, other = neighbors[index[im]]
+        results.append((im, distances, [images[j] for j in other]))
+    return results
 
 
 def match_candidates_by_time(images_ref, images_cand, exifs, max_neighbors):
@@ -238,29 +374,12 @@ def match_candidates_by_time(images_ref, images_cand, exifs, max_neighbors):
         return set()
     k = min(len(images_cand), max_neighbors)
 
-    times = np.zeros((len(images_cand), 1))
-    for i, image in enumerate(images_cand):
-        times[i] = exifs[image]['capture_time']
-
-    tree = spatial.cKDTree(times)
-
-    pairs = set()
-    for image_ref in images_ref:
-        nn = k+1 if image_ref in images_cand else k
-
-        time = exifs[image_ref]['capture_time']
-        distances, neighbors = tree.query([time], k=nn)
-
-        if type(neighbors) == int:      # special case with only one NN
-            neighbors = [neighbors]
-
-        for j in neighbors:
-            if j >= len(images_cand):
-                continue
-            image_cand = images_cand[j]
-            if image_ref != image_cand:
-                pairs.add(tuple(sorted((image_ref, image_cand))))
-    return pairs
+    times_cand = np.array([exifs[im]['capture_time'] for im in images_cand],
+                          dtype=float).reshape(-1, 1)
+    times_ref = np.array([exifs[im]['capture_time'] for im in images_ref],
+                         dtype=float).reshape(-1, 1)
+    tree = spatial.cKDTree(times_cand)
+    return _pairs_from_tree(images_ref, images_cand, times_ref, tree, k)
 
 
 def match_candidates_by_order(images_ref, images_cand, max_neighbors):
@@ -269,15 +388,14 @@ def match_candidates_by_order(images_ref, images_cand, max_neighbors):
         return set()
     n = (max_neighbors + 1) // 2
 
-    pairs = set()
-    for i, image_ref in enumerate(images_ref):
-        a = max(0, i - n)
-        b = min(len(images_cand), i + n)
-        for j in range(a, b):
-            image_cand = images_cand[j]
-            if image_ref != image_cand:
-                pairs.add(tuple(sorted([image_ref, image_cand])))
-    return pairs
+    i = np.arange(len(images_ref))
+    a = np.maximum(0, i - n)
+    b = np.minimum(len(images_cand), i + n)
+    counts = np.maximum(0, b - a)
+    refs = np.repeat(i, counts)
+    cands = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    cands += np.repeat(a, counts)
+    return _unique_pairs(images_ref, refs, images_cand, cands)
 
 
 def match_candidates_from_metadata(images_ref, images_cand, exifs, data):
@@ -367,13 +485,25 @@ def bow_distances(image, other_images, histograms):
     return image, distances, other
 
 
-def load_histograms(data, images):
-    """ Load BoW histograms of given images """
+def load_bow_database(data, images):
+    """ Load the BoW database, computing the histograms of the given
+        images that are missing or outdated.
+    """
     min_num_feature = 8
 
-    histograms = {}
-    bows = bow.load_bows(data.config)
+    bows = data.load_bows()
+    database = data.load_bow_database()
+    if database is None:
+        database = bow.BowDatabase(data.config['bow_file'], len(bows.words))
+
+    histograms, signatures = {}, {}
     for im in images:
+        signature = data.words_signature(im)
+        if database.signature(im) == signature:
+            continue
+        signatures[im] = signature
+        histograms[im] = None
+
         filtered_words = feature_loader.instance.load_words(data, im, masked=True)
         if filtered_words is None:
             logger.error("No words in image {}".format(im))
@@ -384,7 +514,12 @@ def load_histograms(data, images):
             continue
 
         histograms[im] = bows.histogram(filtered_words[:, 0])
-    return histograms
+
+    if histograms:
+        logger.info("Computed %d BoW histograms" % len(histograms))
+        database.update(histograms, signatures)
+        data.save_bow_database(database)
+    return database
 
 
 def vlad_histograms(images, data):
@@ -395,13 +530,11 @@ def vlad_histograms(images, data):
     if len(images) == 0:
         return {}
 
-    words = vlad.instance.load_words(data)
     vlads = {}
     for im in images:
-        _, features, _ = feature_loader.instance.load_points_features_colors(
-            data, im, masked=True)
-        if features is not None:
-            vlads[im] = vlad.instance.vlad_histogram(im, features, words)
+        histogram = vlad.instance.vlad_histogram(data, im)
+        if histogram is not None:
+            vlads[im] = histogram
 
     return vlads
 
@@ -4,13 +4,10 @@
 import copy
 import datetime
 import logging
-import math
-from collections import defaultdict
 from itertools import combinations
 
 import cv2
 import numpy as np
-import networkx as nx
 import six
 from timeit import default_timer as timer
 from six import iteritems
@@ -105,6 +102,59 @@ def _get_camera_from_bundle(ba, camera):
         camera.transition = c.transition
 
 
+def _add_shots_to_bundle(ba, shots, constant):
+    """Add shots to a bundle adjustment problem in a single call.
+
+    Shots are indexed by order of addition in the problem.
+    """
+    ba.add_shots([shot.id for shot in shots],
+                 [shot.camera.id for shot in shots],
+                 np.array([shot.pose.rotation for shot in shots]).reshape(-1, 3),
+                 np.array([shot.pose.translation for shot in shots]).reshape(-1, 3),
+                 constant)
+
+
+def _add_points_to_bundle(ba, points, constant):
+    """Add points to a bundle adjustment problem in a single call.
+
+    Points are indexed by order of addition in the problem.
+    """
+    ba.add_points([point.id for point in points],
+                  np.array([point.coordinates for point in points]).reshape(-1, 3),
+                  constant)
+
+
+def _add_observations_to_bundle(ba, graph, shot_ids, point_ids):
+    """Add the inlier observations of indexed shots and points."""
+    shots, points, features, scales = graph.observation_indexes(
+        shot_ids, point_ids)
+    ba.add_point_projection_observations(shots, points, features, scales)
+
+
+def _get_shots_from_bundle(ba, shots):
+    """Read the poses of the first indexed shots of a bundle problem."""
+    rotations, translations = ba.get_shot_poses()
+    for shot, r, t in zip(shots, rotations, translations):
+        shot.pose.rotation = r
+        shot.pose.translation = t
+
+
+def _get_points_from_bundle(ba, points):
+    """Read the coordinates of the indexed bundle points."""
+    positions = ba.get_point_positions()
+    for point, p in zip(points, positions.tolist()):
+        point.coordinates = p
+
+
+def _get_residuals_from_bundle(ba, graph, shot_ids, point_ids):
+    """Store the residuals of the inlier observations of a bundle problem.
+
+    Observations must have been added with _add_observations_to_bundle
+    before any other point projection observation.
+    """
+    graph.set_residuals(shot_ids, point_ids, ba.get_projection_residuals())
+
+
 def triangulate_gcp(point, shots):
     """Compute the reconstructed position of a GCP from observations."""
     reproj_threshold = 1.0
@@ -173,22 +223,13 @@ def bundle(graph, reconstruction, camera_priors, gcp, config):
         camera_prior = camera_priors[camera.id]
         _add_camera_to_bundle(ba, camera, camera_prior, fix_cameras)
 
-    for shot in reconstruction.shots.values():
-        r = shot.pose.rotation
-        t = shot.pose.translation
-        ba.add_shot(shot.id, shot.camera.id, r, t, False)
-
-    for point in reconstruction.points.values():
-        ba.add_point(point.id, point.coordinates, False)
-
-    for shot_id in reconstruction.shots:
-        if shot_id in graph:
-            for track in graph[shot_id]:
-                if track in reconstruction.points:
-                    point = graph[shot_id][track]['feature']
-                    scale = graph[shot_id][track]['feature_scale']
-                    ba.add_point_projection_observation(
-                        shot_id, track, point[0], point[1], scale)
+    shot_ids = list(reconstruction.shots)
+    point_ids = list(reconstruction.points)
+    shots = [reconstruction.shots[shot_id] for shot_id in shot_ids]
+    points = [reconstruction.points[point_id] for point_id in point_ids]
+    _add_shots_to_bundle(ba, shots, len(shots) * [False])
+    _add_points_to_bundle(ba, points, False)
+    _add_observations_to_bundle(ba, graph, shot_ids, point_ids)
 
     if config['bundle_use_gps']:
         for shot in reconstruction.shots.values():
@@ -231,15 +272,9 @@ def bundle(graph, reconstruction, camera_priors, gcp, config):
     for camera in reconstruction.cameras.values():
         _get_camera_from_bundle(ba, camera)
 
-    for shot in reconstruction.shots.values():
-        s = ba.get_shot(shot.id)
-        shot.pose.rotation = [s.r[0], s.r[1], s.r[2]]
-        shot.pose.translation = [s.t[0], s.t[1], s.t[2]]
-
-    for point in reconstruction.points.values():
-        p = ba.get_point(point.id)
-        point.coordinates = [p.p[0], p.p[1], p.p[2]]
-        point.reprojection_errors = p.reprojection_errors
+    _get_shots_from_bundle(ba, shots)
+    _get_points_from_bundle(ba, points)
+    _get_residuals_from_bundle(ba, graph, shot_ids, point_ids)
 
     chrono.lap('teardown')
 
@@ -264,13 +299,12 @@ def bundle_single_view(graph, reconstruction, shot_id, camera_priors, config):
     t = shot.pose.translation
     ba.add_shot(shot.id, camera.id, r, t, False)
 
-    for track_id in graph[shot_id]:
-        track = reconstruction.points[track_id]
-        ba.add_point(track_id, track.coordinates, True)
-        point = graph[shot_id][track_id]['feature']
-        scale = graph[shot_id][track_id]['feature_scale']
+    _, point_ids, features, scales = graph.observations([shot_id])
+    for point_id, feature, scale in zip(point_ids, features, scales):
+        point = reconstruction.points[point_id]
+        ba.add_point(point_id, point.coordinates, True)
         ba.add_point_projection_observation(
-            shot_id, track_id, point[0], point[1], scale)
+            shot_id, point_id, feature[0], feature[1], scale)
 
     if config['bundle_use_gps']:
         g = shot.metadata.gps_position
@@ -302,25 +336,45 @@ def bundle_single_view(graph, reconstruction, shot_id, camera_priors, config):
 
 def bundle_local(graph, reconstruction, camera_priors, gcp, central_shot_id, config):
     """Bundle adjust the local neighborhood of a shot."""
-    chrono = Chronometer()
-
     interior, boundary = shot_neighborhood(
         graph, reconstruction, central_shot_id,
         config['local_bundle_radius'],
         config['local_bundle_min_common_points'],
         config['local_bundle_max_shots'])
+    return _bundle_interior(graph, reconstruction, camera_priors, gcp,
+                            interior, boundary, 10, "DENSE_SCHUR", config)
+
+
+def bundle_shots_neighborhood(graph, reconstruction, camera_priors, gcp,
+                              shot_ids, config):
+    """Bundle adjust a set of shots and their direct neighbors.
+
+    Other shots sharing points with them are kept fixed, so that the
+    cost depends on the number of given shots, not on the size of the
+    reconstruction.
+    """
+    interior = set(shot_ids) | direct_shot_neighbors(
+        graph, reconstruction, shot_ids,
+        config['local_bundle_min_common_points'])
+    boundary = direct_shot_neighbors(graph, reconstruction, interior, 1)
+    return _bundle_interior(graph, reconstruction, camera_priors, gcp,
+                            interior, boundary, config['bundle_max_iterations'],
+                            "SPARSE_SCHUR", config)
+
+
+def _bundle_interior(graph, reconstruction, camera_priors, gcp, interior,
+                     boundary, max_iterations, linear_solver_type, config):
+    """Bundle adjust interior shots and their points, boundary shots fixed."""
+    chrono = Chronometer()
 
     logger.debug(
         'Local bundle sets: interior {}  boundary {}  other {}'.format(
             len(interior), len(boundary),
             len(reconstruction.shots) - len(interior) - len(boundary)))
 
-    point_ids = set()
-    for shot_id in interior:
-        if shot_id in graph:
-            for track in graph[shot_id]:
-                if track in reconstruction.points:
-                    point_ids.add(track)
+    _, interior_points, _, _ = graph.observations(interior)
+    point_ids = [point_id for point_id in set(interior_points)
+                 if point_id in reconstruction.points]
 
     ba = pybundle.BundleAdjuster()
 
@@ -328,24 +382,14 @@ def bundle_local(graph, reconstruction, camera_priors, gcp, central_shot_id, con
         camera_prior = camera_priors[camera.id]
         _add_camera_to_bundle(ba, camera, camera_prior, constant=True)
 
-    for shot_id in interior | boundary:
-        shot = reconstruction.shots[shot_id]
-        r = shot.pose.rotation
-        t = shot.pose.translation
-        ba.add_shot(shot.id, shot.camera.id, r, t, shot.id in boundary)
-
-    for point_id in point_ids:
-        point = reconstruction.points[point_id]
-        ba.add_point(point.id, point.coordinates, False)
-
-    for shot_id in interior | boundary:
-        if shot_id in graph:
-            for track in graph[shot_id]:
-                if track in point_ids:
-                    point = graph[shot_id][track]['feature']
-                    scale = graph[shot_id][track]['feature_scale']
-                    ba.add_point_projection_observation(
-                        shot_id, track, point[0], point[1], scale)
+    # Interior shots come first, so that they are the first indexed shots
+    shot_ids = list(interior) + list(boundary)
+    shots = [reconstruction.shots[shot_id] for shot_id in shot_ids]
+    points = [reconstruction.points[point_id] for point_id in point_ids]
+    _add_shots_to_bundle(
+        ba, shots, len(interior) * [False] + len(boundary) * [True])
+    _add_points_to_bundle(ba, points, False)
+    _add_observations_to_bundle(ba, graph, shot_ids, point_ids)
 
     if config['bundle_use_gps']:
         for shot_id in interior:
@@ -368,24 +412,16 @@ def bundle_local(graph, reconstruction, camera_priors, gcp, central_shot_id, con
         config['radial_distorsion_p2_sd'],
         config['radial_distorsion_k3_sd'])
     ba.set_num_threads(config['processes'])
-    ba.set_max_num_iterations(10)
-    ba.set_linear_solver_type("DENSE_SCHUR")
+    ba.set_max_num_iterations(max_iterations)
+    ba.set_linear_solver_type(linear_solver_type)
 
     chrono.lap('setup')
     ba.run()
     chrono.lap('run')
 
-    for shot_id in interior:
-        shot = reconstruction.shots[shot_id]
-        s = ba.get_shot(shot.id)
-        shot.pose.rotation = [s.r[0], s.r[1], s.r[2]]
-        shot.pose.translation = [s.t[0], s.t[1], s.t[2]]
-
-    for point in point_ids:
-        point = reconstruction.points[point]
-        p = ba.get_point(point.id)
-        point.coordinates = [p.p[0], p.p[1], p.p[2]]
-        point.reprojection_errors = p.reprojection_errors
+    _get_shots_from_bundle(ba, shots[:len(interior)])
+    _get_points_from_bundle(ba, points)
+    _get_residuals_from_bundle(ba, graph, shot_ids, point_ids)
 
     chrono.lap('teardown')
 
@@ -413,7 +449,6 @@ def shot_neighborhood(graph, reconstruction, central_shot_id, radius,
     Central shot is at distance 0.  Shots at distance n + 1 share at least
     min_common_points points with shots at distance n.
     """
-    max_boundary_size = 1000000
     interior = set([central_shot_id])
     for distance in range(1, radius):
         remaining = max_interior_size - len(interior)
@@ -422,28 +457,25 @@ def shot_neighborhood(graph, reconstruction, central_shot_id, radius,
         neighbors = direct_shot_neighbors(
             graph, reconstruction, interior, min_common_points, remaining)
         interior.update(neighbors)
-    boundary = direct_shot_neighbors(
-        graph, reconstruction, interior, 1, max_boundary_size)
+    boundary = direct_shot_neighbors(graph, reconstruction, interior, 1)
     return interior, boundary
 
 
 def direct_shot_neighbors(graph, reconstruction, shot_ids,
-                          min_common_points, max_neighbors):
-    """Reconstructed shots sharing reconstructed points with a shot set."""
-    points = set()
-    for shot_id in shot_ids:
-        for track_id in graph[shot_id]:
-            if track_id in reconstruction.points:
-                points.add(track_id)
-
-    candidate_shots = set(reconstruction.shots) - set(shot_ids)
-    common_points = defaultdict(int)
-    for track_id in points:
-        for neighbor in graph[track_id]:
-            if neighbor in candidate_shots:
-                common_points[neighbor] += 1
-
-    pairs = sorted(common_points.items(), key=lambda x: -x[1])
+                          min_common_points, max_neighbors=None):
+    """Reconstructed shots sharing reconstructed points with a shot set.
+
+    At most max_neighbors shots sharing the most points are returned,
+    all of them if None.
+    """
+    _, seen_points, _, _ = graph.observations(shot_ids)
+    point_ids = [point_id for point_id in set(seen_points)
+                 if point_id in reconstruction.points]
+    common_points = graph.common_points(shot_ids, point_ids)
+    pairs = sorted(((shot_id, num_points)
+                    for shot_id, num_points in common_points.items()
+                    if shot_id in reconstruction.shots),
+                   key=lambda x: -x[1])
     neighbors = set()
     for neighbor, num_points in pairs[:max_neighbors]:
         if num_points >= min_common_points:
@@ -733,7 +765,7 @@ def bootstrap_reconstruction(data, tracks_manager, camera_priors, im1, im2, p1,
     shot2.metadata = get_image_metadata(data, im2)
     reconstruction.add_shot(shot2)
 
-    graph_inliers = nx.Graph()
+    graph_inliers = tracking.InliersGraph()
     triangulate_shot_features(tracks_manager, graph_inliers, reconstruction, im1, data.config)
 
     logger.info("Triangulated: {}".format(len(reconstruction.points)))
@@ -773,6 +805,56 @@ def reconstructed_points_for_images(tracks_manager, reconstruction, images):
     return sorted(res.items(), key=lambda x: -x[1])
 
 
+class CandidateRanking:
+    """Number of reconstructed points visible on candidate images.
+
+    Counts are kept between growth steps. Updates only count the
+    observations of the points added to or removed from the
+    reconstruction since the previous update, instead of recounting
+    all reconstructed points. Finding these points still compares the
+    sets of point ids, which is linear in the number of points but only
+    involves hashing, since points are changed by many functions.
+
+    Images are sorted, so that ties are ranked the same in every run.
+    """
+
+    def __init__(self, tracks_manager, reconstruction, images):
+        self.tracks_manager = tracks_manager
+        self.reconstruction = reconstruction
+        self.images = sorted(images)
+        self.counts = np.zeros(len(self.images), dtype=int)
+        self.points = set()
+        self.update()
+
+    def update(self):
+        """Count the points added and removed since the last update."""
+        current = six.viewkeys(self.reconstruction.points)
+        added = list(current - self.points)
+        removed = list(self.points - current)
+        self.counts += self._count(added) - self._count(removed)
+        self.points.difference_update(removed)
+        self.points.update(added)
+
+    def candidates(self):
+        """Images not yet reconstructed and their number of points.
+
+        Returns:
+            A list of (image, num_point) pairs sorted by decreasing number
+            of points, as reconstructed_points_for_images.
+        """
+        order = np.argsort(-self.counts, kind='stable')
+        return [(self.images[i], int(self.counts[i])) for i in order
+                if self.images[i] not in self.reconstruction.shots]
+
+    def _count(self, point_ids):
+        """Number of the given points visible on each image."""
+        if not point_ids:
+            return np.zeros(len(self.images), dtype=int)
+        _, shots, _, _, _ = self.tracks_manager.get_tracks_observation_arrays(
+            point_ids, self.images)
+        return np.bincount(shots, minlength=len(self.images))
+
+
 def resect(tracks_manager, graph_inliers, reconstruction, shot_id,
            camera, metadata, threshold, min_inliers):
     """Try resecting and adding a shot to the reconstruction.
@@ -780,54 +862,94 @@ def resect(tracks_manager, graph_inliers, reconstruction, shot_id,
     Return:
         True on success.
     """
+    return resect_many(tracks_manager, graph_inliers, reconstruction,
+                       [(shot_id, camera, metadata)], threshold,
+                       min_inliers)[0]
 
-    bs, Xs, ids = [], [], []
-    for track, obs in tracks_manager.get_shot_observations(shot_id).items():
-        if track in reconstruction.points:
-            b = camera.pixel_bearing(obs.point)
-            bs.append(b)
-            Xs.append(reconstruction.points[track].coordinates)
-            ids.append(track)
-    bs = np.array(bs)
-    Xs = np.array(Xs)
-    if len(bs) < 5:
-        return False, {'num_common_points': len(bs)}
 
-    T = multiview.absolute_pose_ransac(
-        bs, Xs, threshold, 1000, 0.999)
+def resect_many(tracks_manager, graph_inliers, reconstruction, shots,
+                threshold, min_inliers, processes=1):
+    """Try resecting and adding several shots to the reconstruction.
 
-    R = T[:, :3]
-    t = T[:, 3]
+    Shots are resected independently from the current points, with their
+    absolute pose RANSAC run by a pool of threads, and then added in the
+    given order.
 
-    reprojected_bs = R.T.dot((Xs - t).T).T
-    reprojected_bs /= np.linalg.norm(reprojected_bs, axis=1)[:, np.newaxis]
+    Args:
+        shots: list of (shot_id, camera, metadata) tuples
 
-    inliers = np.linalg.norm(reprojected_bs - bs, axis=1) < threshold
-    ninliers = int(sum(inliers))
+    Return:
+        A list with the success and the report of each shot.
+    """
+    correspondences = [_resection_correspondences(
+        tracks_manager, reconstruction, shot_id, camera)
+        for shot_id, camera, _ in shots]
+    args = [(bs, Xs, threshold) for bs, Xs, _ in correspondences]
+    poses = parallel_map(_absolute_pose_ransac, args, processes,
+                         backend='threading')
+
+    results = []
+    for (shot_id, camera, metadata), (bs, Xs, ids), T in zip(
+            shots, correspondences, poses):
+        if T is None:
+            results.append((False, {'num_common_points': len(bs)}))
+            continue
 
-    logger.info("{} resection inliers: {} / {}".format(
-        shot_id, ninliers, len(bs)))
-    report = {
-        'num_common_points': len(bs),
-        'num_inliers': ninliers,
-    }
-    if ninliers >= min_inliers:
-        R = T[:, :3].T
-        t = -R.dot(T[:, 3])
-        shot = types.Shot()
-        shot.id = shot_id
-        shot.camera = camera
-        shot.pose = types.Pose()
-        shot.pose.set_rotation_matrix(R)
-        shot.pose.translation = t
-        shot.metadata = metadata
-        reconstruction.add_shot(shot)
-        for i, succeed in enumerate(inliers):
-            if succeed:
-                copy_graph_data(tracks_manager, graph_inliers, shot_id, ids[i])
-        return True, report
-    else:
-        return False, report
+        R = T[:, :3]
+        t = T[:, 3]
+
+        reprojected_bs = R.T.dot((Xs - t).T).T
+        reprojected_bs /= np.linalg.norm(reprojected_bs, axis=1)[:, np.newaxis]
+
+        inliers = np.linalg.norm(reprojected_bs - bs, axis=1) < threshold
+        ninliers = int(sum(inliers))
+
+        logger.info("{} resection inliers: {} / {}".format(
+            shot_id, ninliers, len(bs)))
+        report = {
+            'num_common_points': len(bs),
+            'num_inliers': ninliers,
+        }
+        if ninliers >= min_inliers:
+            R = T[:, :3].T
+            t = -R.dot(T[:, 3])
+            shot = types.Shot()
+            shot.id = shot_id
+            shot.camera = camera
+            shot.pose = types.Pose()
+            shot.pose.set_rotation_matrix(R)
+            shot.pose.translation = t
+            shot.metadata = metadata
+            reconstruction.add_shot(shot)
+            copy_graph_data(tracks_manager, graph_inliers, shot_id,
+                            [ids[i] for i in np.flatnonzero(inliers)])
+            results.append((True, report))
+        else:
+            results.append((False, report))
+    return results
+
+
+def _resection_correspondences(tracks_manager, reconstruction, shot_id,
+                               camera):
+    """Bearings and coordinates of the reconstructed points seen by a shot."""
+    ids, features = [], []
+    for track, obs in tracks_manager.get_shot_observations(shot_id).items():
+        if track in reconstruction.points:
+            ids.append(track)
+            features.append(obs.point)
+    if not ids:
+        return np.zeros((0, 3)), np.zeros((0, 3)), ids
+    bs = camera.pixel_bearing_many(np.array(features))
+    Xs = np.array([reconstruction.points[track].coordinates for track in ids])
+    return bs, Xs, ids
+
+
+def _absolute_pose_ransac(args):
+    """Absolute pose of bearings and points, None if there are too few."""
+    bs, Xs, threshold = args
+    if len(bs) < 5:
+        return None
+    return multiview.absolute_pose_ransac(bs, Xs, threshold, 1000, 0.999)
 
 
 def corresponding_tracks(tracks1, tracks2):
@@ -873,17 +995,20 @@ def resect_reconstruction(reconstruction1, reconstruction2, tracks_manager1,
     return True, similarity, inliers
 
 
-def copy_graph_data(tracks_manager, graph_inliers, shot_id, track_id):
-    if shot_id not in graph_inliers:
-        graph_inliers.add_node(shot_id, bipartite=0)
-    if track_id not in graph_inliers:
-        graph_inliers.add_node(track_id, bipartite=1)
-    observation = tracks_manager.get_observation(shot_id, track_id)
-    graph_inliers.add_edge(shot_id, track_id,
-                           feature=observation.point,
-                           feature_scale=observation.scale,
-                           feature_id=observation.id,
-                           feature_color=observation.color)
+def copy_graph_data(tracks_manager, graph_inliers, shot_id, track_ids):
+    """Add the observations of tracks by a shot to the inliers graph."""
+    observations = [tracks_manager.get_observation(shot_id, track_id)
+                    for track_id in track_ids]
+    _add_graph_observations(graph_inliers, len(track_ids) * [shot_id],
+                            track_ids, observations)
+
+
+def _add_graph_observations(graph_inliers, shot_ids, track_ids, observations):
+    graph_inliers.add_observations(
+        shot_ids, track_ids,
+        [obs.point for obs in observations],
+        [obs.scale for obs in observations],
+        [obs.id for obs in observations])
 
 
 class TrackTriangulator:
@@ -903,92 +1028,86 @@ class TrackTriangulator:
 
     def triangulate_robust(self, track, reproj_threshold, min_ray_angle_degrees):
         """Triangulate track in a RANSAC way and add point to reconstruction."""
-        os, bs, ids = [], [], []
-        for shot_id, obs in self.tracks_manager.get_track_observations(track).items():
-            if shot_id in self.reconstruction.shots:
-                shot = self.reconstruction.shots[shot_id]
-                os.append(self._shot_origin(shot))
-                b = shot.camera.pixel_bearing(np.array(obs.point))
-                r = self._shot_rotation_inverse(shot)
-                bs.append(r.dot(b))
-                ids.append(shot_id)
-
-        if len(ids) < 2:
-            return
-
-        best_inliers = []
-        best_point = types.Point()
-        best_point.id = track
-
-        combinatiom_tried = set()
-        ransac_tries = 11 # 0.99 proba, 60% inliers
-        all_combinations = list(combinations(range(len(ids)), 2))
-
-        thresholds = len(os) * [reproj_threshold]
-        for i in range(ransac_tries):
-            random_id = int(np.random.rand()*(len(all_combinations)-1))
-            if random_id in combinatiom_tried:
-                continue
-
-            i, j = all_combinations[random_id]
-            combinatiom_tried.add(random_id)
-
-            os_t = [os[i], os[j]]
-            bs_t = [bs[i], bs[j]]
-
-            e, X = pygeometry.triangulate_bearings_midpoint(
-                os_t, bs_t, thresholds, np.radians(min_ray_angle_degrees))
-
-            if X is not None:
-                reprojected_bs = X-os
-                reprojected_bs /= np.linalg.norm(reprojected_bs, axis=1)[:, np.newaxis]
-                inliers = np.linalg.norm(reprojected_bs - bs, axis=1) < reproj_threshold
-
-                if sum(inliers) > sum(best_inliers):
-                    best_inliers = inliers
-                    best_point.coordinates = X.tolist()
-
-                    pout = 0.99
-                    inliers_ratio = float(sum(best_inliers))/len(ids)
-                    if inliers_ratio == 1.0:
-                        break
-                    optimal_iter = math.log(1.0-pout)/math.log(1.0-inliers_ratio*inliers_ratio)
-                    if optimal_iter <= ransac_tries:
-                        break
-
-        if len(best_inliers) > 1:
-            self.reconstruction.add_point(best_point)
-            for i, succeed in enumerate(best_inliers):
-                if succeed:
-                    self._add_track_to_graph_inlier(track, ids[i])
+        self.triangulate_many([track], reproj_threshold,
+                              min_ray_angle_degrees, robust=True)
 
     def triangulate(self, track, reproj_threshold, min_ray_angle_degrees):
         """Triangulate track and add point to reconstruction."""
-        os, bs, ids = [], [], []
-        for shot_id, obs in self.tracks_manager.get_track_observations(track).items():
-            if shot_id in self.reconstruction.shots:
-                shot = self.reconstruction.shots[shot_id]
-                os.append(self._shot_origin(shot))
-                b = shot.camera.pixel_bearing(np.array(obs.point))
-                r = self._shot_rotation_inverse(shot)
-                bs.append(r.dot(b))
-                ids.append(shot_id)
-
-        if len(os) >= 2:
-            thresholds = len(os) * [reproj_threshold]
-            e, X = pygeometry.triangulate_bearings_midpoint(
-                os, bs, thresholds, np.radians(min_ray_angle_degrees))
-            if X is not None:
+        self.triangulate_many([track], reproj_threshold, min_ray_angle_degrees)
+
+    def triangulate_many(self, tracks, reproj_threshold, min_ray_angle_degrees,
+                         robust=False, processes=1):
+        """Triangulate tracks in native batches and add their points.
+
+        Observations of the tracks are gathered in flat arrays, with their
+        bearings computed shot by shot. If robust is True, tracks are
+        triangulated in a RANSAC way and only inlier observations are
+        added to the inliers graph, otherwise all observations must be
+        inliers.
+
+        With several processes, tracks are split in chunks triangulated by
+        a pool of threads, since native code releases the GIL. Chunks are
+        merged in order and random draws depend on the track position only,
+        so that results do not depend on the number of processes.
+        """
+        shot_ids = list(self.reconstruction.shots)
+        num_chunks = min(len(tracks), 4 * processes) if processes > 1 else 1
+        bounds = np.linspace(0, len(tracks), num_chunks + 1).astype(int)
+        args = [(tracks[begin:end], begin, shot_ids, reproj_threshold,
+                 np.radians(min_ray_angle_degrees), robust)
+                for begin, end in zip(bounds[:-1], bounds[1:])]
+        results = parallel_map(self._triangulate_chunk, args, processes,
+                               backend='threading')
+
+        for (chunk, _, _, _, _, _), result in zip(args, results):
+            (track_positions, shot_positions, features, scales, feature_ids,
+             points, triangulated, inliers) = result
+            for i in np.flatnonzero(triangulated):
                 point = types.Point()
-                point.id = track
-                point.coordinates = X.tolist()
+                point.id = chunk[i]
+                point.coordinates = points[i].tolist()
                 self.reconstruction.add_point(point)
-                for shot_id in ids:
-                    self._add_track_to_graph_inlier(track, shot_id)
+            self.graph_inliers.add_observations(
+                [shot_ids[i] for i in shot_positions[inliers]],
+                [chunk[i] for i in track_positions[inliers]],
+                features[inliers], scales[inliers], feature_ids[inliers])
+
+    def _triangulate_chunk(self, args):
+        """Triangulate a chunk of tracks without changing the reconstruction.
+
+        Returns the observation arrays of the chunk, the points, the mask
+        of triangulated tracks and the mask of inlier observations. Only
+        the shots observing the tracks are visited.
+        """
+        tracks, seed, shot_ids, threshold, min_angle, robust = args
+        (track_positions, shot_positions, features, scales,
+         feature_ids) = self.tracks_manager.get_tracks_observation_arrays(
+            tracks, shot_ids)
+
+        shots, observation_shot = np.unique(shot_positions,
+                                            return_inverse=True)
+        origins = np.empty((len(shots), 3))
+        bearings = np.empty((len(features), 3))
+        order = np.argsort(observation_shot, kind='stable')
+        shot_bounds = np.searchsorted(observation_shot[order],
+                                      np.arange(len(shots) + 1))
+        for i, position in enumerate(shots):
+            at_shot = order[shot_bounds[i]:shot_bounds[i + 1]]
+            shot = self.reconstruction.shots[shot_ids[position]]
+            origins[i] = self._shot_origin(shot)
+            b = shot.camera.pixel_bearing_many(features[at_shot])
+            bearings[at_shot] = b.dot(self._shot_rotation_inverse(shot).T)
+
+        offsets = np.searchsorted(track_positions, np.arange(len(tracks) + 1))
+        points, triangulated, inliers = pygeometry.triangulate_bearings_midpoint_many(
+            origins[observation_shot], bearings, offsets.astype(np.int32),
+            threshold, min_angle, robust, seed, 1)
+        return (track_positions, shot_positions, features, scales,
+                feature_ids, points, triangulated, inliers)
 
     def triangulate_dlt(self, track, reproj_threshold, min_ray_angle_degrees):
         """Triangulate track using DLT and add point to reconstruction."""
-        Rts, bs, ids = [], [], []
+        Rts, bs, ids, observations = [], [], [], []
         for shot_id, obs in self.tracks_manager.get_track_observations(track).items():
             if shot_id in self.reconstruction.shots:
                 shot = self.reconstruction.shots[shot_id]
@@ -996,6 +1115,7 @@ class TrackTriangulator:
                 b = shot.camera.pixel_bearing(np.array(obs.point))
                 bs.append(b)
                 ids.append(shot_id)
+                observations.append(obs)
 
         if len(Rts) >= 2:
             e, X = pygeometry.triangulate_bearings_dlt(
@@ -1005,11 +1125,11 @@ class TrackTriangulator:
                 point.id = track
                 point.coordinates = X.tolist()
                 self.reconstruction.add_point(point)
-                for shot_id in ids:
-                    self._add_track_to_graph_inlier(track, shot_id)
+                self._add_track_to_graph_inlier(track, ids, observations)
 
-    def _add_track_to_graph_inlier(self, track_id, shot_id):
-        copy_graph_data(self.tracks_manager, self.graph_inliers, shot_id, track_id)
+    def _add_track_to_graph_inlier(self, track_id, shot_ids, observations):
+        _add_graph_observations(self.graph_inliers, shot_ids,
+                                len(shot_ids) * [track_id], observations)
 
     def _shot_origin(self, shot):
         if shot.id in self.origins:
@@ -1043,9 +1163,10 @@ def triangulate_shot_features(tracks_manager, graph_inliers, reconstruction, sho
 
     triangulator = TrackTriangulator(tracks_manager, graph_inliers, reconstruction)
 
-    for track in tracks_manager.get_shot_observations(shot_id):
-        if track not in reconstruction.points:
-            triangulator.triangulate(track, reproj_threshold, min_ray_angle)
+    tracks = [track for track in tracks_manager.get_shot_observations(shot_id)
+              if track not in reconstruction.points]
+    triangulator.triangulate_many(tracks, reproj_threshold, min_ray_angle,
+                                  processes=config['processes'])
 
 
 def retriangulate(tracks_manager, graph_inliers, reconstruction, config):
@@ -1067,11 +1188,11 @@ def retriangulate(tracks_manager, graph_inliers, reconstruction, config):
     for image in reconstruction.shots.keys():
         if image in all_shots_ids:
             tracks.update(tracks_manager.get_shot_observations(image).keys())
-    for track in tracks:
-        if config['triangulation_type'] == 'ROBUST':
-            triangulator.triangulate_robust(track, threshold, min_ray_angle)
-        elif config['triangulation_type'] == 'FULL':
-            triangulator.triangulate(track, threshold, min_ray_angle)
+    if config['triangulation_type'] in ('ROBUST', 'FULL'):
+        triangulator.triangulate_many(
+            sorted(tracks), threshold, min_ray_angle,
+            robust=config['triangulation_type'] == 'ROBUST',
+            processes=config['processes'])
 
     report['num_points_after'] = len(reconstruction.points)
     chrono.lap('retriangulate')
@@ -1079,52 +1200,42 @@ def retriangulate(tracks_manager, graph_inliers, reconstruction, config):
     return report
 
 
-def get_error_distribution(points):
-    all_errors = []
-    for track in points.values():
-        all_errors += track.reprojection_errors.values()
-    robust_mean = np.median(all_errors, axis=0)
-    robust_std = 1.486*np.median(np.linalg.norm(all_errors-robust_mean, axis=1))
+def get_error_distribution(residuals):
+    """Robust mean and standard deviation of an array of residuals."""
+    robust_mean = np.median(residuals, axis=0)
+    robust_std = 1.486*np.median(np.linalg.norm(residuals-robust_mean, axis=1))
     return robust_mean, robust_std
 
 
-def get_actual_threshold(config, points):
+def get_actual_threshold(config, residuals):
     filter_type = config['bundle_outlier_filtering_type']
     if filter_type == 'FIXED':
         return config['bundle_outlier_fixed_threshold']
     elif filter_type == 'AUTO':
-        mean, std = get_error_distribution(points)
+        mean, std = get_error_distribution(residuals)
         return config['bundle_outlier_auto_ratio']*np.linalg.norm(mean+std)
     else:
         return 1.0
 
 
 def remove_outliers(graph, reconstruction, config, points=None):
-    """Remove points with large reprojection error.
+    """Remove observations with large reprojection residuals.
 
-    A list of point ids to be processed can be given in ``points``.
+    Residuals are the ones stored in the graph by the last bundle
+    adjustment of each observation. Points left with less than two
+    observations are removed. A list of point ids to be processed can be
+    given in ``points``.
     """
-    if points is None:
-        points = reconstruction.points
-    threshold_sqr = get_actual_threshold(config, reconstruction.points)**2
-    outliers = []
-    for point_id in points:
-        for shot_id, error in reconstruction.points[point_id].reprojection_errors.items():
-            error_sqr = error[0]**2 + error[1]**2
-            if error_sqr > threshold_sqr:
-                outliers.append((point_id, shot_id))
-
-    for track, shot_id in outliers:
-        del reconstruction.points[track].reprojection_errors[shot_id]
-        graph.remove_edge(track, shot_id)
-    for track, _ in outliers:
-        if track not in reconstruction.points:
-            continue
-        if len(graph[track]) < 2:
-            del reconstruction.points[track]
-            graph.remove_node(track)
-    logger.info("Removed outliers: {}".format(len(outliers)))
-    return len(outliers)
+    threshold = get_actual_threshold(config, graph.residuals())
+    num_outliers, tracks = graph.remove_residual_outliers(threshold, points)
+
+    num_observations = graph.num_point_observations(tracks)
+    removed = [t for t, n in zip(tracks, num_observations) if n < 2]
+    for track in removed:
+        del reconstruction.points[track]
+    graph.remove_points(removed)
+    logger.info("Removed outliers: {}".format(num_outliers))
+    return num_outliers
 
 
 def shot_lla_and_compass(shot, reference):
@@ -1252,17 +1363,36 @@ class ShouldRetriangulate:
         self.num_points_last = len(self.reconstruction.points)
 
 
-def grow_reconstruction(data, tracks_manager, graph_inliers, reconstruction, images, camera_priors, gcp):
-    """Incrementally add shots to an initial reconstruction."""
+def grow_reconstruction(data, tracks_manager, graph_inliers, reconstruction,
+                        images, camera_priors, gcp, local_only=False):
+    """Incrementally add shots to an initial reconstruction.
+
+    If local_only is True, the reconstruction is neither aligned nor
+    bundle adjusted as a whole: added shots are bundle adjusted with
+    their neighborhood, as when extending a large reconstruction.
+
+    At each step, the best candidates are resected in batches of
+    resection_batch_size images until some are added. Points of the
+    added images are then triangulated, and bundle adjustment runs once
+    for the whole batch.
+
+    Images of a batch are resected independently from the points
+    reconstructed before the batch, without checking whether they see
+    the same tracks. Their points are then triangulated in rank order, so
+    that tracks shared by images of the batch are triangulated with the
+    first of them, from all the shots added by the batch.
+    """
     config = data.config
-    report = {'steps': []}
+    report = {'steps': [], 'batches': []}
 
-    align_reconstruction(reconstruction, gcp, config)
-    bundle(graph_inliers, reconstruction, camera_priors, None, config)
-    remove_outliers(graph_inliers, reconstruction, config)
+    if not local_only:
+        align_reconstruction(reconstruction, gcp, config)
+        bundle(graph_inliers, reconstruction, camera_priors, None, config)
+        remove_outliers(graph_inliers, reconstruction, config)
 
     should_bundle = ShouldBundle(data, reconstruction)
     should_retriangulate = ShouldRetriangulate(data, reconstruction)
+    ranking = CandidateRanking(tracks_manager, reconstruction, images)
     while True:
         if config['save_partial_reconstructions']:
             paint_reconstruction(data, tracks_manager, reconstruction)
@@ -1270,88 +1400,111 @@ def grow_reconstruction(data, tracks_manager, graph_inliers, reconstruction, ima
                 [reconstruction], 'reconstruction.{}.json'.format(
                     datetime.datetime.now().isoformat().replace(':', '_')))
 
-        candidates = reconstructed_points_for_images(
-            tracks_manager, reconstruction, images)
+        ranking.update()
+        candidates = ranking.candidates()
         if not candidates:
             break
 
         logger.info("-------------------------------------------------------")
         threshold = data.config['resection_threshold']
         min_inliers = data.config['resection_min_inliers']
-        for image, num_tracks in candidates:
-
-            camera = reconstruction.cameras[data.load_exif(image)['camera']]
-            metadata = get_image_metadata(data, image)
-            ok, resrep = resect(tracks_manager, graph_inliers, reconstruction, image,
-                                camera, metadata, threshold, min_inliers)
-            if not ok:
-                continue
-
-            bundle_single_view(graph_inliers, reconstruction, image,
-                               camera_priors, data.config)
-
-            logger.info("Adding {0} to the reconstruction".format(image))
-            step = {
-                'image': image,
-                'resection': resrep,
-                'memory_usage': current_memory_usage()
-            }
-            report['steps'].append(step)
-            images.remove(image)
+        batch_size = data.config['resection_batch_size']
+        added = []
+        for begin in range(0, len(candidates), batch_size):
+            batch = [image for image, _ in candidates[begin:begin + batch_size]]
+            shots = [(image,
+                      reconstruction.cameras[data.load_exif(image)['camera']],
+                      get_image_metadata(data, image))
+                     for image in batch]
+            results = resect_many(tracks_manager, graph_inliers,
+                                  reconstruction, shots, threshold,
+                                  min_inliers, config['processes'])
+            for image, (ok, resrep) in zip(batch, results):
+                if not ok:
+                    continue
+
+                bundle_single_view(graph_inliers, reconstruction, image,
+                                   camera_priors, data.config)
+
+                logger.info("Adding {0} to the reconstruction".format(image))
+                step = {
+                    'image': image,
+                    'resection': resrep,
+                    'memory_usage': current_memory_usage()
+                }
+                report['steps'].append(step)
+                images.remove(image)
+                added.append(image)
+            if added:
+                break
+        else:
+            logger.info("Some images can not be added")
+            break
 
+        report['batches'].append({
+            'images': added,
+            'num_resected': begin + len(batch),
+        })
+        for image, step in zip(added, report['steps'][-len(added):]):
             np_before = len(reconstruction.points)
             triangulate_shot_features(tracks_manager, graph_inliers, reconstruction, image, config)
             np_after = len(reconstruction.points)
             step['triangulated_points'] = np_after - np_before
 
-            if should_retriangulate.should():
-                logger.info("Re-triangulating")
-                align_reconstruction(reconstruction, gcp, config)
-                b1rep = bundle(graph_inliers, reconstruction, camera_priors,
-                               None, config)
-                rrep = retriangulate(tracks_manager, graph_inliers, reconstruction, config)
-                b2rep = bundle(graph_inliers, reconstruction, camera_priors,
-                               None, config)
-                remove_outliers(graph_inliers, reconstruction, config)
-                step['bundle'] = b1rep
-                step['retriangulation'] = rrep
-                step['bundle_after_retriangulation'] = b2rep
-                should_retriangulate.done()
-                should_bundle.done()
-            elif should_bundle.should():
-                align_reconstruction(reconstruction, gcp, config)
-                brep = bundle(graph_inliers, reconstruction, camera_priors,
-                              None, config)
-                remove_outliers(graph_inliers, reconstruction, config)
-                step['bundle'] = brep
-                should_bundle.done()
-            elif config['local_bundle_radius'] > 0:
+        # Bundle reports go to the step of the last image of the batch
+        if not local_only and should_retriangulate.should():
+            logger.info("Re-triangulating")
+            align_reconstruction(reconstruction, gcp, config)
+            b1rep = bundle(graph_inliers, reconstruction, camera_priors,
+                           None, config)
+            rrep = retriangulate(tracks_manager, graph_inliers, reconstruction, config)
+            b2rep = bundle(graph_inliers, reconstruction, camera_priors,
+                           None, config)
+            remove_outliers(graph_inliers, reconstruction, config)
+            step['bundle'] = b1rep
+            step['retriangulation'] = rrep
+            step['bundle_after_retriangulation'] = b2rep
+            should_retriangulate.done()
+            should_bundle.done()
+        elif not local_only and should_bundle.should():
+            align_reconstruction(reconstruction, gcp, config)
+            brep = bundle(graph_inliers, reconstruction, camera_priors,
+                          None, config)
+            remove_outliers(graph_inliers, reconstruction, config)
+            step['bundle'] = brep
+            should_bundle.done()
+        elif config['local_bundle_radius'] > 0:
+            if len(added) == 1:
                 bundled_points, brep = bundle_local(
-                    graph_inliers, reconstruction, camera_priors, None, image, config)
-                remove_outliers(
-                    graph_inliers, reconstruction, config, bundled_points)
-                step['local_bundle'] = brep
-
-            break
-        else:
-            logger.info("Some images can not be added")
-            break
+                    graph_inliers, reconstruction, camera_priors, None,
+                    added[0], config)
+            else:
+                bundled_points, brep = bundle_shots_neighborhood(
+                    graph_inliers, reconstruction, camera_priors, None,
+                    added, config)
+            remove_outliers(
+                graph_inliers, reconstruction, config, bundled_points)
+            step['local_bundle'] = brep
 
     logger.info("-------------------------------------------------------")
 
-    align_reconstruction(reconstruction, gcp, config)
-    bundle(graph_inliers, reconstruction, camera_priors, gcp, config)
-    remove_outliers(graph_inliers, reconstruction, config)
+    if not local_only:
+        align_reconstruction(reconstruction, gcp, config)
+        bundle(graph_inliers, reconstruction, camera_priors, gcp, config)
+        remove_outliers(graph_inliers, reconstruction, config)
+    elif report['steps']:
+        added = [step['image'] for step in report['steps']]
+        bundled_points, report['bundle'] = bundle_shots_neighborhood(
+            graph_inliers, reconstruction, camera_priors, gcp, added, config)
+        remove_outliers(graph_inliers, reconstruction, config, bundled_points)
 
     paint_reconstruction(data, tracks_manager, reconstruction)
     return reconstruction, report
 
 
 def _length_histogram(points, graph):
-    hist = defaultdict(int)
-    for p in points:
-        hist[len(graph[p])] += 1
-    return np.array(list(hist.keys())), np.array(list(hist.values()))
+    lengths = graph.num_point_observations(list(points))
+    return np.unique(lengths, return_counts=True)
 
 
 def compute_statistics(reconstruction, graph):
@@ -1365,9 +1518,10 @@ def compute_statistics(reconstruction, graph):
         stats['average_track_length'] = float(stats['observations_count'])/len(reconstruction.points)
     else:
         stats['average_track_length'] = -1
-    tracks_notwo = sum([1 if len(graph[p]) > 2 else 0 for p in reconstruction.points])
+    notwo = hist > 2
+    tracks_notwo = int(sum(values[notwo]))
     if tracks_notwo > 0:
-        stats['average_track_length_notwo'] = float(sum(hist[1:]*values[1:]))/tracks_notwo
+        stats['average_track_length_notwo'] = float(sum(hist[notwo]*values[notwo]))/tracks_notwo
     else:
         stats['average_track_length_notwo'] = -1
     return stats
@@ -1423,6 +1577,86 @@ def incremental_reconstruction(data, tracks_manager):
     return report, reconstructions
 
 
+def graph_inliers_from_reconstruction(tracks_manager, reconstruction):
+    """Rebuild the inliers graph of a saved reconstruction.
+
+    Observations of the reconstructed points by the reconstructed shots
+    are taken from the tracks, and their reprojection residuals are
+    computed so that outliers can be removed with remove_outliers.
+    Points observed less than twice are removed.
+    """
+    graph_inliers = tracking.InliersGraph()
+    shots = set(tracks_manager.get_shot_ids())
+    for shot_id, shot in reconstruction.shots.items():
+        if shot_id not in shots:
+            continue
+        observations = tracks_manager.get_shot_observations(shot_id)
+        track_ids = [t for t in observations if t in reconstruction.points]
+        if not track_ids:
+            continue
+        coordinates = np.array(
+            [reconstruction.points[t].coordinates for t in track_ids])
+        features = np.array([observations[t].point for t in track_ids])
+        errors = shot.project_many(coordinates) - features
+        graph_inliers.add_observations(
+            len(track_ids) * [shot_id], track_ids, features,
+            [observations[t].scale for t in track_ids],
+            [observations[t].id for t in track_ids], errors)
+
+    point_ids = list(reconstruction.points)
+    num_observations = graph_inliers.num_point_observations(point_ids)
+    removed = [p for p, n in zip(point_ids, num_observations) if n < 2]
+    for point_id in removed:
+        del reconstruction.points[point_id]
+    graph_inliers.remove_points(removed)
+    return graph_inliers
+
+
+def extend_reconstruction(data, tracks_manager, reconstructions):
+    """Add the images missing from existing reconstructions.
+
+    Images of the tracks manager which are in no reconstruction are
+    added to the reconstructions, largest first. Reconstructions are not
+    bootstrapped again: their inliers graph is rebuilt from the tracks,
+    and only the added shots and their neighborhood are bundle adjusted.
+    """
+    logger.info("Extending {} reconstructions".format(len(reconstructions)))
+    report = {}
+    chrono = Chronometer()
+
+    camera_priors = data.load_camera_models()
+    gcp = data.load_ground_control_points()
+    remaining_images = set(tracks_manager.get_shot_ids())
+    for reconstruction in reconstructions:
+        remaining_images -= set(reconstruction.shots)
+    report['num_new_images'] = len(remaining_images)
+
+    reconstructions = sorted(reconstructions, key=lambda x: -len(x.shots))
+    report['reconstructions'] = []
+    for reconstruction in reconstructions:
+        if not remaining_images:
+            break
+        rec_report = {}
+        report['reconstructions'].append(rec_report)
+        for camera_id, camera in camera_priors.items():
+            if camera_id not in reconstruction.cameras:
+                reconstruction.cameras[camera_id] = copy.deepcopy(camera)
+
+        graph_inliers = graph_inliers_from_reconstruction(
+            tracks_manager, reconstruction)
+        remove_outliers(graph_inliers, reconstruction, data.config)
+        reconstruction, rec_report['grow'] = grow_reconstruction(
+            data, tracks_manager, graph_inliers, reconstruction,
+            remaining_images, camera_priors, gcp, local_only=True)
+        rec_report['stats'] = compute_statistics(reconstruction, graph_inliers)
+        logger.info(rec_report['stats'])
+
+    chrono.lap('extend_reconstructions')
+    report['wall_times'] = dict(chrono.lap_times())
+    report['not_reconstructed_images'] = list(remaining_images)
+    return report, reconstructions
+
+
 class Chronometer:
     def __init__(self):
         self.start()
@@ -2,6 +2,7 @@
 #include <cstdio>
 #include <iostream>
 #include <fstream>
+#include <limits>
 #include <map>
 #include <vector>
 #include <string>
@@ -23,6 +24,10 @@ enum {
   BA_SHOT_NUM_PARAMS
 };
 
+typedef Eigen::Matrix<double, Eigen::Dynamic, 2, Eigen::RowMajor> BAMatrixX2d;
+typedef Eigen::Matrix<double, Eigen::Dynamic, 3, Eigen::RowMajor> BAMatrixX3d;
+typedef Eigen::Matrix<double, Eigen::Dynamic, Eigen::Dynamic, Eigen::RowMajor> BAMatrixXd;
+
 enum PositionConstraintType {
   X = 0x1,
   Y = 0x2,
@@ -200,7 +205,6 @@ struct BAPoint {
   std::string id;
   Eigen::Matrix<double, 3, 1> parameters;
   bool constant;
-  std::map<std::string, Eigen::VectorXd> reprojection_errors;
 
   Eigen::Vector3d GetPoint() const {return parameters;}
   void SetPoint(const Eigen::Vector3d &p) {parameters = p;}
@@ -484,6 +488,24 @@ class BundleAdjuster {
                 const Eigen::Vector3d& position,
                 bool constant);
 
+  // bulk setup : shots and points added with AddShots and AddPoints are
+  // indexed by order of addition, and observations refer to these indexes
+  void AddShots(
+      const std::vector<std::string> &ids,
+      const std::vector<std::string> &cameras,
+      const BAMatrixX3d &rotations,
+      const BAMatrixX3d &translations,
+      const std::vector<bool> &constant);
+  void AddPoints(
+      const std::vector<std::string> &ids,
+      const BAMatrixX3d &positions,
+      bool constant);
+  void AddPointProjectionObservations(
+      const Eigen::VectorXi &shots,
+      const Eigen::VectorXi &points,
+      const BAMatrixX2d &coordinates,
+      const Eigen::VectorXd &std_deviations);
+
   // averaging constraints
 
   // point projection
@@ -605,6 +627,7 @@ class BundleAdjuster {
       ceres::Problem *problem);
   void ComputeCovariances(ceres::Problem *problem);
   void ComputeReprojectionErrors();
+  void SetProjectionResidual(int index, const Eigen::VectorXd &residual);
 
   // getters
   BAPerspectiveCamera GetPerspectiveCamera(const std::string &id);
@@ -616,6 +639,14 @@ class BundleAdjuster {
   BAReconstruction GetReconstruction(const std::string &id);
   BAPoint GetPoint(const std::string &id);
 
+  // bulk getters of the indexed shots and points
+  std::pair<BAMatrixX3d, BAMatrixX3d> GetShotPoses() const;
+  BAMatrixX3d GetPointPositions() const;
+  // residuals of the point projection observations, in order of addition,
+  // with 3 columns if any camera is equirectangular, and NaN if reprojection
+  // errors are not computed
+  BAMatrixXd GetProjectionResiduals() const;
+
   // minimization details
   std::string BriefReport();
   std::string FullReport();
@@ -626,6 +657,10 @@ class BundleAdjuster {
   std::map<std::string, BAShot> shots_;
   std::map<std::string, BAReconstruction> reconstructions_;
   std::map<std::string, BAPoint> points_;
+
+  // shots and points added in bulk, by index
+  std::vector<BAShot *> indexed_shots_;
+  std::vector<BAPoint *> indexed_points_;
   
   // minimization constraints
 
@@ -678,6 +713,8 @@ class BundleAdjuster {
   bool compute_covariances_;
   bool covariance_estimation_valid_;
   bool compute_reprojection_errors_;
+  BAMatrixX3d projection_residuals_;
+  int projection_residuals_size_;
 
   int max_num_iterations_;
   int num_threads_;
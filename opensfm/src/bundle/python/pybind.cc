@@ -28,6 +28,9 @@ PYBIND11_MODULE(pybundle, m) {
     .def("get_equirectangular_camera", &BundleAdjuster::GetEquirectangularCamera)
     .def("get_shot", &BundleAdjuster::GetShot)
     .def("get_point", &BundleAdjuster::GetPoint)
+    .def("get_shot_poses", &BundleAdjuster::GetShotPoses)
+    .def("get_point_positions", &BundleAdjuster::GetPointPositions)
+    .def("get_projection_residuals", &BundleAdjuster::GetProjectionResiduals)
     .def("set_scale_sharing", &BundleAdjuster::SetScaleSharing)
     .def("get_reconstruction", &BundleAdjuster::GetReconstruction)
     .def("add_perspective_camera", &BundleAdjuster::AddPerspectiveCamera)
@@ -37,9 +40,12 @@ PYBIND11_MODULE(pybundle, m) {
     .def("add_equirectangular_camera", &BundleAdjuster::AddEquirectangularCamera)
     .def("add_shot", &BundleAdjuster::AddShot)
     .def("add_point", &BundleAdjuster::AddPoint)
+    .def("add_shots", &BundleAdjuster::AddShots)
+    .def("add_points", &BundleAdjuster::AddPoints)
     .def("add_reconstruction", &BundleAdjuster::AddReconstruction)
     .def("add_reconstruction_shot", &BundleAdjuster::AddReconstructionShot)
     .def("add_point_projection_observation", &BundleAdjuster::AddPointProjectionObservation)
+    .def("add_point_projection_observations", &BundleAdjuster::AddPointProjectionObservations)
     .def("add_relative_motion", &BundleAdjuster::AddRelativeMotion)
     .def("add_relative_similarity", &BundleAdjuster::AddRelativeSimilarity)
     .def("add_relative_rotation", &BundleAdjuster::AddRelativeRotation)
@@ -154,7 +160,6 @@ PYBIND11_MODULE(pybundle, m) {
     .def(py::init())
     .def_property("p", &BAPoint::GetPoint, &BAPoint::SetPoint)
     .def_readwrite("id", &BAPoint::id)
-    .def_readwrite("reprojection_errors", &BAPoint::reprojection_errors)
   ;
 
   py::class_<BARelativeMotion>(m, "BARelativeMotion")
@@ -19,6 +19,7 @@ BundleAdjuster::BundleAdjuster() {
   compute_covariances_ = false;
   covariance_estimation_valid_ = false;
   compute_reprojection_errors_ = true;
+  projection_residuals_size_ = 2;
   adjust_absolute_position_std_ = false;
   max_num_iterations_ = 500;
   num_threads_ = 1;
@@ -152,6 +153,46 @@ void BundleAdjuster::AddPoint(const std::string &id,
   points_[id] = p;
 }
 
+void BundleAdjuster::AddShots(const std::vector<std::string> &ids,
+                              const std::vector<std::string> &cameras,
+                              const BAMatrixX3d &rotations,
+                              const BAMatrixX3d &translations,
+                              const std::vector<bool> &constant) {
+  for (int i = 0; i < ids.size(); ++i) {
+    AddShot(ids[i], cameras[i], rotations.row(i).transpose(),
+            translations.row(i).transpose(), constant[i]);
+    indexed_shots_.push_back(&shots_[ids[i]]);
+  }
+}
+
+void BundleAdjuster::AddPoints(const std::vector<std::string> &ids,
+                               const BAMatrixX3d &positions,
+                               bool constant) {
+  for (int i = 0; i < ids.size(); ++i) {
+    AddPoint(ids[i], positions.row(i).transpose(), constant);
+    indexed_points_.push_back(&points_[ids[i]]);
+  }
+}
+
+void BundleAdjuster::AddPointProjectionObservations(
+    const Eigen::VectorXi &shots,
+    const Eigen::VectorXi &points,
+    const BAMatrixX2d &coordinates,
+    const Eigen::VectorXd &std_deviations) {
+  point_projection_observations_.reserve(
+      point_projection_observations_.size() + shots.size());
+  for (int i = 0; i < shots.size(); ++i) {
+    BAPointProjectionObservation o;
+    o.shot = indexed_shots_.at(shots[i]);
+    o.camera = cameras_[o.shot->camera].get();
+    o.point = indexed_points_.at(points[i]);
+    o.coordinates[0] = coordinates(i, 0);
+    o.coordinates[1] = coordinates(i, 1);
+    o.std_deviation = std_deviations[i];
+    point_projection_observations_.push_back(o);
+  }
+}
+
 void BundleAdjuster::AddPointProjectionObservation(
     const std::string &shot,
     const std::string &point,
@@ -927,6 +968,12 @@ void BundleAdjuster::Run() {
   }
   if (compute_reprojection_errors_) {
     ComputeReprojectionErrors();
+  } else {
+    // Keep one unknown residual per observation
+    projection_residuals_ = BAMatrixX3d::Constant(
+        point_projection_observations_.size(), 3,
+        std::numeric_limits<double>::quiet_NaN());
+    projection_residuals_size_ = 2;
   }
 }
 
@@ -1063,9 +1110,9 @@ void BundleAdjuster::ComputeCovariances(ceres::Problem *problem) {
 
 void BundleAdjuster::ComputeReprojectionErrors() {
   // Init errors
-  for (auto &i : points_) {
-    i.second.reprojection_errors.clear();
-  }
+  projection_residuals_ =
+      BAMatrixX3d::Zero(point_projection_observations_.size(), 3);
+  projection_residuals_size_ = 2;
 
   // Sum over all observations
   for (int i = 0; i < point_projection_observations_.size(); ++i) {
@@ -1083,7 +1130,7 @@ void BundleAdjuster::ComputeReprojectionErrors() {
             projection.shot->parameters.data(),
             projection.point->parameters.data(),
             residuals);
-        projection.point->reprojection_errors[projection.shot->id] = Eigen::Vector2d(residuals[0], residuals[1]);
+        SetProjectionResidual(i, Eigen::Vector2d(residuals[0], residuals[1]));
         break;
       }
       case BA_BROWN_PERSPECTIVE_CAMERA:
@@ -1098,7 +1145,7 @@ void BundleAdjuster::ComputeReprojectionErrors() {
               projection.shot->parameters.data(),
               projection.point->parameters.data(),
               residuals);
-        projection.point->reprojection_errors[projection.shot->id] = Eigen::Vector2d(residuals[0], residuals[1]);
+        SetProjectionResidual(i, Eigen::Vector2d(residuals[0], residuals[1]));
         break;
       }
       case BA_FISHEYE_CAMERA:
@@ -1113,7 +1160,7 @@ void BundleAdjuster::ComputeReprojectionErrors() {
             projection.shot->parameters.data(),
             projection.point->parameters.data(),
             residuals);
-        projection.point->reprojection_errors[projection.shot->id] = Eigen::Vector2d(residuals[0], residuals[1]);
+        SetProjectionResidual(i, Eigen::Vector2d(residuals[0], residuals[1]));
         break;
       }
       case BA_DUAL_CAMERA:
@@ -1129,7 +1176,7 @@ void BundleAdjuster::ComputeReprojectionErrors() {
             projection.shot->parameters.data(),
             projection.point->parameters.data(),
             residuals);
-        projection.point->reprojection_errors[projection.shot->id] = Eigen::Vector2d(residuals[0], residuals[1]);
+        SetProjectionResidual(i, Eigen::Vector2d(residuals[0], residuals[1]));
         break;
       }
       case BA_EQUIRECTANGULAR_CAMERA:
@@ -1143,13 +1190,21 @@ void BundleAdjuster::ComputeReprojectionErrors() {
         ere(projection.shot->parameters.data(),
             projection.point->parameters.data(),
             residuals);
-        projection.point->reprojection_errors[projection.shot->id] = Eigen::Vector3d(residuals[0], residuals[1], residuals[2]);
+        SetProjectionResidual(i, Eigen::Vector3d(residuals[0], residuals[1], residuals[2]));
         break;
       }
     }
   }
 }
 
+void BundleAdjuster::SetProjectionResidual(int index,
+                                           const Eigen::VectorXd &residual) {
+  projection_residuals_.row(index).head(residual.size()) =
+      residual.transpose();
+  projection_residuals_size_ =
+      std::max<int>(projection_residuals_size_, residual.size());
+}
+
 BAPerspectiveCamera BundleAdjuster::GetPerspectiveCamera(
     const std::string &id) {
   return *(BAPerspectiveCamera *)cameras_[id].get();
@@ -1183,6 +1238,28 @@ BAPoint BundleAdjuster::GetPoint(const std::string &id) {
   return points_[id];
 }
 
+std::pair<BAMatrixX3d, BAMatrixX3d> BundleAdjuster::GetShotPoses() const {
+  BAMatrixX3d rotations(indexed_shots_.size(), 3);
+  BAMatrixX3d translations(indexed_shots_.size(), 3);
+  for (int i = 0; i < indexed_shots_.size(); ++i) {
+    rotations.row(i) = indexed_shots_[i]->GetRotation().transpose();
+    translations.row(i) = indexed_shots_[i]->GetTranslation().transpose();
+  }
+  return std::make_pair(rotations, translations);
+}
+
+BAMatrixX3d BundleAdjuster::GetPointPositions() const {
+  BAMatrixX3d positions(indexed_points_.size(), 3);
+  for (int i = 0; i < indexed_points_.size(); ++i) {
+    positions.row(i) = indexed_points_[i]->parameters.transpose();
+  }
+  return positions;
+}
+
+BAMatrixXd BundleAdjuster::GetProjectionResiduals() const {
+  return projection_residuals_.leftCols(projection_residuals_size_);
+}
+
 BAReconstruction BundleAdjuster::GetReconstruction(const std::string &id) {
   return reconstructions_[id];
 }
@@ -1,6 +1,8 @@
 
 #include <geometry/triangulation.h>
 
+#include <random>
+
 namespace geometry {
 
 double AngleBetweenVectors(const Eigen::Vector3d &u, const Eigen::Vector3d &v) {
@@ -75,19 +77,19 @@ py::object TriangulateBearingsDLT(const std::vector<Eigen::Matrix<double, 3, 4>>
   return TriangulateReturn(TRIANGULATION_OK, foundation::py_array_from_data(X.data(), 3));
 }
 
-std::vector<Eigen::Vector3d> TriangulateTwoBearingsMidpointMany(
+Eigen::Matrix<double, -1, 3> TriangulateTwoBearingsMidpointMany(
     const Eigen::Matrix<double, -1, 3> &bearings1,
     const Eigen::Matrix<double, -1, 3> &bearings2,
     const Eigen::Matrix3d &rotation,
     const Eigen::Vector3d &translation) {
-  std::vector<Eigen::Vector3d> triangulated(bearings1.rows());
+  Eigen::Matrix<double, -1, 3> triangulated(bearings1.rows(), 3);
   Eigen::Matrix<double, 2, 3> os, bs;
   os.row(0) = Eigen::Vector3d::Zero();
   os.row(1) = translation;
   for(int i = 0; i < bearings1.rows(); ++i){
     bs.row(0) = bearings1.row(i);
     bs.row(1) = rotation*bearings2.row(i).transpose();
-    triangulated[i] = TriangulateTwoBearingsMidpointSolve(os, bs);
+    triangulated.row(i) = TriangulateTwoBearingsMidpointSolve(os, bs).transpose();
   }
   return triangulated;
 }
@@ -127,4 +129,160 @@ py::object TriangulateBearingsMidpoint(const Eigen::Matrix<double, -1, 3> &cente
   return TriangulateReturn(TRIANGULATION_OK, foundation::py_array_from_data(X.data(), 3));
 }
 
+namespace {
+
+bool RayAnglesOk(const RowMatrixX3d &bearings, int begin, int end,
+                 double min_angle) {
+  for (int i = begin; i < end; ++i) {
+    for (int j = begin; j < i; ++j) {
+      if (AngleBetweenVectors(bearings.row(i), bearings.row(j)) >= min_angle) {
+        return true;
+      }
+    }
+  }
+  return false;
+}
+
+bool ReprojectionOk(const Eigen::Vector3d &X, const RowMatrixX3d &centers,
+                    const RowMatrixX3d &bearings, int begin, int end,
+                    double threshold) {
+  for (int i = begin; i < end; ++i) {
+    const Eigen::Vector3d projected = X - centers.row(i).transpose();
+    if (AngleBetweenVectors(projected, bearings.row(i)) > threshold) {
+      return false;
+    }
+  }
+  return true;
+}
+
+bool TriangulateTrackFull(const RowMatrixX3d &centers,
+                          const RowMatrixX3d &bearings, int begin, int end,
+                          double threshold, double min_angle,
+                          Eigen::Vector3d *X, VectorXb *inliers) {
+  if (!RayAnglesOk(bearings, begin, end, min_angle)) {
+    return false;
+  }
+  *X = TriangulateBearingsMidpointSolve<double>(
+      centers.middleRows(begin, end - begin),
+      bearings.middleRows(begin, end - begin));
+  if (!ReprojectionOk(*X, centers, bearings, begin, end, threshold)) {
+    return false;
+  }
+  inliers->segment(begin, end - begin).setConstant(true);
+  return true;
+}
+
+bool TriangulateTrackRobust(const RowMatrixX3d &centers,
+                            const RowMatrixX3d &bearings, int begin, int end,
+                            double threshold, double min_angle, int seed,
+                            Eigen::Vector3d *X, VectorXb *inliers) {
+  const int count = end - begin;
+  const int ransac_tries = 11;  // 0.99 proba, 60% inliers
+  const double probability = 0.99;
+
+  std::minstd_rand random(seed + 1);
+  std::uniform_int_distribution<int> first(0, count - 1);
+  std::uniform_int_distribution<int> second(0, count - 2);
+
+  int best_count = 0;
+  std::vector<bool> best_inliers(count, false);
+  std::vector<bool> current_inliers(count, false);
+  for (int k = 0; k < ransac_tries; ++k) {
+    const int i = first(random);
+    int j = second(random);
+    if (j >= i) {
+      ++j;
+    }
+
+    Eigen::Matrix<double, 2, 3> os, bs;
+    os.row(0) = centers.row(begin + i);
+    os.row(1) = centers.row(begin + j);
+    bs.row(0) = bearings.row(begin + i);
+    bs.row(1) = bearings.row(begin + j);
+    if (AngleBetweenVectors(bs.row(0), bs.row(1)) < min_angle) {
+      continue;
+    }
+    const Eigen::Vector3d candidate = TriangulateTwoBearingsMidpointSolve(os, bs);
+    if (!ReprojectionOk(candidate, centers, bearings, begin + i, begin + i + 1,
+                        threshold) ||
+        !ReprojectionOk(candidate, centers, bearings, begin + j, begin + j + 1,
+                        threshold)) {
+      continue;
+    }
+
+    int current_count = 0;
+    for (int r = 0; r < count; ++r) {
+      const Eigen::Vector3d projected =
+          (candidate - centers.row(begin + r).transpose()).normalized();
+      current_inliers[r] =
+          (projected - bearings.row(begin + r).transpose()).norm() < threshold;
+      current_count += current_inliers[r];
+    }
+    if (current_count <= best_count) {
+      continue;
+    }
+    best_count = current_count;
+    best_inliers = current_inliers;
+    *X = candidate;
+
+    const double inliers_ratio = double(best_count) / count;
+    if (best_count == count) {
+      break;
+    }
+    const double optimal_iter = std::log(1.0 - probability) /
+                                std::log(1.0 - inliers_ratio * inliers_ratio);
+    if (optimal_iter <= ransac_tries) {
+      break;
+    }
+  }
+
+  if (best_count < 2) {
+    return false;
+  }
+  for (int r = 0; r < count; ++r) {
+    (*inliers)[begin + r] = best_inliers[r];
+  }
+  return true;
+}
+
+}  // namespace
+
+std::tuple<RowMatrixX3d, VectorXb, VectorXb> TriangulateBearingsMidpointMany(
+    const RowMatrixX3d &centers,
+    const RowMatrixX3d &bearings,
+    const Eigen::VectorXi &offsets,
+    double threshold,
+    double min_angle,
+    bool robust,
+    int seed,
+    int num_threads) {
+  py::gil_scoped_release release;
+
+  const int num_tracks = std::max<int>(offsets.size() - 1, 0);
+  RowMatrixX3d points = RowMatrixX3d::Zero(num_tracks, 3);
+  VectorXb triangulated = VectorXb::Constant(num_tracks, false);
+  VectorXb inliers = VectorXb::Constant(bearings.rows(), false);
+
+#pragma omp parallel for num_threads(num_threads) schedule(dynamic, 256)
+  for (int i = 0; i < num_tracks; ++i) {
+    const int begin = offsets[i];
+    const int end = offsets[i + 1];
+    if (end - begin < 2) {
+      continue;
+    }
+    Eigen::Vector3d X;
+    const bool ok =
+        robust ? TriangulateTrackRobust(centers, bearings, begin, end,
+                                        threshold, min_angle, seed + i, &X,
+                                        &inliers)
+               : TriangulateTrackFull(centers, bearings, begin, end,
+                                      threshold, min_angle, &X, &inliers);
+    if (ok) {
+      points.row(i) = X.transpose();
+      triangulated[i] = true;
+    }
+  }
+  return std::make_tuple(points, triangulated, inliers);
+}
+
 }  // namespace geometry
@@ -7,6 +7,7 @@
 #include <fstream>
 #include <iostream>
 #include <string>
+#include <tuple>
 #include <foundation/types.h>
 
 namespace geometry {
@@ -79,7 +80,7 @@ Eigen::Matrix<T, 3, 1> TriangulateTwoBearingsMidpointSolve(
   return (x1 + x2)/T(2.0);
 };
 
-std::vector<Eigen::Vector3d> TriangulateTwoBearingsMidpointMany(
+Eigen::Matrix<double, -1, 3> TriangulateTwoBearingsMidpointMany(
     const Eigen::Matrix<double, -1, 3> &bearings1,
     const Eigen::Matrix<double, -1, 3> &bearings2,
     const Eigen::Matrix3d& rotation,
@@ -90,4 +91,24 @@ py::object TriangulateBearingsMidpoint(const Eigen::Matrix<double, -1, 3> &cente
                                        const std::vector<double> &threshold_list,
                                        double min_angle);
 
+typedef Eigen::Matrix<double, -1, 3, Eigen::RowMajor> RowMatrixX3d;
+typedef Eigen::Matrix<bool, -1, 1> VectorXb;
+
+// Triangulate many tracks with the midpoint method.  The rays of track i
+// are the rows offsets[i] to offsets[i + 1] of centers and bearings, in
+// world coordinates.  Robust triangulation keeps the point of the pair of
+// rays with the most inliers among random pairs, drawn from the random
+// seed seed + i so that results do not depend on how tracks are batched.
+// Returns the points, a mask of the triangulated tracks and a mask of the
+// inlier rays.
+std::tuple<RowMatrixX3d, VectorXb, VectorXb> TriangulateBearingsMidpointMany(
+    const RowMatrixX3d &centers,
+    const RowMatrixX3d &bearings,
+    const Eigen::VectorXi &offsets,
+    double threshold,
+    double min_angle,
+    bool robust,
+    int seed,
+    int num_threads);
+
 }  // namespace geometry
@@ -33,8 +33,10 @@ PYBIND11_MODULE(pyrobust, m) {
   m.def("ransac_essential", robust::RANSACEssential);
   m.def("ransac_relative_pose", robust::RANSACRelativePose);
   m.def("ransac_relative_rotation", robust::RANSACRelativeRotation);
-  m.def("ransac_absolute_pose", robust::RANSACAbsolutePose);
-  m.def("ransac_absolute_pose_known_rotation", robust::RANSACAbsolutePoseKnownRotation);
+  m.def("ransac_absolute_pose", robust::RANSACAbsolutePose,
+        py::call_guard<py::gil_scoped_release>());
+  m.def("ransac_absolute_pose_known_rotation", robust::RANSACAbsolutePoseKnownRotation,
+        py::call_guard<py::gil_scoped_release>());
 
 
   py::enum_<RansacType>(m, "RansacType")
@@ -0,0 +1,76 @@
+#pragma once
+
+#include <sfm/observation.h>
+#include <sfm/tracks_manager.h>
+#include <sfm/types.h>
+
+#include <cstdint>
+#include <string>
+#include <unordered_map>
+#include <vector>
+
+// Read-only tracks manager backed by a memory-mapped binary tracks file.
+// Observations are never copied in memory : shots and tracks are CSR slices
+// of the mapped file, so that processes opening the same file share pages.
+class MappedTracksManager {
+ public:
+  explicit MappedTracksManager(const std::string& filename);
+  ~MappedTracksManager();
+
+  MappedTracksManager(const MappedTracksManager&) = delete;
+  MappedTracksManager& operator=(const MappedTracksManager&) = delete;
+
+  Observation GetObservation(const ShotId& shot, const TrackId& track) const;
+
+  int NumShots() const;
+  int NumTracks() const;
+  const std::vector<ShotId>& GetShotIds() const;
+  const std::vector<TrackId>& GetTrackIds() const;
+
+  std::unordered_map<TrackId, Observation> GetShotObservations(
+      const ShotId& shot) const;
+  std::unordered_map<ShotId, Observation> GetTrackObservations(
+      const TrackId& track) const;
+
+  TracksManager ConstructSubTracksManager(
+      const std::vector<TrackId>& tracks,
+      const std::vector<ShotId>& shots) const;
+
+  std::vector<TracksManager::KeyPointTuple> GetAllCommonObservations(
+      const ShotId& shot1, const ShotId& shot2) const;
+
+  std::unordered_map<TracksManager::ShotPair, int, HashPair>
+  GetAllPairsConnectivity(const std::vector<ShotId>& shots,
+                          const std::vector<TrackId>& tracks) const;
+
+  TracksManager::ObservationArrays GetTracksObservationArrays(
+      const std::vector<TrackId>& tracks,
+      const std::vector<ShotId>& shots) const;
+
+  const std::string& Filename() const;
+
+ private:
+  int FindShot(const ShotId& shot) const;
+  int FindTrack(const TrackId& track) const;
+  Observation ObservationAt(uint64_t index) const;
+
+  std::string filename_;
+  void* data_{nullptr};
+  size_t size_{0};
+
+  std::vector<ShotId> shot_ids_;
+  std::vector<TrackId> track_ids_;
+  std::unordered_map<ShotId, int> shot_indexes_;
+  std::unordered_map<TrackId, int> track_indexes_;
+
+  const uint64_t* shot_offsets_{nullptr};
+  const uint64_t* track_offsets_{nullptr};
+  const uint64_t* track_observations_{nullptr};
+  const double* x_{nullptr};
+  const double* y_{nullptr};
+  const double* scale_{nullptr};
+  const int32_t* shot_index_{nullptr};
+  const int32_t* track_index_{nullptr};
+  const int32_t* feature_id_{nullptr};
+  const uint8_t* color_{nullptr};
+};
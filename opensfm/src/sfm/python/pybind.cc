@@ -4,6 +4,7 @@
 #include <glog/logging.h>
 
 #include <sfm/tracks_manager.h>
+#include <sfm/mapped_tracks_manager.h>
 #include <sfm/sfm_helpers.h>
 #include <sfm/observation.h>
 #include <foundation/types.h>
@@ -24,21 +25,52 @@ PYBIND11_MODULE(pysfm, m) {
     .def_static("instanciate_from_file", &TracksManager::InstanciateFromFile)
     .def_static("instanciate_from_string", &TracksManager::InstanciateFromString)
     .def("add_observation", &TracksManager::AddObservation)
+    .def("add_observations", &TracksManager::AddObservations)
     .def("remove_observation", &TracksManager::RemoveObservation)
     .def("num_shots", &TracksManager::NumShots)
     .def("num_tracks", &TracksManager::NumTracks)
     .def("get_shot_ids", &TracksManager::GetShotIds)
     .def("get_track_ids", &TracksManager::GetTrackIds)
+    .def("has_track", &TracksManager::HasTrack)
     .def("get_observation", &TracksManager::GetObservation)
     .def("get_shot_observations", &TracksManager::GetShotObservations)
     .def("get_track_observations", &TracksManager::GetTrackObservations)
     .def("construct_sub_tracks_manager", &TracksManager::ConstructSubTracksManager)
     .def("write_to_file", &TracksManager::WriteToFile)
+    .def("write_to_binary_file", &TracksManager::WriteToBinaryFile)
     .def("as_string", &TracksManager::AsSring)
     .def("get_all_common_observations", &TracksManager::GetAllCommonObservations)
     .def("get_all_pairs_connectivity", &TracksManager::GetAllPairsConnectivity,
         py::arg("shots") = std::vector<ShotId>(),
         py::arg("tracks") = std::vector<TrackId>())
+    .def("get_tracks_observation_arrays", &TracksManager::GetTracksObservationArrays,
+        py::call_guard<py::gil_scoped_release>())
+    ;
+
+  py::class_<MappedTracksManager>(m, "MappedTracksManager")
+    .def(py::init<const std::string&>())
+    .def("num_shots", &MappedTracksManager::NumShots)
+    .def("num_tracks", &MappedTracksManager::NumTracks)
+    .def("get_shot_ids", &MappedTracksManager::GetShotIds)
+    .def("get_track_ids", &MappedTracksManager::GetTrackIds)
+    .def("get_observation", &MappedTracksManager::GetObservation)
+    .def("get_shot_observations", &MappedTracksManager::GetShotObservations)
+    .def("get_track_observations", &MappedTracksManager::GetTrackObservations)
+    .def("construct_sub_tracks_manager", &MappedTracksManager::ConstructSubTracksManager)
+    .def("get_all_common_observations", &MappedTracksManager::GetAllCommonObservations)
+    .def("get_all_pairs_connectivity", &MappedTracksManager::GetAllPairsConnectivity,
+        py::arg("shots") = std::vector<ShotId>(),
+        py::arg("tracks") = std::vector<TrackId>())
+    .def("get_tracks_observation_arrays", &MappedTracksManager::GetTracksObservationArrays,
+        py::call_guard<py::gil_scoped_release>())
+    .def(py::pickle(
+        [](const MappedTracksManager& manager) {
+          return py::make_tuple(manager.Filename());
+        },
+        [](py::tuple t) {
+          return std::unique_ptr<MappedTracksManager>(
+              new MappedTracksManager(t[0].cast<std::string>()));
+        }))
     ;
 
   m.def("count_tracks_per_shot", &sfm_helpers::CountTracksPerShot);
@@ -0,0 +1,355 @@
+#include <sfm/mapped_tracks_manager.h>
+
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+
+#include <algorithm>
+#include <cstring>
+#include <stdexcept>
+#include <unordered_set>
+
+namespace {
+
+class MappedReader {
+ public:
+  MappedReader(const char* data, size_t size) : data_(data), size_(size) {}
+
+  template <class T>
+  T Read() {
+    T value;
+    std::memcpy(&value, Advance(sizeof(T)), sizeof(T));
+    return value;
+  }
+
+  template <class T>
+  const T* ReadArray(size_t count) {
+    return reinterpret_cast<const T*>(Advance(count * sizeof(T)));
+  }
+
+  std::vector<std::string> ReadStrings() {
+    const auto count = Read<uint64_t>();
+    std::vector<std::string> strings;
+    strings.reserve(count);
+    for (uint64_t i = 0; i < count; ++i) {
+      const auto length = Read<uint32_t>();
+      strings.emplace_back(Advance(length), length);
+    }
+    return strings;
+  }
+
+  void SkipPadding() { Advance(TracksManager::BinaryPadding(position_)); }
+
+ private:
+  const char* Advance(size_t count) {
+    if (position_ + count > size_) {
+      throw std::runtime_error("Truncated tracks manager binary file");
+    }
+    const auto current = data_ + position_;
+    position_ += count;
+    return current;
+  }
+
+  const char* data_;
+  size_t size_;
+  size_t position_{0};
+};
+
+}  // namespace
+
+MappedTracksManager::MappedTracksManager(const std::string& filename)
+    : filename_(filename) {
+  const int fd = open(filename.c_str(), O_RDONLY);
+  if (fd < 0) {
+    throw std::runtime_error("Can't read tracks manager file");
+  }
+  struct stat file_stat;
+  if (fstat(fd, &file_stat) < 0) {
+    close(fd);
+    throw std::runtime_error("Can't read tracks manager file");
+  }
+  size_ = file_stat.st_size;
+  data_ = size_ > 0 ? mmap(nullptr, size_, PROT_READ, MAP_SHARED, fd, 0)
+                    : MAP_FAILED;
+  close(fd);
+  if (data_ == MAP_FAILED) {
+    data_ = nullptr;
+    throw std::runtime_error("Can't map tracks manager file");
+  }
+
+  try {
+    MappedReader reader(static_cast<const char*>(data_), size_);
+    const auto& header = TracksManager::TRACKS_BINARY_HEADER;
+    if (std::string(reader.ReadArray<char>(header.size()), header.size()) !=
+        header) {
+      throw std::runtime_error("Tracks manager file is not in binary format");
+    }
+    if (reader.Read<int32_t>() != 2) {
+      throw std::runtime_error(
+          "Memory-mapping requires a version 2 binary tracks file");
+    }
+    shot_ids_ = reader.ReadStrings();
+    track_ids_ = reader.ReadStrings();
+    const auto count = reader.Read<uint64_t>();
+    reader.SkipPadding();
+
+    shot_offsets_ = reader.ReadArray<uint64_t>(shot_ids_.size() + 1);
+    track_offsets_ = reader.ReadArray<uint64_t>(track_ids_.size() + 1);
+    track_observations_ = reader.ReadArray<uint64_t>(count);
+    x_ = reader.ReadArray<double>(count);
+    y_ = reader.ReadArray<double>(count);
+    scale_ = reader.ReadArray<double>(count);
+    shot_index_ = reader.ReadArray<int32_t>(count);
+    track_index_ = reader.ReadArray<int32_t>(count);
+    feature_id_ = reader.ReadArray<int32_t>(count);
+    color_ = reader.ReadArray<uint8_t>(3 * count);
+  } catch (...) {
+    munmap(data_, size_);
+    data_ = nullptr;
+    throw;
+  }
+
+  for (int i = 0; i < shot_ids_.size(); ++i) {
+    shot_indexes_[shot_ids_[i]] = i;
+  }
+  for (int i = 0; i < track_ids_.size(); ++i) {
+    track_indexes_[track_ids_[i]] = i;
+  }
+}
+
+MappedTracksManager::~MappedTracksManager() {
+  if (data_) {
+    munmap(data_, size_);
+  }
+}
+
+int MappedTracksManager::FindShot(const ShotId& shot) const {
+  const auto find_shot = shot_indexes_.find(shot);
+  if (find_shot == shot_indexes_.end()) {
+    throw std::runtime_error("Accessing invalid shot ID");
+  }
+  return find_shot->second;
+}
+
+int MappedTracksManager::FindTrack(const TrackId& track) const {
+  const auto find_track = track_indexes_.find(track);
+  if (find_track == track_indexes_.end()) {
+    throw std::runtime_error("Accessing invalid track ID");
+  }
+  return find_track->second;
+}
+
+Observation MappedTracksManager::ObservationAt(uint64_t index) const {
+  return Observation(x_[index], y_[index], scale_[index], color_[3 * index],
+                     color_[3 * index + 1], color_[3 * index + 2],
+                     feature_id_[index]);
+}
+
+int MappedTracksManager::NumShots() const { return shot_ids_.size(); }
+
+int MappedTracksManager::NumTracks() const { return track_ids_.size(); }
+
+const std::vector<ShotId>& MappedTracksManager::GetShotIds() const {
+  return shot_ids_;
+}
+
+const std::vector<TrackId>& MappedTracksManager::GetTrackIds() const {
+  return track_ids_;
+}
+
+const std::string& MappedTracksManager::Filename() const { return filename_; }
+
+Observation MappedTracksManager::GetObservation(const ShotId& shot,
+                                                const TrackId& track) const {
+  const auto shot_index = FindShot(shot);
+  const auto track_index = FindTrack(track);
+  const auto begin = track_index_ + shot_offsets_[shot_index];
+  const auto end = track_index_ + shot_offsets_[shot_index + 1];
+  const auto find_track = std::lower_bound(begin, end, track_index);
+  if (find_track == end || *find_track != track_index) {
+    throw std::runtime_error("Accessing invalid track ID");
+  }
+  return ObservationAt(find_track - track_index_);
+}
+
+std::unordered_map<TrackId, Observation>
+MappedTracksManager::GetShotObservations(const ShotId& shot) const {
+  const auto shot_index = FindShot(shot);
+  std::unordered_map<TrackId, Observation> observations;
+  for (auto i = shot_offsets_[shot_index]; i < shot_offsets_[shot_index + 1];
+       ++i) {
+    observations[track_ids_[track_index_[i]]] = ObservationAt(i);
+  }
+  return observations;
+}
+
+std::unordered_map<ShotId, Observation>
+MappedTracksManager::GetTrackObservations(const TrackId& track) const {
+  const auto track_index = FindTrack(track);
+  std::unordered_map<ShotId, Observation> observations;
+  for (auto i = track_offsets_[track_index];
+       i < track_offsets_[track_index + 1]; ++i) {
+    const auto index = track_observations_[i];
+    observations[shot_ids_[shot_index_[index]]] = ObservationAt(index);
+  }
+  return observations;
+}
+
+TracksManager MappedTracksManager::ConstructSubTracksManager(
+    const std::vector<TrackId>& tracks,
+    const std::vector<ShotId>& shots) const {
+  std::unordered_set<int> shots_tmp;
+  for (const auto& id : shots) {
+    const auto find_shot = shot_indexes_.find(id);
+    if (find_shot != shot_indexes_.end()) {
+      shots_tmp.insert(find_shot->second);
+    }
+  }
+
+  TracksManager subset;
+  for (const auto& track_id : tracks) {
+    const auto find_track = track_indexes_.find(track_id);
+    if (find_track == track_indexes_.end()) {
+      continue;
+    }
+    const auto track_index = find_track->second;
+    for (auto i = track_offsets_[track_index];
+         i < track_offsets_[track_index + 1]; ++i) {
+      const auto index = track_observations_[i];
+      if (shots_tmp.find(shot_index_[index]) == shots_tmp.end()) {
+        continue;
+      }
+      subset.AddObservation(shot_ids_[shot_index_[index]], track_id,
+                            ObservationAt(index));
+    }
+  }
+  return subset;
+}
+
+std::vector<TracksManager::KeyPointTuple>
+MappedTracksManager::GetAllCommonObservations(const ShotId& shot1,
+                                              const ShotId& shot2) const {
+  const auto shot_index1 = FindShot(shot1);
+  const auto shot_index2 = FindShot(shot2);
+
+  // Observations of a shot are sorted by track index
+  std::vector<TracksManager::KeyPointTuple> tuples;
+  auto i = shot_offsets_[shot_index1];
+  auto j = shot_offsets_[shot_index2];
+  const auto end1 = shot_offsets_[shot_index1 + 1];
+  const auto end2 = shot_offsets_[shot_index2 + 1];
+  while (i < end1 && j < end2) {
+    if (track_index_[i] < track_index_[j]) {
+      ++i;
+    } else if (track_index_[j] < track_index_[i]) {
+      ++j;
+    } else {
+      tuples.push_back(std::make_tuple(track_ids_[track_index_[i]],
+                                       ObservationAt(i), ObservationAt(j)));
+      ++i;
+      ++j;
+    }
+  }
+  return tuples;
+}
+
+std::unordered_map<TracksManager::ShotPair, int, HashPair>
+MappedTracksManager::GetAllPairsConnectivity(
+    const std::vector<ShotId>& shots,
+    const std::vector<TrackId>& tracks) const {
+  std::vector<int> tracks_to_use;
+  if (tracks.empty()) {
+    for (int i = 0; i < track_ids_.size(); ++i) {
+      tracks_to_use.push_back(i);
+    }
+  } else {
+    for (const auto& track : tracks) {
+      const auto find_track = track_indexes_.find(track);
+      if (find_track != track_indexes_.end()) {
+        tracks_to_use.push_back(find_track->second);
+      }
+    }
+  }
+
+  std::vector<bool> shots_to_use(shot_ids_.size(), shots.empty());
+  for (const auto& shot : shots) {
+    const auto find_shot = shot_indexes_.find(shot);
+    if (find_shot != shot_indexes_.end()) {
+      shots_to_use[find_shot->second] = true;
+    }
+  }
+
+  // Pairs are ordered by shot ID : rank shots once instead of comparing
+  // strings for every pair of observations.
+  std::vector<int> sorted_shots(shot_ids_.size());
+  for (int i = 0; i < sorted_shots.size(); ++i) {
+    sorted_shots[i] = i;
+  }
+  std::sort(sorted_shots.begin(), sorted_shots.end(),
+            [this](int a, int b) { return shot_ids_[a] < shot_ids_[b]; });
+  std::vector<int> shot_rank(shot_ids_.size());
+  for (int i = 0; i < sorted_shots.size(); ++i) {
+    shot_rank[sorted_shots[i]] = i;
+  }
+
+  std::unordered_map<uint64_t, int> common_per_index_pair;
+  for (const auto track_index : tracks_to_use) {
+    const auto begin = track_offsets_[track_index];
+    const auto end = track_offsets_[track_index + 1];
+    for (auto i = begin; i < end; ++i) {
+      const auto shot1 = shot_index_[track_observations_[i]];
+      if (!shots_to_use[shot1]) {
+        continue;
+      }
+      for (auto j = begin; j < end; ++j) {
+        const auto shot2 = shot_index_[track_observations_[j]];
+        if (!shots_to_use[shot2] || shot_rank[shot1] >= shot_rank[shot2]) {
+          continue;
+        }
+        const uint64_t key = (static_cast<uint64_t>(shot1) << 32) | shot2;
+        ++common_per_index_pair[key];
+      }
+    }
+  }
+
+  std::unordered_map<TracksManager::ShotPair, int, HashPair> common_per_pair;
+  for (const auto& pair : common_per_index_pair) {
+    const auto& shot1 = shot_ids_[pair.first >> 32];
+    const auto& shot2 = shot_ids_[pair.first & 0xFFFFFFFF];
+    common_per_pair[std::make_pair(shot1, shot2)] = pair.second;
+  }
+  return common_per_pair;
+}
+
+TracksManager::ObservationArrays
+MappedTracksManager::GetTracksObservationArrays(
+    const std::vector<TrackId>& tracks,
+    const std::vector<ShotId>& shots) const {
+  std::vector<int> shot_positions(shot_ids_.size(), -1);
+  for (int i = 0; i < shots.size(); ++i) {
+    const auto find_shot = shot_indexes_.find(shots[i]);
+    if (find_shot != shot_indexes_.end()) {
+      shot_positions[find_shot->second] = i;
+    }
+  }
+
+  std::vector<TracksManager::IndexedObservation> observations;
+  for (int i = 0; i < tracks.size(); ++i) {
+    const auto find_track = track_indexes_.find(tracks[i]);
+    if (find_track == track_indexes_.end()) {
+      continue;
+    }
+    const auto track_index = find_track->second;
+    for (auto j = track_offsets_[track_index];
+         j < track_offsets_[track_index + 1]; ++j) {
+      const auto index = track_observations_[j];
+      const auto shot_position = shot_positions[shot_index_[index]];
+      if (shot_position >= 0) {
+        observations.emplace_back(i, shot_position, ObservationAt(index));
+      }
+    }
+  }
+  return TracksManager::MakeObservationArrays(&observations);
+}
+
@@ -6,18 +6,20 @@ namespace sfm_helpers {
 std::unordered_map<ShotId, int> CountTracksPerShot(
     const TracksManager& manager, const std::vector<ShotId>& shots,
     const std::vector<TrackId>& tracks) {
-  std::unordered_set<TrackId> tracks_set;
+  std::vector<bool> tracks_set(manager.NumTracks(), false);
   for (const auto& track : tracks) {
-    tracks_set.insert(track);
+    if (manager.HasTrack(track)) {
+      tracks_set[manager.GetTrackIndex(track)] = true;
+    }
   }
   std::unordered_map<ShotId, int> counts;
   for (const auto& shot : shots) {
-    const auto& observations = manager.GetShotObservations(shot);
+    const auto& observations =
+        manager.GetShotIndexObservations(manager.GetShotIndex(shot));
 
     int sum = 0;
     for (const auto& obs : observations) {
-      const auto& trackID = obs.first;
-      if (tracks_set.find(trackID) == tracks_set.end()) {
+      if (!tracks_set[obs.first]) {
         continue;
       }
       ++sum;
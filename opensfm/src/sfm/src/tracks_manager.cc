@@ -1,5 +1,7 @@
 #include <sfm/tracks_manager.h>
 
+#include <algorithm>
+#include <cstdint>
 #include <unordered_set>
 #include <sstream>
 
@@ -24,11 +26,11 @@ int GetTracksFileVersion(S& fstream) {
 template <class S>
 void WriteToStreamCurrentVersion(S& ostream, const TracksManager& manager) {
   ostream << manager.TRACKS_HEADER << "_v" << manager.TRACKS_VERSION << std::endl;
-  const auto shotsIDs = manager.GetShotIds();
-  for (const auto& shotID : shotsIDs) {
-    const auto observations = manager.GetShotObservations(shotID);
+  for (ShotIndex i = 0; i < manager.NumShots(); ++i) {
+    const auto& shotID = manager.GetShotId(i);
+    const auto& observations = manager.GetShotIndexObservations(i);
     for (const auto& observation : observations) {
-      ostream << shotID << "\t" << observation.first << "\t"
+      ostream << shotID << "\t" << manager.GetTrackId(observation.first) << "\t"
               << observation.second.id << "\t" << observation.second.point(0)
               << "\t" << observation.second.point(1) << "\t"
               << observation.second.scale << "\t" << observation.second.color(0)
@@ -94,106 +96,439 @@ TracksManager InstanciateFromStreamT(S& fstream) {
     }
 }
 
+template <class T>
+void WriteBinary(std::ostream& ostream, const T& value) {
+  ostream.write(reinterpret_cast<const char*>(&value), sizeof(T));
+}
+
+template <class T>
+void WriteBinaryArray(std::ostream& ostream, const std::vector<T>& values) {
+  ostream.write(reinterpret_cast<const char*>(values.data()),
+                values.size() * sizeof(T));
+}
+
+void WriteBinaryStrings(std::ostream& ostream,
+                        const std::vector<std::string>& strings) {
+  WriteBinary<uint64_t>(ostream, strings.size());
+  for (const auto& str : strings) {
+    WriteBinary<uint32_t>(ostream, str.size());
+    ostream.write(str.data(), str.size());
+  }
+}
+
+template <class T>
+T ReadBinary(std::istream& istream) {
+  T value;
+  istream.read(reinterpret_cast<char*>(&value), sizeof(T));
+  if (!istream) {
+    throw std::runtime_error("Truncated tracks manager binary file");
+  }
+  return value;
+}
+
+template <class T>
+std::vector<T> ReadBinaryArray(std::istream& istream, size_t size) {
+  std::vector<T> values(size);
+  istream.read(reinterpret_cast<char*>(values.data()), size * sizeof(T));
+  if (!istream) {
+    throw std::runtime_error("Truncated tracks manager binary file");
+  }
+  return values;
+}
+
+std::vector<std::string> ReadBinaryStrings(std::istream& istream) {
+  const auto count = ReadBinary<uint64_t>(istream);
+  std::vector<std::string> strings(count);
+  for (auto& str : strings) {
+    str.resize(ReadBinary<uint32_t>(istream));
+    istream.read(&str[0], str.size());
+  }
+  if (!istream) {
+    throw std::runtime_error("Truncated tracks manager binary file");
+  }
+  return strings;
+}
+
+bool IsBinaryTracksStream(std::istream& istream) {
+  const auto current_position = istream.tellg();
+  const auto& header = TracksManager::TRACKS_BINARY_HEADER;
+
+  std::string magic(header.size(), '\0');
+  istream.read(&magic[0], magic.size());
+  if (istream && magic == header) {
+    return true;
+  }
+  istream.clear();
+  istream.seekg(current_position);
+  return false;
+}
+
+void WriteBinaryPadding(std::ostream& ostream) {
+  const auto padding = TracksManager::BinaryPadding(ostream.tellp());
+  for (size_t i = 0; i < padding; ++i) {
+    ostream.put(0);
+  }
+}
+
+void SkipBinaryPadding(std::istream& istream) {
+  istream.ignore(TracksManager::BinaryPadding(istream.tellg()));
+}
+
+// Binary layout (native little-endian) : header, int32 version, the interned
+// shot and track names tables and the number of observations. Then, aligned
+// on 8 bytes, the CSR offsets of shots and tracks, the observation indexes of
+// each track, and the observations as packed columns sorted by shot, then by
+// track (x, y, scale, shot index, track index, feature id, rgb).
+void WriteToBinaryStreamCurrentVersion(std::ostream& ostream,
+                                       const TracksManager& manager) {
+  const auto& header = TracksManager::TRACKS_BINARY_HEADER;
+  ostream.write(header.data(), header.size());
+  WriteBinary<int32_t>(ostream, TracksManager::TRACKS_BINARY_VERSION);
+
+  // Interned indexes of the manager are used as is in the file
+  const auto shot_ids = manager.GetShotIds();
+  const auto track_ids = manager.GetTrackIds();
+
+  std::vector<uint64_t> shot_offsets(1, 0);
+  std::vector<uint64_t> track_offsets(track_ids.size() + 1, 0);
+  std::vector<int32_t> shot_index, track_index, feature_id;
+  std::vector<double> x, y, scale;
+  std::vector<uint8_t> color;
+  std::vector<std::pair<int32_t, const Observation*>> sorted;
+  for (int32_t i = 0; i < shot_ids.size(); ++i) {
+    sorted.clear();
+    for (const auto& observation : manager.GetShotIndexObservations(i)) {
+      sorted.emplace_back(observation.first, &observation.second);
+    }
+    std::sort(sorted.begin(), sorted.end(),
+              [](const std::pair<int32_t, const Observation*>& a,
+                 const std::pair<int32_t, const Observation*>& b) {
+                return a.first < b.first;
+              });
+    for (const auto& observation : sorted) {
+      const auto& obs = *observation.second;
+      shot_index.push_back(i);
+      track_index.push_back(observation.first);
+      feature_id.push_back(obs.id);
+      x.push_back(obs.point(0));
+      y.push_back(obs.point(1));
+      scale.push_back(obs.scale);
+      for (int j = 0; j < 3; ++j) {
+        color.push_back(static_cast<uint8_t>(obs.color(j)));
+      }
+      ++track_offsets[observation.first + 1];
+    }
+    shot_offsets.push_back(shot_index.size());
+  }
+
+  for (size_t i = 1; i < track_offsets.size(); ++i) {
+    track_offsets[i] += track_offsets[i - 1];
+  }
+  std::vector<uint64_t> track_observations(shot_index.size());
+  std::vector<uint64_t> track_fill(track_offsets.begin(),
+                                   track_offsets.end() - 1);
+  for (uint64_t i = 0; i < track_index.size(); ++i) {
+    track_observations[track_fill[track_index[i]]++] = i;
+  }
+
+  WriteBinaryStrings(ostream, shot_ids);
+  WriteBinaryStrings(ostream, track_ids);
+  WriteBinary<uint64_t>(ostream, shot_index.size());
+  WriteBinaryPadding(ostream);
+  WriteBinaryArray(ostream, shot_offsets);
+  WriteBinaryArray(ostream, track_offsets);
+  WriteBinaryArray(ostream, track_observations);
+  WriteBinaryArray(ostream, x);
+  WriteBinaryArray(ostream, y);
+  WriteBinaryArray(ostream, scale);
+  WriteBinaryArray(ostream, shot_index);
+  WriteBinaryArray(ostream, track_index);
+  WriteBinaryArray(ostream, feature_id);
+  WriteBinaryArray(ostream, color);
+}
+
+TracksManager InstanciateFromBinaryStreamV1(std::istream& istream) {
+  const auto shot_ids = ReadBinaryStrings(istream);
+  const auto track_ids = ReadBinaryStrings(istream);
+  const auto count = ReadBinary<uint64_t>(istream);
+  const auto shot_index = ReadBinaryArray<int32_t>(istream, count);
+  const auto track_index = ReadBinaryArray<int32_t>(istream, count);
+  const auto feature_id = ReadBinaryArray<int32_t>(istream, count);
+  const auto x = ReadBinaryArray<double>(istream, count);
+  const auto y = ReadBinaryArray<double>(istream, count);
+  const auto scale = ReadBinaryArray<double>(istream, count);
+  const auto color = ReadBinaryArray<uint8_t>(istream, 3 * count);
+  return TracksManager::InstanciateFromColumns(
+      shot_ids, track_ids, shot_index, track_index, feature_id, x, y, scale,
+      color);
+}
+
+TracksManager InstanciateFromBinaryStreamV2(std::istream& istream) {
+  const auto shot_ids = ReadBinaryStrings(istream);
+  const auto track_ids = ReadBinaryStrings(istream);
+  const auto count = ReadBinary<uint64_t>(istream);
+  SkipBinaryPadding(istream);
+
+  // CSR indexes are only needed when the file is memory-mapped
+  const auto index_size = shot_ids.size() + track_ids.size() + 2 + count;
+  istream.ignore(index_size * sizeof(uint64_t));
+
+  const auto x = ReadBinaryArray<double>(istream, count);
+  const auto y = ReadBinaryArray<double>(istream, count);
+  const auto scale = ReadBinaryArray<double>(istream, count);
+  const auto shot_index = ReadBinaryArray<int32_t>(istream, count);
+  const auto track_index = ReadBinaryArray<int32_t>(istream, count);
+  const auto feature_id = ReadBinaryArray<int32_t>(istream, count);
+  const auto color = ReadBinaryArray<uint8_t>(istream, 3 * count);
+  return TracksManager::InstanciateFromColumns(
+      shot_ids, track_ids, shot_index, track_index, feature_id, x, y, scale,
+      color);
+}
+
+TracksManager InstanciateFromBinaryStream(std::istream& istream) {
+  const auto version = ReadBinary<int32_t>(istream);
+  switch (version) {
+    case 1:
+      return InstanciateFromBinaryStreamV1(istream);
+    case 2:
+      return InstanciateFromBinaryStreamV2(istream);
+    default:
+      throw std::runtime_error("Unknown tracks manager binary file version");
+  }
+}
+
 }  // namespace
 
+ShotIndex TracksManager::InternShot(const ShotId& shot) {
+  const auto find_shot = shot_indexes_.find(shot);
+  if (find_shot != shot_indexes_.end()) {
+    return find_shot->second;
+  }
+  const ShotIndex index = shot_ids_.size();
+  shot_indexes_[shot] = index;
+  shot_ids_.push_back(shot);
+  tracks_per_shot_.emplace_back();
+  return index;
+}
+
+TrackIndex TracksManager::InternTrack(const TrackId& track) {
+  const auto find_track = track_indexes_.find(track);
+  if (find_track != track_indexes_.end()) {
+    return find_track->second;
+  }
+  const TrackIndex index = track_ids_.size();
+  track_indexes_[track] = index;
+  track_ids_.push_back(track);
+  shot_per_tracks_.emplace_back();
+  return index;
+}
+
 void TracksManager::AddObservation(const ShotId& shot_id,
                                    const TrackId& track_id,
                                    const Observation& observation) {
-  tracks_per_shot_[shot_id][track_id] = observation;
-  shot_per_tracks_[track_id][shot_id] = observation;
+  const auto shot = InternShot(shot_id);
+  const auto track = InternTrack(track_id);
+  tracks_per_shot_[shot][track] = observation;
+  shot_per_tracks_[track][shot] = observation;
 }
 
-void TracksManager::RemoveObservation(const ShotId& shot_id,
-                                      const TrackId& track_id) {
-  const auto find_shot = tracks_per_shot_.find(shot_id);
-  if (find_shot == tracks_per_shot_.end()) {
-    throw std::runtime_error("Accessing invalid shot ID");
+void TracksManager::AddObservations(const std::vector<ShotId>& shot_ids,
+                                    const std::vector<TrackId>& track_ids,
+                                    const Eigen::VectorXi& shot_indexes,
+                                    const Eigen::VectorXi& track_indexes,
+                                    const Eigen::MatrixXd& points,
+                                    const Eigen::MatrixXi& colors,
+                                    const Eigen::VectorXi& feature_ids) {
+  const auto count = shot_indexes.size();
+  if (track_indexes.size() != count || points.rows() != count ||
+      colors.rows() != count || feature_ids.size() != count ||
+      points.cols() != 3 || colors.cols() != 3) {
+    throw std::runtime_error("Inconsistent observations arrays size");
   }
-  const auto find_track = shot_per_tracks_.find(track_id);
-  if (find_track == shot_per_tracks_.end()) {
-    throw std::runtime_error("Accessing invalid track ID");
+
+  std::vector<ShotIndex> shots;
+  shots.reserve(shot_ids.size());
+  for (const auto& shot_id : shot_ids) {
+    shots.push_back(InternShot(shot_id));
+  }
+  std::vector<TrackIndex> tracks;
+  tracks.reserve(track_ids.size());
+  for (const auto& track_id : track_ids) {
+    tracks.push_back(InternTrack(track_id));
   }
-  find_shot->second.erase(track_id);
-  find_track->second.erase(shot_id);
+
+  for (int i = 0; i < count; ++i) {
+    const auto shot = shots.at(shot_indexes(i));
+    const auto track = tracks.at(track_indexes(i));
+    const Observation observation(points(i, 0), points(i, 1), points(i, 2),
+                                  colors(i, 0), colors(i, 1), colors(i, 2),
+                                  feature_ids(i));
+    tracks_per_shot_[shot][track] = observation;
+    shot_per_tracks_[track][shot] = observation;
+  }
+}
+
+TracksManager TracksManager::InstanciateFromColumns(
+    const std::vector<ShotId>& shot_ids, const std::vector<TrackId>& track_ids,
+    const std::vector<int32_t>& shot_index,
+    const std::vector<int32_t>& track_index,
+    const std::vector<int32_t>& feature_id, const std::vector<double>& x,
+    const std::vector<double>& y, const std::vector<double>& scale,
+    const std::vector<uint8_t>& color) {
+  TracksManager manager;
+  std::vector<ShotIndex> shots;
+  shots.reserve(shot_ids.size());
+  for (const auto& shot_id : shot_ids) {
+    shots.push_back(manager.InternShot(shot_id));
+  }
+  std::vector<TrackIndex> tracks;
+  tracks.reserve(track_ids.size());
+  for (const auto& track_id : track_ids) {
+    tracks.push_back(manager.InternTrack(track_id));
+  }
+
+  // Size the observation maps once, so that they are never rehashed
+  std::vector<size_t> shot_counts(manager.shot_ids_.size(), 0);
+  std::vector<size_t> track_counts(manager.track_ids_.size(), 0);
+  for (size_t i = 0; i < shot_index.size(); ++i) {
+    ++shot_counts[shots.at(shot_index[i])];
+    ++track_counts[tracks.at(track_index[i])];
+  }
+  for (size_t i = 0; i < shot_counts.size(); ++i) {
+    manager.tracks_per_shot_[i].reserve(shot_counts[i]);
+  }
+  for (size_t i = 0; i < track_counts.size(); ++i) {
+    manager.shot_per_tracks_[i].reserve(track_counts[i]);
+  }
+
+  for (size_t i = 0; i < shot_index.size(); ++i) {
+    const auto shot = shots[shot_index[i]];
+    const auto track = tracks[track_index[i]];
+    const Observation observation(x[i], y[i], scale[i], color[3 * i],
+                                  color[3 * i + 1], color[3 * i + 2],
+                                  feature_id[i]);
+    manager.tracks_per_shot_[shot][track] = observation;
+    manager.shot_per_tracks_[track][shot] = observation;
+  }
+  return manager;
+}
+
+void TracksManager::RemoveObservation(const ShotId& shot_id,
+                                      const TrackId& track_id) {
+  const auto shot = GetShotIndex(shot_id);
+  const auto track = GetTrackIndex(track_id);
+  tracks_per_shot_[shot].erase(track);
+  shot_per_tracks_[track].erase(shot);
 }
 
 int TracksManager::NumShots() const {
-  return tracks_per_shot_.size();
+  return shot_ids_.size();
 }
 
 int TracksManager::NumTracks() const {
-  return shot_per_tracks_.size();
+  return track_ids_.size();
 }
 
 std::vector<ShotId> TracksManager::GetShotIds() const {
-  std::vector<ShotId> shots;
-  shots.reserve(tracks_per_shot_.size());
-  for (const auto& it : tracks_per_shot_) {
-    shots.push_back(it.first);
-  }
-  return shots;
+  return shot_ids_;
 }
 
 std::vector<TrackId> TracksManager::GetTrackIds() const {
-  std::vector<TrackId> tracks;
-  tracks.reserve(shot_per_tracks_.size());
-  for (const auto& it : shot_per_tracks_) {
-    tracks.push_back(it.first);
+  return track_ids_;
+}
+
+bool TracksManager::HasShot(const ShotId& shot) const {
+  return shot_indexes_.find(shot) != shot_indexes_.end();
+}
+
+bool TracksManager::HasTrack(const TrackId& track) const {
+  return track_indexes_.find(track) != track_indexes_.end();
+}
+
+ShotIndex TracksManager::GetShotIndex(const ShotId& shot) const {
+  const auto find_shot = shot_indexes_.find(shot);
+  if (find_shot == shot_indexes_.end()) {
+    throw std::runtime_error("Accessing invalid shot ID");
+  }
+  return find_shot->second;
+}
+
+TrackIndex TracksManager::GetTrackIndex(const TrackId& track) const {
+  const auto find_track = track_indexes_.find(track);
+  if (find_track == track_indexes_.end()) {
+    throw std::runtime_error("Accessing invalid track ID");
   }
-  return tracks;
+  return find_track->second;
+}
+
+const ShotId& TracksManager::GetShotId(ShotIndex shot) const {
+  return shot_ids_.at(shot);
+}
+
+const TrackId& TracksManager::GetTrackId(TrackIndex track) const {
+  return track_ids_.at(track);
 }
 
 Observation TracksManager::GetObservation(const ShotId& shot,
                                           const TrackId& track) const {
-  const auto find_shot = tracks_per_shot_.find(shot);
-  if (find_shot == tracks_per_shot_.end()) {
-    throw std::runtime_error("Accessing invalid shot ID");
-  }
-  const auto find_track = find_shot->second.find(track);
-  if (find_track == find_shot->second.end()) {
+  const auto& observations = tracks_per_shot_[GetShotIndex(shot)];
+  const auto find_track = observations.find(GetTrackIndex(track));
+  if (find_track == observations.end()) {
     throw std::runtime_error("Accessing invalid track ID");
   }
   return find_track->second;
 }
 
-const std::unordered_map<TrackId, Observation>& TracksManager::GetShotObservations(
+const std::unordered_map<TrackIndex, Observation>&
+TracksManager::GetShotIndexObservations(ShotIndex shot) const {
+  return tracks_per_shot_.at(shot);
+}
+
+const std::unordered_map<ShotIndex, Observation>&
+TracksManager::GetTrackIndexObservations(TrackIndex track) const {
+  return shot_per_tracks_.at(track);
+}
+
+std::unordered_map<TrackId, Observation> TracksManager::GetShotObservations(
     const ShotId& shot) const {
-  const auto find_shot = tracks_per_shot_.find(shot);
-  if (find_shot == tracks_per_shot_.end()) {
-    throw std::runtime_error("Accessing invalid shot ID");
+  std::unordered_map<TrackId, Observation> observations;
+  for (const auto& obs : tracks_per_shot_[GetShotIndex(shot)]) {
+    observations.emplace(track_ids_[obs.first], obs.second);
   }
-  return find_shot->second;
+  return observations;
 }
 
-const std::unordered_map<ShotId, Observation>& TracksManager::GetTrackObservations(
+std::unordered_map<ShotId, Observation> TracksManager::GetTrackObservations(
     const TrackId& track) const {
-  const auto find_track = shot_per_tracks_.find(track);
-  if (find_track == shot_per_tracks_.end()) {
-    throw std::runtime_error("Accessing invalid track ID");
+  std::unordered_map<ShotId, Observation> observations;
+  for (const auto& obs : shot_per_tracks_[GetTrackIndex(track)]) {
+    observations.emplace(shot_ids_[obs.first], obs.second);
   }
-  return find_track->second;
+  return observations;
 }
 
 TracksManager TracksManager::ConstructSubTracksManager(
     const std::vector<TrackId>& tracks,
     const std::vector<ShotId>& shots) const {
-  std::unordered_set<TrackId> shotsTmp;
+  std::vector<bool> shots_to_use(shot_ids_.size(), false);
   for (const auto& id : shots) {
-    shotsTmp.insert(id);
+    const auto find_shot = shot_indexes_.find(id);
+    if (find_shot != shot_indexes_.end()) {
+      shots_to_use[find_shot->second] = true;
+    }
   }
 
   TracksManager subset;
   for (const auto& track_id : tracks) {
-    const auto find_track = shot_per_tracks_.find(track_id);
-    if (find_track == shot_per_tracks_.end()) {
+    const auto find_track = track_indexes_.find(track_id);
+    if (find_track == track_indexes_.end()) {
       continue;
     }
-    for (const auto& obs : find_track->second) {
-      const auto& shot_id = obs.first;
-      if (shotsTmp.find(shot_id) == shotsTmp.end()) {
+    for (const auto& obs : shot_per_tracks_[find_track->second]) {
+      if (!shots_to_use[obs.first]) {
         continue;
       }
-      subset.AddObservation(shot_id, track_id, obs.second);
+      subset.AddObservation(shot_ids_[obs.first], track_id, obs.second);
     }
   }
   return subset;
@@ -202,20 +537,17 @@ TracksManager TracksManager::ConstructSubTracksManager(
 std::vector<TracksManager::KeyPointTuple>
 TracksManager::GetAllCommonObservations(const ShotId& shot1,
                                         const ShotId& shot2) const {
-  auto find_shot1 = tracks_per_shot_.find(shot1);
-  auto find_shot2 = tracks_per_shot_.find(shot2);
-  if (find_shot1 == tracks_per_shot_.end() ||
-      find_shot2 == tracks_per_shot_.end()) {
-    throw std::runtime_error("Accessing invalid shot ID");
-  }
+  const auto& observations1 = tracks_per_shot_[GetShotIndex(shot1)];
+  const auto& observations2 = tracks_per_shot_[GetShotIndex(shot2)];
 
   std::vector<KeyPointTuple> tuples;
-  for (const auto& p : find_shot1->second) {
-    const auto find = find_shot2->second.find(p.first);
-    if(find == find_shot2->second.end()){
+  for (const auto& p : observations1) {
+    const auto find = observations2.find(p.first);
+    if(find == observations2.end()){
       continue;
     }
-    tuples.push_back(std::make_tuple(p.first, p.second, find->second));
+    tuples.push_back(
+        std::make_tuple(track_ids_[p.first], p.second, find->second));
   }
   return tuples;
 }
@@ -224,67 +556,137 @@ std::unordered_map<TracksManager::ShotPair, int, HashPair>
 TracksManager::GetAllPairsConnectivity(
     const std::vector<ShotId>& shots,
     const std::vector<TrackId>& tracks) const {
-  std::unordered_map<ShotPair, int, HashPair> common_per_pair;
-
-  std::vector<TrackId> tracks_to_use;
+  std::vector<TrackIndex> tracks_to_use;
   if(tracks.empty()){
-    for (const auto& track : shot_per_tracks_){
-      tracks_to_use.push_back(track.first);
+    for (TrackIndex i = 0; i < track_ids_.size(); ++i){
+      tracks_to_use.push_back(i);
     }
   }
   else{
-    tracks_to_use = tracks;
-  }
-
-  std::unordered_set<ShotId> shots_to_use;
-  if(shots.empty()){
-    for (const auto& shot : tracks_per_shot_){
-      shots_to_use.insert(shot.first);
+    for (const auto& track : tracks){
+      const auto find_track = track_indexes_.find(track);
+      if (find_track != track_indexes_.end()) {
+        tracks_to_use.push_back(find_track->second);
+      }
     }
   }
-  else{
-    for (const auto& shot : shots){
-      shots_to_use.insert(shot);
+
+  std::vector<bool> shots_to_use(shot_ids_.size(), shots.empty());
+  for (const auto& shot : shots){
+    const auto find_shot = shot_indexes_.find(shot);
+    if (find_shot != shot_indexes_.end()) {
+      shots_to_use[find_shot->second] = true;
     }
   }
 
+  // Pairs are ordered by shot ID : rank shots once instead of comparing
+  // strings for every pair of observations.
+  std::vector<ShotIndex> sorted_shots(shot_ids_.size());
+  for (ShotIndex i = 0; i < sorted_shots.size(); ++i) {
+    sorted_shots[i] = i;
+  }
+  std::sort(sorted_shots.begin(), sorted_shots.end(),
+            [this](ShotIndex a, ShotIndex b) {
+              return shot_ids_[a] < shot_ids_[b];
+            });
+  std::vector<int> shot_rank(shot_ids_.size());
+  for (int i = 0; i < sorted_shots.size(); ++i) {
+    shot_rank[sorted_shots[i]] = i;
+  }
 
-  for (const auto& track_id : tracks_to_use) {
-    const auto find_track = shot_per_tracks_.find(track_id);
-    if(find_track == shot_per_tracks_.end()){
-      continue;
-    }
-    const auto& track = find_track->second;
-    for (std::unordered_map<ShotId, Observation>::const_iterator it1 =
-             track.begin();
-         it1 != track.end(); ++it1) {
-      const auto& shotID1 = it1->first;
-      if(shots_to_use.find(shotID1) == shots_to_use.end()){
+  std::unordered_map<uint64_t, int> common_per_index_pair;
+  for (const auto track_index : tracks_to_use) {
+    const auto& track = shot_per_tracks_[track_index];
+    for (const auto& it1 : track) {
+      const auto shot1 = it1.first;
+      if (!shots_to_use[shot1]) {
         continue;
       }
-      for (std::unordered_map<ShotId, Observation>::const_iterator it2 =
-               track.begin();
-           it2 != track.end(); ++it2) {
-        const auto& shotID2 = it2->first;
-        if(shots_to_use.find(shotID2) == shots_to_use.end()){
-          continue;
-        }
-        if (shotID1 == shotID2) {
-          continue;
-        }
-        if (shotID1 > shotID2) {
+      for (const auto& it2 : track) {
+        const auto shot2 = it2.first;
+        if (!shots_to_use[shot2] || shot_rank[shot1] >= shot_rank[shot2]) {
           continue;
         }
-        ++common_per_pair[std::make_pair(shotID1, shotID2)];
+        const uint64_t key = (static_cast<uint64_t>(shot1) << 32) | shot2;
+        ++common_per_index_pair[key];
       }
     }
   }
+
+  std::unordered_map<ShotPair, int, HashPair> common_per_pair;
+  for (const auto& pair : common_per_index_pair) {
+    const auto& shot1 = shot_ids_[pair.first >> 32];
+    const auto& shot2 = shot_ids_[pair.first & 0xFFFFFFFF];
+    common_per_pair[std::make_pair(shot1, shot2)] = pair.second;
+  }
   return common_per_pair;
 }
 
+TracksManager::ObservationArrays TracksManager::GetTracksObservationArrays(
+    const std::vector<TrackId>& tracks,
+    const std::vector<ShotId>& shots) const {
+  std::vector<int> shot_positions(shot_ids_.size(), -1);
+  for (int i = 0; i < shots.size(); ++i) {
+    const auto find_shot = shot_indexes_.find(shots[i]);
+    if (find_shot != shot_indexes_.end()) {
+      shot_positions[find_shot->second] = i;
+    }
+  }
+
+  std::vector<IndexedObservation> observations;
+  for (int i = 0; i < tracks.size(); ++i) {
+    const auto find_track = track_indexes_.find(tracks[i]);
+    if (find_track == track_indexes_.end()) {
+      continue;
+    }
+    for (const auto& obs : shot_per_tracks_[find_track->second]) {
+      const auto shot_position = shot_positions[obs.first];
+      if (shot_position >= 0) {
+        observations.emplace_back(i, shot_position, obs.second);
+      }
+    }
+  }
+  return MakeObservationArrays(&observations);
+}
+
+TracksManager::ObservationArrays TracksManager::MakeObservationArrays(
+    std::vector<IndexedObservation>* observations) {
+  std::sort(observations->begin(), observations->end(),
+            [](const IndexedObservation& a, const IndexedObservation& b) {
+              return std::make_pair(std::get<0>(a), std::get<1>(a)) <
+                     std::make_pair(std::get<0>(b), std::get<1>(b));
+            });
+
+  const int count = observations->size();
+  ObservationArrays arrays;
+  auto& track_positions = std::get<0>(arrays);
+  auto& shot_positions = std::get<1>(arrays);
+  auto& points = std::get<2>(arrays);
+  auto& scales = std::get<3>(arrays);
+  auto& feature_ids = std::get<4>(arrays);
+  track_positions.resize(count);
+  shot_positions.resize(count);
+  points.resize(count, 2);
+  scales.resize(count);
+  feature_ids.resize(count);
+  for (int i = 0; i < count; ++i) {
+    const auto& indexed = (*observations)[i];
+    const auto& observation = std::get<2>(indexed);
+    track_positions[i] = std::get<0>(indexed);
+    shot_positions[i] = std::get<1>(indexed);
+    points.row(i) = observation.point.transpose();
+    scales[i] = observation.scale;
+    feature_ids[i] = observation.id;
+  }
+  return arrays;
+}
+
 TracksManager TracksManager::InstanciateFromFile(const std::string& filename) {
-  std::ifstream istream(filename);
+  std::ifstream istream(filename, std::ios::binary);
   if (istream.is_open()) {
+    if (IsBinaryTracksStream(istream)) {
+      return InstanciateFromBinaryStream(istream);
+    }
     return InstanciateFromStreamT(istream);
   } else {
     throw std::runtime_error("Can't read tracks manager file");
@@ -300,6 +702,15 @@ void TracksManager::WriteToFile(const std::string& filename)const {
   }
 }
 
+void TracksManager::WriteToBinaryFile(const std::string& filename) const {
+  std::ofstream ostream(filename, std::ios::binary);
+  if (ostream.is_open()) {
+    WriteToBinaryStreamCurrentVersion(ostream, *this);
+  } else {
+    throw std::runtime_error("Can't write tracks manager file");
+  }
+}
+
 TracksManager TracksManager::InstanciateFromString(const std::string& str) {
   std::stringstream sstream(str);
   return InstanciateFromStreamT(sstream);
@@ -312,4 +723,10 @@ std::string TracksManager::AsSring()const {
 }
 
 std::string TracksManager::TRACKS_HEADER = "OPENSFM_TRACKS_VERSION";
-int TracksManager::TRACKS_VERSION = 1;
\ No newline at end of file
+int TracksManager::TRACKS_VERSION = 1;
+std::string TracksManager::TRACKS_BINARY_HEADER = "OPENSFM_TRACKS_BINARY";
+int TracksManager::TRACKS_BINARY_VERSION = 2;
+
+size_t TracksManager::BinaryPadding(size_t position) {
+  return (8 - position % 8) % 8;
+}
\ No newline at end of file
@@ -1,6 +1,7 @@
 #include <gmock/gmock.h>
 #include <gtest/gtest.h>
 #include <sfm/tracks_manager.h>
+#include <sfm/mapped_tracks_manager.h>
 
 namespace {
 
@@ -59,6 +60,25 @@ TEST_F(TracksManagerTest, AddsObservation) {
   EXPECT_EQ(manager.GetObservation("4", "1"), obs);
 }
 
+TEST_F(TracksManagerTest, AddsObservations) {
+  Eigen::VectorXi shot_indexes(2), track_indexes(2), ids(2);
+  shot_indexes << 0, 1;
+  track_indexes << 0, 0;
+  ids << 4, 5;
+  Eigen::MatrixXd points(2, 3);
+  points << 4.0, 4.0, 4.0, 5.0, 5.0, 5.0;
+  Eigen::MatrixXi colors(2, 3);
+  colors << 4, 4, 4, 5, 5, 5;
+  manager.AddObservations({"4", "1"}, {"2"}, shot_indexes, track_indexes,
+                          points, colors, ids);
+
+  EXPECT_EQ(manager.GetObservation("4", "2"),
+            Observation(4.0, 4.0, 4.0, 4, 4, 4, 4));
+  EXPECT_EQ(manager.GetObservation("1", "2"),
+            Observation(5.0, 5.0, 5.0, 5, 5, 5, 5));
+  EXPECT_EQ(manager.GetTrackObservations("1"), track);
+}
+
 TEST_F(TracksManagerTest, RemoveObservation) {
   manager.RemoveObservation("3", "1");
   auto copy = track;
@@ -96,6 +116,18 @@ TEST_F(TracksManagerTest, ConstructSubTracksManager) {
   EXPECT_EQ(subtrack, subset.GetTrackObservations("1"));
 }
 
+TEST_F(TracksManagerTest, InternsIDsAsIndexes) {
+  manager.AddObservation("4", "2", Observation(4.0, 4.0, 4.0, 4, 4, 4, 4));
+  EXPECT_EQ(3, manager.GetShotIndex("4"));
+  EXPECT_EQ(1, manager.GetTrackIndex("2"));
+  EXPECT_EQ("4", manager.GetShotId(3));
+  EXPECT_EQ("2", manager.GetTrackId(1));
+  EXPECT_EQ(1, manager.GetShotIndexObservations(3).count(1));
+  EXPECT_EQ(3, manager.GetTrackIndexObservations(0).size());
+  EXPECT_TRUE(manager.HasTrack("2"));
+  EXPECT_FALSE(manager.HasShot("5"));
+}
+
 TEST_F(TracksManagerTest, HasIOFileConsistency) {
   manager.WriteToFile(tmpfile.Name());
   const TracksManager manager_new =
@@ -108,6 +140,59 @@ TEST_F(TracksManagerTest, HasIOFileConsistency) {
   EXPECT_EQ(track, manager_new.GetTrackObservations("1"));
 }
 
+TEST_F(TracksManagerTest, HasIOBinaryFileConsistency) {
+  manager.WriteToBinaryFile(tmpfile.Name());
+  const TracksManager manager_new =
+      TracksManager::InstanciateFromFile(tmpfile.Name());
+
+  EXPECT_THAT(manager_new.GetShotIds(),
+              ::testing::WhenSorted(::testing::ElementsAre("1", "2", "3")));
+  EXPECT_THAT(manager_new.GetTrackIds(),
+              ::testing::WhenSorted(::testing::ElementsAre("1")));
+  EXPECT_EQ(track, manager_new.GetTrackObservations("1"));
+}
+
+TEST_F(TracksManagerTest, MappedHasConsistency) {
+  manager.AddObservation("1", "2", Observation(4.0, 4.0, 4.0, 4, 4, 4, 4));
+  manager.WriteToBinaryFile(tmpfile.Name());
+  const MappedTracksManager mapped(tmpfile.Name());
+
+  EXPECT_EQ(3, mapped.NumShots());
+  EXPECT_EQ(2, mapped.NumTracks());
+  EXPECT_EQ(track, mapped.GetTrackObservations("1"));
+  EXPECT_EQ(manager.GetShotObservations("1"), mapped.GetShotObservations("1"));
+  EXPECT_EQ(Observation(4.0, 4.0, 4.0, 4, 4, 4, 4),
+            mapped.GetObservation("1", "2"));
+  EXPECT_EQ(manager.GetAllCommonObservations("1", "2"),
+            mapped.GetAllCommonObservations("1", "2"));
+  EXPECT_EQ(manager.GetAllPairsConnectivity({}, {}),
+            mapped.GetAllPairsConnectivity({}, {}));
+
+  const auto subset = mapped.ConstructSubTracksManager({"1"}, {"2", "3"});
+  EXPECT_THAT(subset.GetShotIds(),
+              ::testing::WhenSorted(::testing::ElementsAre("2", "3")));
+}
+
+TEST_F(TracksManagerTest, ReturnsTracksObservationArrays) {
+  manager.AddObservation("1", "2", Observation(4.0, 4.0, 4.0, 4, 4, 4, 4));
+  const auto arrays =
+      manager.GetTracksObservationArrays({"2", "0", "1"}, {"3", "1"});
+
+  const auto& points = std::get<2>(arrays);
+  EXPECT_TRUE(std::get<0>(arrays) == Eigen::Vector3i(0, 2, 2));
+  EXPECT_TRUE(std::get<1>(arrays) == Eigen::Vector3i(1, 0, 1));
+  EXPECT_TRUE(points.row(1) == Eigen::RowVector2d(3.0, 3.0));
+  EXPECT_TRUE(std::get<3>(arrays) == Eigen::Vector3d(4.0, 3.0, 1.0));
+  EXPECT_TRUE(std::get<4>(arrays) == Eigen::Vector3i(4, 3, 1));
+
+  manager.WriteToBinaryFile(tmpfile.Name());
+  const MappedTracksManager mapped(tmpfile.Name());
+  const auto mapped_arrays =
+      mapped.GetTracksObservationArrays({"2", "0", "1"}, {"3", "1"});
+  EXPECT_TRUE(std::get<1>(arrays) == std::get<1>(mapped_arrays));
+  EXPECT_TRUE(points == std::get<2>(mapped_arrays));
+}
+
 TEST_F(TracksManagerTest, HasIOStringConsistency) {
   const auto serialized = manager.AsSring();
   const TracksManager manager_new =
@@ -5,6 +5,7 @@
 
 #include <fstream>
 #include <map>
+#include <tuple>
 #include <unordered_map>
 #include <vector>
 
@@ -13,6 +14,13 @@ class TracksManager {
 
   void AddObservation(const ShotId& shot_id, const TrackId& track_id,
                       const Observation& observation);
+  void AddObservations(const std::vector<ShotId>& shot_ids,
+                       const std::vector<TrackId>& track_ids,
+                       const Eigen::VectorXi& shot_indexes,
+                       const Eigen::VectorXi& track_indexes,
+                       const Eigen::MatrixXd& points,
+                       const Eigen::MatrixXi& colors,
+                       const Eigen::VectorXi& feature_ids);
   void RemoveObservation(const ShotId& shot_id, const TrackId& track_id);
   Observation GetObservation(const ShotId& shot, const TrackId& track) const;
 
@@ -21,11 +29,23 @@ class TracksManager {
   std::vector<ShotId> GetShotIds() const;
   std::vector<TrackId> GetTrackIds() const;
 
-  const std::unordered_map<TrackId, Observation>& GetShotObservations(
+  std::unordered_map<TrackId, Observation> GetShotObservations(
       const ShotId& shot) const;
-  const std::unordered_map<ShotId, Observation>& GetTrackObservations(
+  std::unordered_map<ShotId, Observation> GetTrackObservations(
       const TrackId& track) const;
 
+  // Shots and tracks IDs are interned as dense indexes, in insertion order
+  bool HasShot(const ShotId& shot) const;
+  bool HasTrack(const TrackId& track) const;
+  ShotIndex GetShotIndex(const ShotId& shot) const;
+  TrackIndex GetTrackIndex(const TrackId& track) const;
+  const ShotId& GetShotId(ShotIndex shot) const;
+  const TrackId& GetTrackId(TrackIndex track) const;
+  const std::unordered_map<TrackIndex, Observation>& GetShotIndexObservations(
+      ShotIndex shot) const;
+  const std::unordered_map<ShotIndex, Observation>& GetTrackIndexObservations(
+      TrackIndex track) const;
+
   TracksManager ConstructSubTracksManager(
       const std::vector<TrackId>& tracks,
       const std::vector<ShotId>& shots) const;
@@ -39,18 +59,54 @@ class TracksManager {
       const std::vector<ShotId>& shots,
       const std::vector<TrackId>& tracks) const;
 
+  // Observations of tracks in shots as flat arrays, sorted by track then
+  // by shot : index of the track in tracks, index of the shot in shots,
+  // points, scales and feature ids.  Unknown tracks and shots are skipped.
+  using ObservationArrays =
+      std::tuple<Eigen::VectorXi, Eigen::VectorXi,
+                 Eigen::Matrix<double, -1, 2, Eigen::RowMajor>,
+                 Eigen::VectorXd, Eigen::VectorXi>;
+  ObservationArrays GetTracksObservationArrays(
+      const std::vector<TrackId>& tracks,
+      const std::vector<ShotId>& shots) const;
+
   static TracksManager InstanciateFromFile(const std::string& filename);
   void WriteToFile(const std::string& filename)const;
+  void WriteToBinaryFile(const std::string& filename) const;
 
   static TracksManager InstanciateFromString(const std::string& str);
+  // Build a manager from the columns of a binary tracks file, whose
+  // observations refer to shots and tracks by their position in the ids
+  static TracksManager InstanciateFromColumns(
+      const std::vector<ShotId>& shot_ids,
+      const std::vector<TrackId>& track_ids,
+      const std::vector<int32_t>& shot_index,
+      const std::vector<int32_t>& track_index,
+      const std::vector<int32_t>& feature_id, const std::vector<double>& x,
+      const std::vector<double>& y, const std::vector<double>& scale,
+      const std::vector<uint8_t>& color);
   std::string AsSring()const;
 
   static std::string TRACKS_HEADER;
   static int TRACKS_VERSION;
+  static std::string TRACKS_BINARY_HEADER;
+  static int TRACKS_BINARY_VERSION;
+  static size_t BinaryPadding(size_t position);
+
+  // (track index, shot index, observation) triplets, sorted in place
+  using IndexedObservation = std::tuple<int, int, Observation>;
+  static ObservationArrays MakeObservationArrays(
+      std::vector<IndexedObservation>* observations);
 
  private:
-  std::unordered_map<ShotId, std::unordered_map<TrackId, Observation>>
-      tracks_per_shot_;
-  std::unordered_map<TrackId, std::unordered_map<ShotId, Observation>>
-      shot_per_tracks_;
+  ShotIndex InternShot(const ShotId& shot);
+  TrackIndex InternTrack(const TrackId& track);
+
+  std::vector<ShotId> shot_ids_;
+  std::vector<TrackId> track_ids_;
+  std::unordered_map<ShotId, ShotIndex> shot_indexes_;
+  std::unordered_map<TrackId, TrackIndex> track_indexes_;
+
+  std::vector<std::unordered_map<TrackIndex, Observation>> tracks_per_shot_;
+  std::vector<std::unordered_map<ShotIndex, Observation>> shot_per_tracks_;
 };
\ No newline at end of file
@@ -5,6 +5,10 @@
 using TrackId = std::string;
 using ShotId = std::string;
 
+// Dense indexes of interned shot and track IDs
+using TrackIndex = int32_t;
+using ShotIndex = int32_t;
+
 struct HashPair { 
     template <class T1, class T2> 
     size_t operator()(const std::pair<T1, T2>& p) const
@@ -54,19 +54,34 @@ class SyntheticDataSet(DataSet):
     def load_features(self, image):
         return self.features[image], self.descriptors[image], self.colors[image]
 
+    def load_points_colors(self, image):
+        return self.features[image], self.colors[image]
+
     def save_features(self, image, points, descriptors, colors):
         pass
 
+    def load_vlad(self, image):
+        return None
+
+    def save_vlad(self, image, vlad):
+        pass
+
     def matches_exists(self, image):
         self._check_and_create_matches()
         if self.matches is None:
             return False
         return True
 
-    def load_matches(self, image):
+    def load_matches(self, image, images=None):
         self._check_and_create_matches()
         if self.matches is not None:
-            return self.matches[image]
+            if images is None:
+                return self.matches[image]
+            return {im2: m for im2, m in self.matches[image].items()
+                    if im2 in images}
+
+    def matched_images(self, image):
+        return list(self.load_matches(image))
 
     def _check_and_create_matches(self):
         if self.matches is None:
@@ -1,5 +1,4 @@
 import copy
-import networkx as nx
 import numpy as np
 
 from opensfm import pybundle
@@ -54,17 +53,10 @@ def test_sigleton_pan_tilt_roll():
     assert np.allclose(ptr, (pan, tilt, roll))
 
 
-def _projection_errors_std(points):
-    all_errors = []
-    for p in points.values():
-        all_errors += p.reprojection_errors.values()
-    return np.std(all_errors)
-
-
 def test_bundle_projection_fixed_internals(scene_synthetic):
     reference = scene_synthetic[0].get_reconstruction()
     camera_priors = {c.id: c for c in scene_synthetic[0].cameras}
-    graph = tracking.as_graph(scene_synthetic[5])
+    graph = tracking.as_inliers_graph(scene_synthetic[5])
     adjusted = copy.deepcopy(reference)
 
     custom_config = config.default_config()
@@ -72,12 +64,58 @@ def test_bundle_projection_fixed_internals(scene_synthetic):
     custom_config['optimize_camera_parameters'] = False
     reconstruction.bundle(graph, adjusted, camera_priors, {}, custom_config)
 
-    assert _projection_errors_std(adjusted.points) < 5e-3
+    assert np.std(graph.residuals()) < 5e-3
     assert reference.cameras['1'].focal == adjusted.cameras['1'].focal
     assert reference.cameras['1'].k1 == adjusted.cameras['1'].k1
     assert reference.cameras['1'].k2 == adjusted.cameras['1'].k2
 
 
+def test_bundle_bulk_arrays():
+    """Points triangulated from fixed shots added as arrays."""
+    camera = types.PerspectiveCamera()
+    camera.id = 'cam1'
+    camera.focal = 1.0
+    camera.k1 = camera.k2 = 0.0
+    rotations = np.array([[0.0, 0, 0], [0, 0.1, 0], [0.1, 0, 0]])
+    translations = np.array([[0.0, 0, 0], [-1, 0, 0], [0, -1, 0]])
+    points = np.array([[0.0, 0, 3], [1, 1, 4], [-1, 0.5, 5]])
+
+    shots, point_indexes, features = [], [], []
+    for i, (r, t) in enumerate(zip(rotations, translations)):
+        pose = types.Pose(r, t)
+        for j, point in enumerate(points):
+            shots.append(i)
+            point_indexes.append(j)
+            features.append(camera.project(pose.transform(point)))
+
+    sa = pybundle.BundleAdjuster()
+    sa.add_perspective_camera('cam1', 1, 0, 0, 1, 0, 0, True)
+    sa.add_shots(['1', '2', '3'], 3 * ['cam1'], rotations, translations,
+                 3 * [True])
+    sa.add_points(['a', 'b', 'c'], points + 0.1, False)
+    sa.add_point_projection_observations(
+        np.array(shots, dtype=np.int32), np.array(point_indexes, dtype=np.int32),
+        np.array(features), np.ones(len(shots)))
+
+    sa.run()
+    r, t = sa.get_shot_poses()
+    positions = sa.get_point_positions()
+    residuals = sa.get_projection_residuals()
+
+    assert np.allclose(r, rotations)
+    assert np.allclose(t, translations)
+    assert np.allclose(positions, points, atol=1e-6)
+    assert np.allclose(positions[1], sa.get_point('b').p)
+    assert residuals.shape == (9, 2)
+    assert np.allclose(residuals, 0, atol=1e-6)
+
+    sa.set_compute_reprojection_errors(False)
+    sa.run()
+    residuals = sa.get_projection_residuals()
+    assert residuals.shape == (9, 2)
+    assert np.isnan(residuals).all()
+
+
 def test_pair():
     """Simple two camera test"""
     sa = pybundle.BundleAdjuster()
@@ -322,7 +360,7 @@ def test_bundle_alignment_prior():
     r = types.Reconstruction()
     r.add_camera(camera)
     r.add_shot(shot)
-    graph = nx.Graph()
+    graph = tracking.InliersGraph()
     camera_priors = {camera.id: camera}
     gcp = []
     myconfig = config.default_config()
@@ -1,5 +1,11 @@
+import os
+
 import numpy as np
 
+from opensfm import bow
+from opensfm import context
+from opensfm import features
+from opensfm import pysfm
 from opensfm.test import data_generation
 
 
@@ -21,3 +27,166 @@ def test_dataset_load_features_sift(tmpdir):
     assert np.allclose(p, points)
     assert np.allclose(d, descriptors)
     assert np.allclose(c, colors)
+
+
+def test_dataset_load_features_uncompressed(tmpdir):
+    data = data_generation.create_berlin_test_folder(tmpdir)
+    data.config['feature_type'] = 'SIFT'
+    data.config['features_format'] = 'npy'
+
+    image = data.images()[0]
+    points = np.random.random((3, 4))
+    descriptors = np.random.random((3, 128))
+    colors = np.random.random((3, 3))
+    data.save_features(image, points, descriptors, colors)
+
+    assert data.features_exist(image)
+    p, d, c = data.load_features(image)
+    assert np.allclose(p, points)
+    assert np.allclose(d, descriptors)
+    assert isinstance(d, np.memmap)
+    assert np.allclose(c, colors)
+
+    p, c = data.load_points_colors(image)
+    assert np.allclose(p, points)
+    assert np.allclose(c, colors)
+
+
+def test_dataset_load_features_uncompressed_hahog(tmpdir):
+    data = data_generation.create_berlin_test_folder(tmpdir)
+    data.config['features_format'] = 'npy'
+    assert data.config['feature_type'] == 'HAHOG'
+    assert data.config['hahog_normalize_to_uchar']
+
+    image = data.images()[0]
+    points = np.random.random((3, 4))
+    descriptors = np.random.randint(0, 256, (3, 128))
+    colors = np.random.random((3, 3))
+    data.save_features(image, points, descriptors, colors)
+
+    _, d, _ = data.load_features(image)
+    assert isinstance(d, np.memmap)
+    assert d.dtype == np.float32
+    assert np.allclose(d, descriptors)
+
+
+def test_dataset_flann_index(tmpdir):
+    data = data_generation.create_berlin_test_folder(tmpdir)
+    data.config['feature_type'] = 'SIFT'
+
+    image = data.images()[0]
+    points = np.random.random((100, 4))
+    descriptors = np.random.random((100, 128))
+    colors = np.random.random((100, 3))
+    data.save_features(image, points, descriptors, colors)
+    assert not data.flann_index_exists(image)
+
+    _, d, _ = data.load_features(image)
+    data.save_flann_index(image, features.build_flann_index(d, data.config))
+    assert data.flann_index_exists(image)
+    assert data.load_flann_index(image, d) is not None
+
+    data.config['flann_branching'] += 1
+    assert not data.flann_index_exists(image)
+    assert data.load_flann_index(image, d) is None
+
+
+def test_dataset_vlad(tmpdir):
+    data = data_generation.create_berlin_test_folder(tmpdir)
+    data.config['feature_type'] = 'SIFT'
+
+    image = data.images()[0]
+    points = np.random.random((100, 4))
+    descriptors = np.random.random((100, 128))
+    colors = np.random.random((100, 3))
+    data.save_features(image, points, descriptors, colors)
+    assert data.load_vlad(image) is None
+
+    vlad = np.random.random(64 * 128).astype(np.float32)
+    data.save_vlad(image, vlad)
+    assert np.array_equal(data.load_vlad(image), vlad)
+
+    data.config['vlad_file'] = 'other_words.npz'
+    assert data.load_vlad(image) is None
+
+    data.save_vlad(image, vlad)
+    data.config['segmentation_ignore_values'] = [1]
+    assert data.load_vlad(image) is None
+
+    data.save_vlad(image, vlad)
+    mask_file = str(tmpdir.join('mask.png'))
+    open(mask_file, 'w').close()
+    data.mask_files[image] = mask_file
+    assert data.load_vlad(image) is None
+
+
+def test_dataset_bow_database(tmpdir):
+    data = data_generation.create_berlin_test_folder(tmpdir)
+    assert data.load_bow_database() is None
+
+    im1, im2, _ = data.images()
+    database = bow.BowDatabase(data.config['bow_file'], 8)
+    database.update({im1: np.arange(8.0), im2: None}, {im1: 'a', im2: 'b'})
+    data.save_bow_database(database)
+
+    loaded = data.load_bow_database()
+    assert loaded.images == [im1, im2]
+    assert loaded.signature(im1) == 'a'
+    assert np.array_equal(loaded.histograms.toarray(),
+                          database.histograms.toarray())
+
+    data.config['bow_file'] = 'other_words.npz'
+    assert data.load_bow_database() is None
+
+
+def test_dataset_save_load_matches(tmpdir):
+    data = data_generation.create_berlin_test_folder(tmpdir)
+    im1, im2, im3 = data.images()
+
+    matches = {
+        im2: np.array([[0, 1], [2, 3], [4, 5]]),
+        im3: np.array([]),
+    }
+    data.save_matches(im1, matches)
+
+    loaded = data.load_matches(im1)
+    assert list(loaded) == [im2, im3]
+    assert np.array_equal(loaded[im2], matches[im2])
+    assert len(loaded[im3]) == 0
+
+    assert np.array_equal(data.find_matches(im1, im2), matches[im2])
+    assert np.array_equal(data.find_matches(im2, im1), matches[im2][:, [1, 0]])
+    assert len(data.find_matches(im2, im3)) == 0
+
+
+def _track_features(args):
+    tracks_manager, track_id = args
+    observations = tracks_manager.get_track_observations(track_id)
+    return {shot_id: obs.id for shot_id, obs in observations.items()}
+
+
+def test_dataset_load_read_only_tracks_manager(tmpdir):
+    data = data_generation.create_berlin_test_folder(tmpdir)
+    tracks_manager = pysfm.TracksManager()
+    for shot_id, track_id, feature_id in [('1', '0', 3), ('2', '0', 5),
+                                          ('1', '1', 4), ('3', '1', 2)]:
+        observation = pysfm.Observation(0.1, 0.2, 1.0, 0, 0, 0, feature_id)
+        tracks_manager.add_observation(shot_id, track_id, observation)
+
+    data.config['tracks_format'] = 'binary'
+    data.save_tracks_manager(tracks_manager)
+    assert os.path.isfile(os.path.join(data.data_path, 'tracks.bin'))
+    mapped = data.load_read_only_tracks_manager()
+    assert isinstance(mapped, pysfm.MappedTracksManager)
+    results = context.parallel_map(
+        _track_features, [(mapped, '0'), (mapped, '1')], 2)
+    assert results == [{'1': 3, '2': 5}, {'1': 4, '3': 2}]
+
+    data.config['tracks_format'] = 'text'
+    assert data.tracks_exists()
+    assert isinstance(data.load_read_only_tracks_manager(),
+                      pysfm.MappedTracksManager)
+    data.save_tracks_manager(tracks_manager)
+    loaded = data.load_read_only_tracks_manager()
+    assert isinstance(loaded, pysfm.TracksManager)
+    assert loaded.num_tracks() == 2
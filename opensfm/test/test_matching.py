@@ -4,6 +4,7 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import numpy as np
+import cv2
 from six import iteritems
 
 from opensfm import config
@@ -109,6 +110,39 @@ def test_match_images(scene_synthetic):
     assert value*(1-margin) < sum([len(m) for m in pairs.values()]) < value*(1+margin)
 
 
+def test_match_images_incremental(scene_synthetic):
+    reference = scene_synthetic[0].get_reconstruction()
+    synthetic = synthetic_dataset.SyntheticDataSet(reference,
+                                                   scene_synthetic[1],
+                                                   scene_synthetic[2],
+                                                   scene_synthetic[3],
+                                                   scene_synthetic[4],
+                                                   scene_synthetic[5])
+
+    stored = {}
+    synthetic.matches_exists = lambda im: im in stored
+    synthetic.matched_images = lambda im: list(stored[im])
+    synthetic.save_matches = lambda im, m: stored.update({im: m})
+    synthetic.config['matching_gps_neighbors'] = 5
+    synthetic.config['matcher_type'] = 'FLANN'
+
+    images = sorted(synthetic.images())
+    old_images = images[:len(images) // 2]
+    pairs, _ = matching.match_images(synthetic, old_images, old_images)
+    matching.save_matches(synthetic, old_images, pairs)
+    old_files = dict(stored)
+
+    new_images, new_pairs, report = matching.match_images_incremental(
+        synthetic, images)
+    matching.save_matches(synthetic, new_images, new_pairs)
+
+    assert new_images == images[len(images) // 2:]
+    assert report['num_new_images'] == len(new_images)
+    assert report['num_pairs_reused'] == len(pairs)
+    assert all(im1 in new_images for im1, _ in new_pairs)
+    assert all(stored[im] is old_files[im] for im in old_images)
+
+
 def test_ordered_pairs():
     neighbors = [
         [1, 3],
@@ -120,3 +154,53 @@ def test_ordered_pairs():
     images = [1, 2, 3]
     pairs = pairs_selection.ordered_pairs(neighbors, images)
     assert set(pairs) == {(1, 2), (1, 3), (2, 5), (3, 2)}
+
+
+def test_schedule_matching():
+    images = ['{:02d}.jpg'.format(i) for i in range(40)]
+    per_image = {im: images[i + 1:i + 4] for i, im in enumerate(images)}
+
+    blocks = matching.schedule_matching(per_image, 4, 12)
+
+    scheduled = [im for block in blocks for im, _ in block]
+    assert sorted(scheduled) == images
+    for block in blocks:
+        block_images = set()
+        for im, candidates in block:
+            assert candidates == per_image[im]
+            block_images.update(candidates, [im])
+        assert len(block_images) <= 12
+
+
+def test_match_brute_force_many():
+    np.random.seed(42)
+    f2 = np.random.rand(200, 16).astype(np.float32)
+    features = [f2[np.random.permutation(200)[:n]] +
+                0.01 * np.random.rand(n, 16).astype(np.float32)
+                for n in [50, 2, 100]]
+    config = {'lowes_ratio': 0.8}
+
+    batched = matching.match_brute_force_many(features, f2, config)
+
+    assert len(batched) == len(features)
+    matcher = cv2.DescriptorMatcher_create('BruteForce')
+    for f1, matches in zip(features, batched):
+        expected = [[m.queryIdx, m.trainIdx]
+                    for m, n in matcher.knnMatch(f1, f2, k=2)
+                    if m.distance < config['lowes_ratio'] * n.distance]
+        assert np.array_equal(matches, np.reshape(expected, (-1, 2)))
+        assert len(matches) == len(f1)
+
+
+def test_non_static_matches():
+    p1 = np.array([[0.1, 0.1, 1.0], [0.2, 0.2, 1.0], [0.3, 0.3, 1.0]])
+    p2 = np.array([[0.1, 0.1, 1.0], [0.25, 0.2, 1.0], [0.3, 0.3, 1.0]])
+    matches = np.array([[0, 0], [1, 1], [2, 0], [2, 2]])
+    config = {}
+
+    res = matching._non_static_matches(p1, p2, matches, config)
+    assert np.array_equal(res, [[1, 1], [2, 0]])
+
+    # Entirely static images are kept
+    res = matching._non_static_matches(p1, p1, matches[:1], config)
+    assert np.array_equal(res, matches[:1])
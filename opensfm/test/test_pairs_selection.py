@@ -9,10 +9,12 @@ import pytest
 
 from six import iteritems
 
+from opensfm import bow
 from opensfm import commands
 from opensfm import dataset
 from opensfm import pairs_selection
 from opensfm import feature_loader
+from opensfm import vlad
 
 from opensfm.test import data_generation
 
@@ -129,3 +131,60 @@ def test_match_candidates_from_metadata_time(lund_path):
     data_generation.save_config(config, lund_path)
     data = dataset.DataSet(lund_path)
     match_candidates_from_metadata(data)
+
+
+def test_match_candidates_by_order():
+    images = ['0.jpg', '1.jpg', '2.jpg', '3.jpg']
+    pairs = pairs_selection.match_candidates_by_order(images, images, 2)
+    assert pairs == {('0.jpg', '1.jpg'), ('1.jpg', '2.jpg'), ('2.jpg', '3.jpg')}
+
+
+def test_match_candidates_by_time():
+    images = ['0.jpg', '1.jpg', '2.jpg', '3.jpg']
+    exifs = {im: {'capture_time': t} for im, t in zip(images, [0, 10, 1, 30])}
+    pairs = pairs_selection.match_candidates_by_time(
+        images[:2], images, exifs, 1)
+    assert pairs == {('0.jpg', '2.jpg'), ('1.jpg', '2.jpg')}
+
+
+def test_histogram_distances():
+    np.random.seed(42)
+    images = ['0.jpg', '1.jpg', '2.jpg', '3.jpg']
+    histograms = {im: np.random.rand(16) for im in images[:3]}
+    candidates = {im: images for im in images[:2]}
+    candidates['2.jpg'] = ['3.jpg', '0.jpg']
+    candidates['3.jpg'] = images
+
+    results = pairs_selection.histogram_distances(candidates, histograms)
+
+    for (im, d, other), im_cands in zip(results, candidates.items()):
+        expected_im, expected_d, expected_other = vlad.vlad_distances(
+            im_cands[0], im_cands[1], histograms)
+        assert im == expected_im
+        assert other == expected_other
+        assert np.allclose(d, expected_d)
+
+
+def test_bow_database_distances():
+    np.random.seed(42)
+    images = ['0.jpg', '1.jpg', '2.jpg', '3.jpg', '4.jpg']
+    histograms = {}
+    for im in images[:3]:
+        h = np.random.rand(16) * (np.random.rand(16) > 0.5)
+        histograms[im] = h / h.sum()
+    database = bow.BowDatabase('words.npz', 16)
+    database.update(dict(histograms, **{'3.jpg': None}),
+                    {im: '' for im in images[:4]})
+    candidates = {im: images for im in images[:2]}
+    candidates['2.jpg'] = ['3.jpg', '0.jpg']
+    candidates['3.jpg'] = images
+    candidates['4.jpg'] = images
+
+    results = pairs_selection.bow_database_distances(candidates, database)
+
+    for (im, d, other), im_cands in zip(results, candidates.items()):
+        expected_im, expected_d, expected_other = pairs_selection.bow_distances(
+            im_cands[0], im_cands[1], histograms)
+        assert im == expected_im
+        assert other == expected_other
+        assert np.allclose(d, expected_d)
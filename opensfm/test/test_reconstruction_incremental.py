@@ -15,10 +15,12 @@ def test_reconstruction_incremental(scene_synthetic):
                                                  scene_synthetic[4],
                                                  scene_synthetic[5])
 
-    _, reconstructed_scene = reconstruction.\
+    report, reconstructed_scene = reconstruction.\
         incremental_reconstruction(dataset, scene_synthetic[5])
     errors = synthetic_scene.compare(reference, reconstructed_scene[0])
 
+    batches = report['reconstructions'][0]['grow']['batches']
+    assert all(len(batch['images']) == 1 for batch in batches)
     assert errors['ratio_cameras'] >= 0.95          # Keeps jumping last resection between 9 and 14 inliers with Python3
     assert 0.920 < errors['ratio_points'] < 0.950
 
@@ -30,3 +32,53 @@ def test_reconstruction_incremental(scene_synthetic):
     assert 1.1 < errors['position_std'] < 4
     assert 8.0 < errors['gps_std'] < 10.0
     assert errors['gps_average'] < 3e-3
+
+
+def test_reconstruction_incremental_batches(scene_synthetic):
+    reference = scene_synthetic[0].get_reconstruction()
+    dataset = synthetic_dataset.SyntheticDataSet(reference,
+                                                 scene_synthetic[1],
+                                                 scene_synthetic[2],
+                                                 scene_synthetic[3],
+                                                 scene_synthetic[4],
+                                                 scene_synthetic[5])
+    dataset.config['resection_batch_size'] = 3
+    dataset.config['processes'] = 2
+
+    report, reconstructed_scene = reconstruction.\
+        incremental_reconstruction(dataset, scene_synthetic[5])
+    errors = synthetic_scene.compare(reference, reconstructed_scene[0])
+
+    grow_report = report['reconstructions'][0]['grow']
+    batches = grow_report['batches']
+    assert max(len(batch['images']) for batch in batches) > 1
+    assert sum(len(batch['images']) for batch in batches) == \
+        len(grow_report['steps'])
+    assert errors['ratio_cameras'] >= 0.95
+    assert errors['position_average'] < 3
+
+
+def test_reconstruction_extend(scene_synthetic):
+    reference = scene_synthetic[0].get_reconstruction()
+    dataset = synthetic_dataset.SyntheticDataSet(reference,
+                                                 scene_synthetic[1],
+                                                 scene_synthetic[2],
+                                                 scene_synthetic[3],
+                                                 scene_synthetic[4],
+                                                 scene_synthetic[5])
+
+    _, reconstructed_scene = reconstruction.\
+        incremental_reconstruction(dataset, scene_synthetic[5])
+    partial = reconstructed_scene[0]
+    removed = sorted(partial.shots)[-3:]
+    for shot_id in removed:
+        del partial.shots[shot_id]
+
+    report, extended_scene = reconstruction.\
+        extend_reconstruction(dataset, scene_synthetic[5], [partial])
+    errors = synthetic_scene.compare(reference, extended_scene[0])
+
+    assert report['num_new_images'] >= len(removed)
+    assert all(shot_id in extended_scene[0].shots for shot_id in removed)
+    assert errors['ratio_cameras'] >= 0.95
+    assert errors['position_average'] < 3
@@ -44,6 +44,37 @@ def test_corresponding_tracks():
     assert correspondences[1] == (2, 4)
 
 
+def test_candidate_ranking():
+    tracks_manager = pysfm.TracksManager()
+    for shot_id, track_ids in [('1', 'abc'), ('2', 'ab'), ('3', 'bcd')]:
+        for track_id in track_ids:
+            tracks_manager.add_observation(
+                shot_id, track_id, pysfm.Observation(0, 0, 1.0, 0, 0, 0, 0))
+    rec = types.Reconstruction()
+    for point_id in 'ab':
+        point = types.Point()
+        point.id = point_id
+        rec.add_point(point)
+    images = ['1', '2', '3']
+
+    ranking = reconstruction.CandidateRanking(tracks_manager, rec, images)
+    assert ranking.candidates() == [('1', 2), ('2', 2), ('3', 1)]
+
+    del rec.points['a']
+    for point_id in 'cd':
+        point = types.Point()
+        point.id = point_id
+        rec.add_point(point)
+    shot = types.Shot()
+    shot.id = '2'
+    rec.add_shot(shot)
+    ranking.update()
+    expected = reconstruction.reconstructed_points_for_images(
+        tracks_manager, rec, images)
+    assert ranking.candidates() == [('3', 3), ('1', 2)]
+    assert sorted(ranking.candidates()) == sorted(expected)
+
+
 def copy_cluster_points(cluster, tracks_manager, points, noise):
     for shot in cluster.shots:
         for point in tracks_manager.get_shot_observations(shot):
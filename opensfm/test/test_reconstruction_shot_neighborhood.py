@@ -1,27 +1,24 @@
-import networkx as nx
-
 from opensfm import types
 from opensfm import reconstruction
+from opensfm import tracking
 
 
 def _add_shot(graph, rec, shot_id):
-    graph.add_node(shot_id, bipartite=0)
     shot = types.Shot()
     shot.id = shot_id
     rec.add_shot(shot)
 
 
 def _add_point(graph, rec, point_id, observations):
-    graph.add_node(point_id, bipartite=1)
     for shot_id in observations:
-        graph.add_edge(shot_id, point_id)
+        graph.add_observation(shot_id, point_id, [0, 0], 1.0, 0)
     point = types.Point()
     point.id = point_id
     rec.add_point(point)
 
 
 def test_shot_neighborhood_linear_graph():
-    graph = nx.Graph()
+    graph = tracking.InliersGraph()
     rec = types.Reconstruction()
     _add_shot(graph, rec, 'im0')
     for i in range(1, 4):
@@ -55,7 +52,7 @@ def test_shot_neighborhood_linear_graph():
 
 
 def test_shot_neighborhood_complete_graph():
-    graph = nx.Graph()
+    graph = tracking.InliersGraph()
     rec = types.Reconstruction()
     for i in range(4):
         _add_shot(graph, rec, 'im' + str(i))
@@ -69,7 +66,7 @@ def test_shot_neighborhood_complete_graph():
 
 
 def test_shot_neighborhood_sorted_results():
-    graph = nx.Graph()
+    graph = tracking.InliersGraph()
     rec = types.Reconstruction()
     _add_shot(graph, rec, 'im0')
     _add_shot(graph, rec, 'im1')
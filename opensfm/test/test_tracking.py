@@ -0,0 +1,203 @@
+import numpy as np
+
+from opensfm import tracking
+from opensfm.unionfind import UnionFind
+
+
+def reference_tracks(matches, min_length):
+    """Tracks computed with a plain union-find, as sets of observations."""
+    uf = UnionFind()
+    for im1, im2 in matches:
+        for f1, f2 in matches[im1, im2]:
+            uf.union((im1, f1), (im2, f2))
+
+    sets = {}
+    for i in uf:
+        sets.setdefault(uf[i], []).append(i)
+
+    tracks = []
+    for track in sets.values():
+        images = [im for im, _ in track]
+        if len(track) >= min_length and len(images) == len(set(images)):
+            tracks.append(set(track))
+    return tracks
+
+
+def random_matches(num_images, num_features, num_matches):
+    np.random.seed(42)
+    matches = {}
+    for i in range(num_images):
+        for j in range(i + 1, num_images):
+            f1 = np.random.randint(num_features, size=num_matches)
+            f2 = np.random.randint(num_features, size=num_matches)
+            matches['%d.jpg' % i, '%d.jpg' % j] = np.column_stack((f1, f2))
+    return matches
+
+
+def test_create_tracks_manager_matches_union_find():
+    num_features = 300
+    matches = random_matches(6, num_features, 40)
+    images = sorted({im for pair in matches for im in pair})
+    features = {im: np.random.rand(num_features, 3) for im in images}
+    colors = {im: np.random.randint(255, size=(num_features, 3))
+              for im in images}
+    config = {'min_track_length': 2}
+
+    manager = tracking.create_tracks_manager(features, colors, matches, config)
+
+    expected = reference_tracks(matches, 2)
+    assert manager.num_tracks() == len(expected)
+    for i, track in enumerate(expected):
+        observations = manager.get_track_observations(str(i))
+        assert {(im, obs.id) for im, obs in observations.items()} == track
+        for im, obs in observations.items():
+            assert np.allclose(obs.point, features[im][obs.id][:2])
+            assert obs.scale == features[im][obs.id][2]
+            assert np.allclose(obs.color, colors[im][obs.id])
+
+
+def test_create_tracks_manager_min_length():
+    matches = {
+        ('1', '2'): np.array([[0, 0], [1, 1]]),
+        ('2', '3'): np.array([[0, 0]]),
+    }
+    features = {im: np.random.rand(2, 3) for im in '123'}
+    colors = {im: np.zeros((2, 3), dtype=int) for im in '123'}
+    config = {'min_track_length': 3}
+
+    manager = tracking.create_tracks_manager(features, colors, matches, config)
+
+    assert manager.num_tracks() == 1
+    assert set(manager.get_track_observations('0')) == {'1', '2', '3'}
+
+
+class MemoryDataSet(object):
+    """Features and matches stored in memory, with the DataSet interface."""
+
+    def __init__(self, features, colors, matches):
+        self.features = features
+        self.colors = colors
+        self.matches = {}
+        for (im1, im2), m in matches.items():
+            self.matches.setdefault(im1, {})[im2] = m
+
+    def load_matches(self, image, images=None):
+        if image not in self.matches:
+            raise IOError('No matches for {}'.format(image))
+        if images is None:
+            return self.matches[image]
+        return {im: m for im, m in self.matches[image].items() if im in images}
+
+    def features_exist(self, image):
+        return image in self.features
+
+    def load_points_colors(self, image):
+        return self.features[image], self.colors[image]
+
+
+def test_create_tracks_manager_streaming():
+    num_features = 300
+    matches = random_matches(6, num_features, 40)
+    images = sorted({im for pair in matches for im in pair})
+    features = {im: np.random.rand(num_features, 4) for im in images}
+    colors = {im: np.random.randint(255, size=(num_features, 3))
+              for im in images}
+    config = {'min_track_length': 2}
+    data = MemoryDataSet(features, colors, matches)
+
+    expected = tracking.create_tracks_manager(
+        {im: f[:, :3] for im, f in features.items()}, colors, matches, config)
+    manager = tracking.create_tracks_manager_streaming(data, images, config)
+
+    assert manager.num_tracks() == expected.num_tracks()
+    for track in expected.get_track_ids():
+        observations = manager.get_track_observations(track)
+        expected_observations = expected.get_track_observations(track)
+        assert set(observations) == set(expected_observations)
+        for im, obs in observations.items():
+            assert obs.id == expected_observations[im].id
+            assert np.allclose(obs.point, expected_observations[im].point)
+
+
+def test_update_tracks_manager():
+    old_matches = {
+        ('1', '2'): np.array([[0, 0], [1, 1]]),
+    }
+    new_matches = {
+        ('3', '1'): np.array([[0, 0], [2, 3], [4, 0]]),
+        ('3', '2'): np.array([[5, 1]]),
+        ('4', '1'): np.array([[0, 0]]),
+        ('4', '2'): np.array([[0, 1]]),
+    }
+    images = ['1', '2', '3', '4']
+    features = {im: np.random.rand(10, 3) for im in images}
+    colors = {im: np.zeros((10, 3), dtype=int) for im in images}
+    config = {'min_track_length': 2}
+    manager = tracking.create_tracks_manager(
+        features, colors, old_matches, config)
+    all_matches = dict(old_matches)
+    all_matches.update(new_matches)
+    data = MemoryDataSet(features, colors, all_matches)
+
+    extended, new = tracking.update_tracks_manager(
+        manager, data, images, ['3', '4'], config)
+
+    assert (extended, new) == (2, 1)
+    tracks = {}
+    for track in manager.get_track_ids():
+        observations = manager.get_track_observations(track)
+        tracks[track] = {(im, obs.id) for im, obs in observations.items()}
+    assert tracks == {
+        '0': {('1', 0), ('2', 0), ('3', 0), ('4', 0)},
+        '1': {('1', 1), ('2', 1), ('3', 5)},
+        '2': {('1', 3), ('3', 2)},
+    }
+
+
+def test_inliers_graph():
+    graph = tracking.InliersGraph()
+    graph.add_observations(['1', '2', '1', '3'], ['a', 'a', 'b', 'b'],
+                           np.random.rand(4, 2), np.ones(4), [0, 1, 2, 3])
+    graph.add_observation('2', 'b', [0.5, 0.5], 2.0, 4)
+
+    assert graph.num_observations() == 5
+    assert set(graph.shot_points('1')) == {'a', 'b'}
+    assert set(graph.point_shots('b')) == {'1', '2', '3'}
+    assert list(graph.num_point_observations(['a', 'b', 'c'])) == [2, 3, 0]
+    assert graph.common_points(['3'], ['a', 'b']) == {'1': 1, '2': 1}
+
+    shots, points, features, scales = graph.observations(['2'], ['b'])
+    assert (shots, points) == (['2'], ['b'])
+    assert np.allclose(features, [[0.5, 0.5]])
+    assert np.allclose(scales, [2.0])
+
+    graph.remove_observations(['1', '4'], ['b', 'a'])
+    assert set(graph.point_shots('b')) == {'2', '3'}
+    graph.remove_points(['a'])
+    assert graph.num_observations() == 2
+    assert graph.shot_points('1') == []
+    assert graph.common_points(['3'], ['a', 'b']) == {'2': 1}
+
+    graph.add_observation('4', 'b', [0.5, 0.5], 1.0, 5)
+    assert set(graph.point_shots('b')) == {'2', '3', '4'}
+    assert graph.common_points(['3']) == {'2': 1, '4': 1}
+
+
+def test_inliers_graph_residuals():
+    graph = tracking.InliersGraph()
+    graph.add_observations(['1', '2', '1'], ['a', 'a', 'b'],
+                           np.random.rand(3, 2), np.ones(3), [0, 1, 2],
+                           [[0.1, 0], [0, 0.1], [0.1, 0.1]])
+    graph.add_observations(['2', '3', '3'], ['b', 'b', 'a'],
+                           np.random.rand(3, 2), np.ones(3), [3, 4, 5])
+    assert graph.residuals().shape == (3, 2)
+
+    shots, points, _, _ = graph.observation_indexes(['3', '2'], ['b'])
+    assert list(zip(shots, points)) == [(1, 0), (0, 0)]
+    graph.set_residuals(['3', '2'], ['b'], [[1.0, 0], [0, 0.5], [9, 9]])
+    assert np.allclose(graph.residuals(['b']), [[0.1, 0.1], [1.0, 0], [0, 0.5]])
+
+    assert graph.remove_residual_outliers(0.3, ['a']) == (0, [])
+    assert graph.remove_residual_outliers(0.3) == (2, ['b'])
+    assert set(graph.point_shots('b')) == {'1'}
+    assert len(graph.residuals()) == 3
@@ -1,10 +1,10 @@
 import numpy as np
-import networkx as nx
 
 from opensfm import io
 from opensfm import pygeometry
 from opensfm import reconstruction
 from opensfm import pysfm
+from opensfm import tracking
 
 
 def test_track_triangulator_equirectangular():
@@ -39,13 +39,57 @@ def test_track_triangulator_equirectangular():
         },
     })
 
-    graph_inliers = nx.Graph()
+    graph_inliers = tracking.InliersGraph()
     triangulator = reconstruction.TrackTriangulator(tracks_manager, graph_inliers, rec)
     triangulator.triangulate('1', 0.01, 2.0)
     assert '1' in rec.points
     p = rec.points['1'].coordinates
     assert np.allclose(p, [0, 0, 1.3763819204711])
-    assert len(graph_inliers.edges()) == 2
+    assert graph_inliers.num_observations() == 2
+
+
+def test_track_triangulator_processes():
+    """Test that chunked triangulation does not depend on processes."""
+    rec = io.reconstruction_from_json({
+        "cameras": {
+            "theta": {
+                "projection_type": "equirectangular",
+                "width": 800,
+                "height": 400,
+            }
+        },
+        "shots": {
+            'im%d' % i: {
+                "camera": "theta",
+                "rotation": [0.0, 0.0, 0.0],
+                "translation": [-i, 0, 0.0],
+            } for i in range(3)
+        },
+        "points": {},
+    })
+    np.random.seed(42)
+    tracks_manager = pysfm.TracksManager()
+    for track in range(20):
+        X = np.random.rand(3) + [0, 0, 3]
+        for shot_id, shot in sorted(rec.shots.items()):
+            x = shot.project(X) + np.random.normal(0, 0.01, 2)
+            tracks_manager.add_observation(shot_id, str(track), pysfm.Observation(
+                x[0], x[1], 1.0, 0, 0, 0, track))
+    tracks = [str(t) for t in range(20)]
+
+    results = []
+    for processes in (1, 3):
+        rec.points = {}
+        graph_inliers = tracking.InliersGraph()
+        triangulator = reconstruction.TrackTriangulator(
+            tracks_manager, graph_inliers, rec)
+        triangulator.triangulate_many(tracks, 0.01, 2.0, robust=True,
+                                      processes=processes)
+        shot_ids, point_ids, _, _ = graph_inliers.observations()
+        results.append(({p.id: p.coordinates for p in rec.points.values()},
+                        sorted(zip(shot_ids, point_ids))))
+    assert 0 < len(results[0][0]) < 20
+    assert results[0] == results[1]
 
 
 def unit_vector(x):
@@ -87,3 +131,26 @@ def test_triangulate_two_bearings_midpoint():
     min_ray_angle = np.radians(2.0)
     X = pygeometry.triangulate_two_bearings_midpoint([o1, o2], [b1, b2])
     assert np.allclose(X, [0, 0, 1.0])
+
+
+def test_triangulate_bearings_midpoint_many():
+    centers = np.array([[0.0, 0, 0], [1, 0, 0], [0, 0, 0],
+                        [1, 0, 0], [0, 1, 0], [0, 0, 0]])
+    bearings = np.array([unit_vector([0.0, 0, 1]), unit_vector([-1.0, 0, 1]),
+                         unit_vector([0.0, 0, 1]), unit_vector([-1.0, 0, 1]),
+                         unit_vector([1.0, 0, 1]), unit_vector([0.0, 0, 1])])
+    offsets = np.array([0, 2, 5, 6], dtype=np.int32)
+    max_reprojection = 0.01
+    min_ray_angle = np.radians(2.0)
+
+    points, triangulated, inliers = pygeometry.triangulate_bearings_midpoint_many(
+        centers, bearings, offsets, max_reprojection, min_ray_angle, False, 0, 1)
+    assert list(triangulated) == [True, False, False]
+    assert np.allclose(points[0], [0, 0, 1.0])
+    assert list(inliers) == [True, True, False, False, False, False]
+
+    points, triangulated, inliers = pygeometry.triangulate_bearings_midpoint_many(
+        centers, bearings, offsets, max_reprojection, min_ray_angle, True, 0, 2)
+    assert list(triangulated) == [True, True, False]
+    assert np.allclose(points[1], [0, 0, 1.0])
+    assert list(inliers) == [True, True, True, True, False, False]
@@ -49,4 +49,18 @@ def test_unnormalized_vlad():
     res = vlad.unnormalized_vlad(features, centers)
 
     assert res[0] == res[1] == res[2] == 0
-    assert pytest.approx(res[3], 1e-6) == 0.1
\ No newline at end of file
+    assert pytest.approx(res[3], 1e-6) == 0.1
+
+
+def test_unnormalized_vlad_many_features():
+    np.random.seed(42)
+    features = np.random.rand(200, 8)
+    centers = np.random.rand(5, 8)
+
+    res = vlad.unnormalized_vlad(features, centers)
+
+    expected = np.zeros(centers.shape)
+    for f in features:
+        i = np.argmin(np.linalg.norm(f - centers, axis=1))
+        expected[i] += f - centers[i]
+    assert np.allclose(res, expected.flatten(), atol=1e-5)
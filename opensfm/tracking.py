@@ -3,12 +3,13 @@ import sys
 
 import numpy as np
 import networkx as nx
+import scipy.sparse
+import scipy.sparse.csgraph
 
 from collections import defaultdict
 from itertools import combinations
 from six import iteritems
 
-from opensfm.unionfind import UnionFind
 from opensfm import pysfm
 
 
@@ -20,7 +21,7 @@ def load_features(dataset, images):
     features = {}
     colors = {}
     for im in images:
-        p, f, c = dataset.load_features(im)
+        p, c = dataset.load_points_colors(im)
         features[im] = p[:, :3]
         colors[im] = c
     return features, colors
@@ -42,35 +43,543 @@ def load_matches(dataset, images):
 def create_tracks_manager(features, colors, matches, config):
     """Link matches into tracks."""
     logger.debug('Merging features onto tracks')
-    uf = UnionFind()
-    for im1, im2 in matches:
-        for f1, f2 in matches[im1, im2]:
-            uf.union((im1, f1), (im2, f2))
-
-    sets = {}
-    for i in uf:
-        p = uf[i]
-        if p in sets:
-            sets[p].append(i)
-        else:
-            sets[p] = [i]
+    images, node_image, node_feature, node_track = _link_matches(
+        matches, config['min_track_length'])
+
+    def points_colors(image):
+        if image not in features:
+            return None
+        return features[image], colors[image]
+
+    return _tracks_manager_from_nodes(images, node_image, node_feature,
+                                      node_track, points_colors)
+
+
+def create_tracks_manager_streaming(dataset, images, config):
+    """Link matches into tracks, reading the dataset one image at a time.
+
+    Match files are read one by one and linked incrementally, and the
+    features of an image are only read when adding its observations to
+    the tracks manager. Peak memory is driven by the number of matched
+    features instead of the size of all matches and features.
+    """
+    logger.debug('Merging features onto tracks')
+    images_set = set(images)
+    linker = FeatureLinker()
+    for im1 in images:
+        try:
+            im1_matches = dataset.load_matches(im1)
+        except IOError:
+            continue
+        linker.add_matches(im1, [(im2, m) for im2, m in iteritems(im1_matches)
+                                 if im2 in images_set])
+    linked_images, node_image, node_feature, node_track = linker.tracks(
+        config['min_track_length'])
+
+    def points_colors(image):
+        if not dataset.features_exist(image):
+            return None
+        p, c = dataset.load_points_colors(image)
+        return p[:, :3], c
+
+    return _tracks_manager_from_nodes(linked_images, node_image, node_feature,
+                                      node_track, points_colors)
+
 
-    min_length = config['min_track_length']
-    tracks = [t for t in sets.values() if _good_track(t, min_length)]
-    logger.debug('Good tracks: {}'.format(len(tracks)))
+def _tracks_manager_from_nodes(images, node_image, node_feature, node_track,
+                               points_colors):
+    """Bulk-load the observations of good tracks in a tracks manager.
+
+    Args:
+        images: list of images indexed by node_image
+        node_image, node_feature, node_track: image index, feature id
+            and track id (-1 for bad tracks) of each linked feature
+        points_colors: function returning the points and colors of an
+            image, or None for images without features
+    """
+    num_tracks = node_track.max() + 1 if len(node_track) else 0
+    logger.debug('Good tracks: {}'.format(num_tracks))
 
     tracks_manager = pysfm.TracksManager()
-    for track_id, track in enumerate(tracks):
-        for image, featureid in track:
-            if image not in features:
-                continue
-            x, y, s = features[image][featureid]
-            r, g, b = colors[image][featureid]
-            obs = pysfm.Observation(x, y, s, int(r), int(g), int(b), featureid)
-            tracks_manager.add_observation(image, str(track_id), obs)
+    _add_observations(tracks_manager, images,
+                      [str(t) for t in range(num_tracks)],
+                      node_image, node_feature, node_track, points_colors)
     return tracks_manager
 
 
+def _add_observations(tracks_manager, images, track_ids, node_image,
+                      node_feature, node_track, points_colors):
+    """Bulk-add the observations of linked features to a tracks manager.
+
+    Args:
+        images: list of images indexed by node_image
+        track_ids: list of track ids indexed by node_track
+        node_image, node_feature, node_track: image index, feature id
+            and track index (-1 to skip) of each linked feature
+        points_colors: function returning the points and colors of an
+            image, or None for images without features
+    """
+    keep = node_track >= 0
+    node_image = node_image[keep]
+    node_feature = node_feature[keep]
+    node_track = node_track[keep]
+
+    has_features = np.ones(len(node_image), dtype=bool)
+    points = np.zeros((len(node_image), 3))
+    rgb = np.zeros((len(node_image), 3), dtype=int)
+    order = np.argsort(node_image, kind='stable')
+    bounds = np.searchsorted(node_image[order], np.arange(len(images) + 1))
+    for i, image in enumerate(images):
+        at_image = order[bounds[i]:bounds[i + 1]]
+        if len(at_image) == 0:
+            continue
+        image_points_colors = points_colors(image)
+        if image_points_colors is None:
+            has_features[at_image] = False
+            continue
+        image_points, image_colors = image_points_colors
+        featureids = node_feature[at_image]
+        points[at_image] = image_points[featureids]
+        rgb[at_image] = image_colors[featureids]
+
+    tracks_manager.add_observations(
+        images, track_ids,
+        node_image[has_features], node_track[has_features],
+        points[has_features], rgb[has_features], node_feature[has_features])
+
+
+def update_tracks_manager(tracks_manager, dataset, images, new_images, config):
+    """Add the observations of new images to an existing tracks manager.
+
+    Matches involving new images link their features to each other and
+    to features of the other images. Features linked to an existing track
+    extend it, and other linked features make new tracks.
+
+    Matches of pairs with a new image must be stored with one of the new
+    images, as done by matching.match_images_incremental, since only the
+    matches files of the new images are read. Only the shots and tracks
+    reached by these matches are read, and new track ids follow the
+    number of tracks, so that the cost depends on the new images and not
+    on the number of tracks.
+
+    Existing tracks are never merged nor broken. Linked sets that would
+    join two existing tracks, or two features of the same image, are
+    split by adding their links one at a time, skipping the links that
+    would break these rules.
+
+    Returns:
+        tuple: the number of extended tracks and of new tracks
+    """
+    logger.debug('Merging features of new images onto tracks')
+    ends1, ends2 = _new_matches_ends(dataset, images, new_images)
+    if len(ends1) == 0:
+        return 0, 0
+    keys, inverse = np.unique(np.concatenate((ends1, ends2)),
+                              return_inverse=True)
+    node_image = (keys >> 32).astype(np.int32)
+    node_feature = (keys & 0xffffffff).astype(np.int32)
+
+    # Features already in a track are replaced by the track
+    tracks, track_index, track_images = [], {}, []
+    node_track = np.full(len(keys), -1)
+    bounds = np.searchsorted(node_image, np.arange(len(images) + 1))
+    shots = set(tracks_manager.get_shot_ids())
+    for i, image in enumerate(images):
+        if bounds[i] == bounds[i + 1] or image not in shots:
+            continue
+        feature_tracks = {obs.id: track for track, obs in
+                          iteritems(tracks_manager.get_shot_observations(image))}
+        for n in range(bounds[i], bounds[i + 1]):
+            track = feature_tracks.get(node_feature[n])
+            if track is None:
+                continue
+            if track not in track_index:
+                track_index[track] = len(tracks)
+                tracks.append(track)
+                track_images.append(
+                    list(tracks_manager.get_track_observations(track)))
+            node_track[n] = track_index[track]
+
+    # Vertices are the existing tracks followed by the untracked features
+    num_tracks = len(tracks)
+    vertex = np.where(node_track >= 0, node_track,
+                      num_tracks + np.arange(len(keys)))
+    edges = vertex[inverse].reshape(2, -1)
+    labels = _split_inconsistent_sets(
+        edges, num_tracks, len(keys), track_images, images, node_image)
+
+    # Sets of untracked features with an existing track extend it,
+    # others of min_track_length features become new tracks.
+    untracked = np.flatnonzero(node_track < 0)
+    untracked_set = labels[num_tracks + untracked]
+    set_track = np.full(labels.max() + 1 if len(labels) else 0, -1)
+    set_track[labels[:num_tracks]] = np.arange(num_tracks)
+    extend = set_track[untracked_set] >= 0
+    sizes = np.bincount(untracked_set[~extend], minlength=len(set_track))
+    new_sets = np.flatnonzero(sizes >= config['min_track_length'])
+    set_track[new_sets] = num_tracks + np.arange(len(new_sets))
+
+    track_ids = tracks + [str(t) for t in _next_track_ids(
+        tracks_manager, len(new_sets))]
+    linked_track = np.full(len(keys), -1)
+    linked_track[untracked] = set_track[untracked_set]
+
+    def points_colors(image):
+        if not dataset.features_exist(image):
+            return None
+        p, c = dataset.load_points_colors(image)
+        return p[:, :3], c
+
+    _add_observations(tracks_manager, images, track_ids, node_image,
+                      node_feature, linked_track, points_colors)
+    num_extended = len(np.unique(set_track[untracked_set[extend]]))
+    logger.debug('Extended tracks: {}, new tracks: {}'.format(
+        num_extended, len(new_sets)))
+    return num_extended, len(new_sets)
+
+
+def _new_matches_ends(dataset, images, new_images):
+    """Features matched with features of new images.
+
+    Only the matches files of the new images are read.
+
+    Returns:
+        tuple: the two ends of each match, as image index << 32 | feature id
+    """
+    image_index = {im: i for i, im in enumerate(images)}
+    ends1, ends2 = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)]
+    for im1 in new_images:
+        try:
+            im1_matches = dataset.load_matches(im1)
+        except IOError:
+            continue
+        for im2, m in iteritems(im1_matches):
+            if im2 not in image_index or len(m) == 0:
+                continue
+            m = np.asarray(m, dtype=np.int64)
+            ends1.append((np.int64(image_index[im1]) << 32) + m[:, 0])
+            ends2.append((np.int64(image_index[im2]) << 32) + m[:, 1])
+    return np.concatenate(ends1), np.concatenate(ends2)
+
+
+def _split_inconsistent_sets(edges, num_tracks, num_features, track_images,
+                             images, node_image):
+    """Label the sets of vertices linked by edges.
+
+    Vertices are num_tracks existing tracks followed by num_features
+    features. Sets with two tracks or two observations of the same image
+    are split by adding their edges one at a time.
+    """
+    num_vertices = num_tracks + num_features
+    graph = scipy.sparse.coo_matrix(
+        (np.ones(edges.shape[1], dtype=np.int8), (edges[0], edges[1])),
+        shape=(num_vertices, num_vertices))
+    _, labels = scipy.sparse.csgraph.connected_components(
+        graph, directed=False)
+
+    # Images of each vertex, as (vertex, image index) rows
+    image_index = {im: i for i, im in enumerate(images)}
+    for track in track_images:
+        for im in track:
+            image_index.setdefault(im, len(image_index))
+    rows_vertex = np.concatenate(
+        [np.full(len(t), v) for v, t in enumerate(track_images)] +
+        [num_tracks + np.arange(num_features)]).astype(np.int64)
+    rows_image = np.concatenate(
+        [[image_index[im] for im in t] for t in track_images] +
+        [node_image]).astype(np.int64)
+
+    rows_set, counts = np.unique(
+        labels[rows_vertex] * len(image_index) + rows_image,
+        return_counts=True)
+    bad = np.zeros(labels.max() + 1, dtype=bool)
+    bad[rows_set[counts > 1] // len(image_index)] = True
+    bad[np.bincount(labels[:num_tracks], minlength=len(bad)) > 1] = True
+    if not bad.any():
+        return labels
+
+    vertex_images = defaultdict(set)
+    for v, im in zip(rows_vertex, rows_image):
+        if bad[labels[v]]:
+            vertex_images[v].add(im)
+    parent = {v: v for v in vertex_images}
+
+    def find(v):
+        while parent[v] != v:
+            parent[v] = parent[parent[v]]
+            v = parent[v]
+        return v
+
+    for v1, v2 in edges[:, bad[labels[edges[0]]]].T:
+        r1, r2 = find(v1), find(v2)
+        if r1 == r2 or (r1 < num_tracks and r2 < num_tracks):
+            continue
+        if vertex_images[r1] & vertex_images[r2]:
+            continue
+        # Tracks have the smallest ids, so that they stay roots
+        root, child = min(r1, r2), max(r1, r2)
+        parent[child] = root
+        vertex_images[root] |= vertex_images.pop(child)
+
+    for v in parent:
+        labels[v] = len(bad) + find(v)
+    _, labels = np.unique(labels, return_inverse=True)
+    return labels
+
+
+def _next_track_ids(tracks_manager, count):
+    """Integer ids following the largest integer track id.
+
+    Tracks are numbered from 0 when created and new tracks get the
+    following ids, so the next id is the number of tracks. Track ids
+    are only scanned for tracks managers numbered otherwise.
+    """
+    first = tracks_manager.num_tracks()
+    if first > 0 and (not tracks_manager.has_track(str(first - 1)) or
+                      tracks_manager.has_track(str(first))):
+        ids = [int(t) for t in tracks_manager.get_track_ids() if t.isdigit()]
+        first = max(ids) + 1 if ids else 0
+    return range(first, first + count)
+
+
+def _number_tracks(labels, first_appearance, node_image, num_images,
+                   min_length):
+    """Number good tracks by order of first appearance.
+
+    Good tracks have at least min_length features, all from different
+    images.
+
+    Args:
+        labels: label of each feature, from 0 to the number of labels
+        first_appearance: position of the first appearance of each label
+        node_image: image index of each feature
+        num_images: number of images
+        min_length: minimum number of features per track
+
+    Returns:
+        array: the track id of each feature, -1 for bad tracks
+    """
+    num_labels = len(first_appearance)
+    sizes = np.bincount(labels, minlength=num_labels)
+    image_per_label = np.unique(labels * np.int64(num_images) + node_image)
+    distinct_images = np.bincount(image_per_label // num_images,
+                                  minlength=num_labels)
+    good = (sizes >= min_length) & (distinct_images == sizes)
+
+    ordered = np.argsort(first_appearance)
+    good_ordered = ordered[good[ordered]]
+    label_track = np.full(num_labels, -1)
+    label_track[good_ordered] = np.arange(len(good_ordered))
+    return label_track[labels]
+
+
+def _link_matches(matches, min_length):
+    """Compute tracks as connected components of the matches graph.
+
+    Features are encoded as integers using per-image offsets, and
+    tracks are numbered by order of first appearance in the matches.
+
+    Returns:
+        tuple: the list of images, and for each matched feature its
+        image index, its feature id and its track id (-1 for bad tracks)
+    """
+    image_index = {}
+    for im1, im2 in matches:
+        image_index.setdefault(im1, len(image_index))
+        image_index.setdefault(im2, len(image_index))
+    images = list(image_index)
+
+    num_features = np.zeros(len(images), dtype=np.int64)
+    pairs = []
+    for (im1, im2), pair_matches in iteritems(matches):
+        if len(pair_matches) == 0:
+            continue
+        pair_matches = np.asarray(pair_matches, dtype=np.int64)
+        i1, i2 = image_index[im1], image_index[im2]
+        num_features[i1] = max(num_features[i1], pair_matches[:, 0].max() + 1)
+        num_features[i2] = max(num_features[i2], pair_matches[:, 1].max() + 1)
+        pairs.append((i1, i2, pair_matches))
+
+    empty = np.array([], dtype=int)
+    if not pairs:
+        return images, empty, empty, empty
+
+    offsets = np.concatenate([[0], np.cumsum(num_features)])
+    edges = np.concatenate([
+        np.column_stack((offsets[i1] + m[:, 0], offsets[i2] + m[:, 1]))
+        for i1, i2, m in pairs])
+
+    nodes, first, inverse = np.unique(
+        edges.ravel(), return_index=True, return_inverse=True)
+    edges = inverse.reshape(-1, 2)
+    graph = scipy.sparse.coo_matrix(
+        (np.ones(len(edges), dtype=np.int8), (edges[:, 0], edges[:, 1])),
+        shape=(len(nodes), len(nodes)))
+    num_components, labels = scipy.sparse.csgraph.connected_components(
+        graph, directed=False)
+
+    node_image = np.searchsorted(offsets, nodes, side='right') - 1
+    node_feature = nodes - offsets[node_image]
+
+    first_appearance = np.full(num_components, np.iinfo(first.dtype).max)
+    np.minimum.at(first_appearance, labels, first)
+    node_track = _number_tracks(labels, first_appearance, node_image,
+                                len(images), min_length)
+    return images, node_image, node_feature, node_track
+
+
+class FeatureLinker(object):
+    """Incremental union-find over the features of matched images.
+
+    Features get dense ids by order of first appearance in the matches,
+    and each set is rooted at its smallest id, so that sets are numbered
+    by order of first appearance, as in create_tracks_manager.
+    """
+
+    def __init__(self):
+        self.images = []
+        self.image_index = {}
+        self.known_features = {}
+        self.size = 0
+        self.parent = np.zeros(0, dtype=np.int64)
+        self.node_image = np.zeros(0, dtype=np.int32)
+        self.node_feature = np.zeros(0, dtype=np.int32)
+
+    def add_matches(self, im1, matches):
+        """Link the features matched between im1 and other images.
+
+        Args:
+            im1: name of the first image
+            matches: list of (im2, array of (feature1, feature2) ids)
+        """
+        pairs = [(im2, np.asarray(m, dtype=np.int64))
+                 for im2, m in matches if len(m)]
+        if not pairs:
+            return
+
+        # Position of the features in the sequence f1, f2, f1, f2, ...
+        starts = np.cumsum([0] + [2 * len(m) for _, m in pairs])
+        groups = [(self._image_index(im1),
+                   np.concatenate([m[:, 0] for _, m in pairs]),
+                   np.concatenate([s + 2 * np.arange(len(m))
+                                   for s, (_, m) in zip(starts, pairs)]))]
+        for s, (im2, m) in zip(starts, pairs):
+            groups.append((self._image_index(im2), m[:, 1],
+                           s + 1 + 2 * np.arange(len(m))))
+
+        ids = self._dense_ids(groups)
+        self._union(ids[0], np.concatenate(ids[1:]))
+
+    def tracks(self, min_length):
+        """Return the linked features and their track ids.
+
+        Returns:
+            tuple: the list of images, and for each linked feature its
+            image index, its feature id and its track id (-1 for bad tracks)
+        """
+        roots = self._find(np.arange(self.size))
+        components, labels = np.unique(roots, return_inverse=True)
+        node_image = self.node_image[:self.size]
+        node_track = _number_tracks(labels, components, node_image,
+                                    len(self.images), min_length)
+        return (self.images, node_image, self.node_feature[:self.size],
+                node_track)
+
+    def _image_index(self, image):
+        if image not in self.image_index:
+            self.image_index[image] = len(self.images)
+            self.images.append(image)
+        return self.image_index[image]
+
+    def _known_features(self, image_index):
+        """Sorted feature ids of an image already linked, and their dense ids."""
+        empty = np.zeros(0, dtype=np.int64)
+        return self.known_features.get(image_index, (empty, empty))
+
+    def _dense_ids(self, groups):
+        """Dense ids of the features of (image index, features, positions).
+
+        Features seen for the first time get new ids by order of position.
+        """
+        ids, new_nodes = [], []
+        for i, features, positions in groups:
+            known, known_ids = self._known_features(i)
+            group_ids = np.full(len(features), -1, dtype=np.int64)
+            if len(known):
+                at = np.minimum(np.searchsorted(known, features),
+                                len(known) - 1)
+                found = known[at] == features
+                group_ids[found] = known_ids[at[found]]
+            missing = group_ids < 0
+            new, first = np.unique(features[missing], return_index=True)
+            ids.append(group_ids)
+            new_nodes.append((i, new, positions[missing][first]))
+
+        positions = np.concatenate([p for _, _, p in new_nodes])
+        new_ids = np.empty(len(positions), dtype=np.int64)
+        new_ids[np.argsort(positions)] = self.size + np.arange(len(positions))
+        self._reserve(len(positions))
+
+        start = 0
+        for (i, new, _), (_, features, _), group_ids in zip(
+                new_nodes, groups, ids):
+            group_new_ids = new_ids[start:start + len(new)]
+            start += len(new)
+            self.parent[group_new_ids] = group_new_ids
+            self.node_image[group_new_ids] = i
+            self.node_feature[group_new_ids] = new
+
+            missing = group_ids < 0
+            group_ids[missing] = group_new_ids[
+                np.searchsorted(new, features[missing])]
+
+            known, known_ids = self._known_features(i)
+            at = np.searchsorted(known, new)
+            self.known_features[i] = (np.insert(known, at, new),
+                                      np.insert(known_ids, at, group_new_ids))
+        self.size += len(positions)
+        return ids
+
+    def _reserve(self, count):
+        capacity = len(self.parent)
+        if self.size + count <= capacity:
+            return
+        capacity = max(2 * capacity, self.size + count)
+        self.parent = np.resize(self.parent, capacity)
+        self.node_image = np.resize(self.node_image, capacity)
+        self.node_feature = np.resize(self.node_feature, capacity)
+
+    def _find(self, nodes):
+        roots = self.parent[nodes]
+        while True:
+            up = self.parent[roots]
+            if np.array_equal(up, roots):
+                break
+            roots = up
+        self.parent[nodes] = roots
+        return roots
+
+    def _union(self, nodes1, nodes2):
+        """Merge the sets of pairs of nodes, rooted at their smallest id."""
+        roots1, roots2 = self._find(nodes1), self._find(nodes2)
+        different = roots1 != roots2
+        if not different.any():
+            return
+        roots, inverse = np.unique(
+            np.concatenate((roots1[different], roots2[different])),
+            return_inverse=True)
+        edges = inverse.reshape(2, -1)
+        graph = scipy.sparse.coo_matrix(
+            (np.ones(edges.shape[1], dtype=np.int8), (edges[0], edges[1])),
+            shape=(len(roots), len(roots)))
+        _, labels = scipy.sparse.csgraph.connected_components(
+            graph, directed=False)
+
+        # Roots are sorted, so the first root of each label is the smallest
+        _, first = np.unique(labels, return_index=True)
+        self.parent[roots] = roots[first][labels]
+
+
 def common_tracks(tracks_manager, im1, im2):
     """List of tracks observed in both images.
 
@@ -123,15 +632,6 @@ def all_common_tracks(tracks_manager, include_features=True, min_common=50):
     return common_tracks
 
 
-def _good_track(track, min_length):
-    if len(track) < min_length:
-        return False
-    images = [f[0] for f in track]
-    if len(images) != len(set(images)):
-        return False
-    return True
-
-
 def as_weighted_graph(tracks_manager):
     """ Return the tracks manager as a weighted graph
         having shots a snodes and weighted by the # of
@@ -161,3 +661,343 @@ def as_graph(tracks_manager):
             graph.add_edge(im, track_id, feature=obs.point, feature_scale=obs.scale,
                            feature_id=obs.id, feature_color=obs.color)
     return graph
+
+
+def as_inliers_graph(tracks_manager):
+    """ Return all the observations of the tracks manager as an InliersGraph. """
+    graph = InliersGraph()
+    for track_id in tracks_manager.get_track_ids():
+        observations = tracks_manager.get_track_observations(track_id)
+        graph.add_observations(
+            list(observations), len(observations) * [track_id],
+            [obs.point for obs in observations.values()],
+            [obs.scale for obs in observations.values()],
+            [obs.id for obs in observations.values()])
+    return graph
+
+
+class InliersGraph(object):
+    """Bipartite graph of the inlier observations of reconstructed points.
+
+    Shots and points get dense integer indexes, and each observation is
+    an entry of flat arrays holding its shot and point indexes, feature
+    coordinates, scale, feature id and the reprojection residual of the
+    last bundle adjustment it was part of, NaN if unknown. Residuals have
+    2 coordinates, or 3 for spherical cameras. Removed observations are flagged
+    and dropped once they are the majority.
+
+    Observations are found through offset tables sorting them by shot and
+    by point, rebuilt lazily after additions or compaction, so that a query
+    costs the number of observations of the given shots or points, like
+    the degree of a networkx node, while an observation costs tens of bytes
+    instead of the dicts of a networkx edge.
+
+    An observation must not be added twice.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        """Remove all shots, points and observations."""
+        self.shot_ids = []
+        self.shot_index = {}
+        self.point_ids = []
+        self.point_index = {}
+        self.size = 0
+        self.num_removed = 0
+        self.shot = np.zeros(0, dtype=np.int32)
+        self.point = np.zeros(0, dtype=np.int32)
+        self.feature = np.zeros((0, 2))
+        self.scale = np.zeros(0)
+        self.feature_id = np.zeros(0, dtype=np.int32)
+        self.residual = np.zeros((0, 3))
+        self.removed = np.zeros(0, dtype=bool)
+        self._invalidate_tables()
+
+    def num_observations(self):
+        return self.size - self.num_removed
+
+    def add_observation(self, shot_id, point_id, feature, scale, feature_id):
+        self.add_observations([shot_id], [point_id], [feature], [scale],
+                              [feature_id])
+
+    def add_observations(self, shot_ids, point_ids, features, scales,
+                         feature_ids, residuals=None):
+        """Add observations given as sequences of the same length."""
+        count = len(shot_ids)
+        if count == 0:
+            return
+        self._reserve(count)
+        new = slice(self.size, self.size + count)
+        self.shot[new] = self._add_ids(shot_ids, self.shot_ids,
+                                       self.shot_index)
+        self.point[new] = self._add_ids(point_ids, self.point_ids,
+                                        self.point_index)
+        self.feature[new] = np.reshape(features, (count, 2))
+        self.scale[new] = scales
+        self.feature_id[new] = feature_ids
+        self.residual[new] = np.nan
+        if residuals is not None:
+            residuals = np.reshape(residuals, (count, -1))
+            self.residual[new, :residuals.shape[1]] = residuals
+        self.removed[new] = False
+        self.size += count
+        self._invalidate_tables()
+
+    def remove_observations(self, shot_ids, point_ids):
+        """Remove the observations of pairs of shots and points."""
+        shots = self._indexes(shot_ids, self.shot_index)
+        points = self._indexes(point_ids, self.point_index)
+        known = (shots >= 0) & (points >= 0)
+        shots, points = shots[known], points[known]
+        positions, pairs = self._point_observations(points)
+        self._remove(positions[self.shot[positions] == shots[pairs]])
+
+    def remove_points(self, point_ids):
+        """Remove points and all their observations."""
+        positions, _ = self._point_observations(
+            self._known_indexes(point_ids, self.point_index))
+        self._remove(positions)
+
+    def shot_points(self, shot_id):
+        """Ids of the points observed by a shot."""
+        positions, _ = self._shot_observations(
+            self._known_indexes([shot_id], self.shot_index))
+        return self._ids(self.point[positions], self.point_ids)
+
+    def point_shots(self, point_id):
+        """Ids of the shots observing a point."""
+        positions, _ = self._point_observations(
+            self._known_indexes([point_id], self.point_index))
+        return self._ids(self.shot[positions], self.shot_ids)
+
+    def num_point_observations(self, point_ids):
+        """Number of observations of each point, as an array."""
+        indexes = self._indexes(point_ids, self.point_index)
+        known = indexes >= 0
+        _, owners = self._point_observations(indexes[known])
+        counts = np.zeros(len(indexes), dtype=int)
+        counts[known] = np.bincount(owners, minlength=int(known.sum()))
+        return counts
+
+    def observations(self, shot_ids=None, point_ids=None):
+        """Observations of the given shots and points, all by default.
+
+        Returns:
+            tuple: the shot ids and point ids of the observations, and
+            arrays with their feature coordinates and scales
+        """
+        positions = self._select(shot_ids, point_ids)
+        shots = self._ids(self.shot[positions], self.shot_ids)
+        points = self._ids(self.point[positions], self.point_ids)
+        return (shots, points, self.feature[positions],
+                self.scale[positions])
+
+    def observation_indexes(self, shot_ids, point_ids):
+        """Observations of the given shots and points, by position.
+
+        Returns:
+            tuple: arrays with the positions in shot_ids and point_ids
+            of the shot and point of the observations, their feature
+            coordinates and scales
+        """
+        positions = self._select(shot_ids, point_ids)
+        shots = self._positions(shot_ids, self.shot_index)
+        points = self._positions(point_ids, self.point_index)
+        return (shots[self.shot[positions]], points[self.point[positions]],
+                self.feature[positions], self.scale[positions])
+
+    def set_residuals(self, shot_ids, point_ids, residuals):
+        """Set the residuals of observations, in observation_indexes order.
+
+        Only the first residuals are used, since bundle adjustment problems
+        can have other observations added after the ones of the graph.
+        """
+        positions = self._select(shot_ids, point_ids)
+        residuals = np.reshape(residuals, (len(residuals), -1))
+        residuals = residuals[:len(positions)]
+        self.residual[positions] = np.nan
+        self.residual[positions, :residuals.shape[1]] = residuals
+
+    def residuals(self, point_ids=None):
+        """Known residuals of observations of the given points, all by default.
+
+        Returns:
+            array: the residuals, with 3 columns if any is spherical
+        """
+        residuals = self.residual[self._residual_positions(point_ids)]
+        if np.isnan(residuals[:, 2]).all():
+            residuals = residuals[:, :2]
+        return np.nan_to_num(residuals)
+
+    def remove_residual_outliers(self, threshold, point_ids=None):
+        """Remove observations of the given points with large residuals.
+
+        Only the first 2 coordinates of the residuals are compared to the
+        threshold. Points are not removed, even without observations left.
+
+        Returns:
+            tuple: the number of removed observations and the ids of their
+            points
+        """
+        positions = self._residual_positions(point_ids)
+        residual = self.residual[positions]
+        positions = positions[residual[:, 0]**2 + residual[:, 1]**2
+                              > threshold**2]
+        points = np.unique(self.point[positions])
+        self._remove(positions)
+        return len(positions), self._ids(points, self.point_ids)
+
+    def common_points(self, shot_ids, point_ids=None):
+        """Number of points that other shots share with a set of shots.
+
+        Only the given points are counted, all by default.
+
+        Returns:
+            dict: the number of common points of each other shot
+        """
+        shots = self._known_indexes(shot_ids, self.shot_index)
+        positions, _ = self._shot_observations(shots)
+        points = np.unique(self.point[positions])
+        if point_ids is not None:
+            points = points[self._table(point_ids, self.point_index)[points]]
+
+        positions, _ = self._point_observations(points)
+        others = self.shot[positions]
+        others = others[~np.isin(others, shots)]
+        counts = np.bincount(others, minlength=len(self.shot_ids))
+        return {self.shot_ids[i]: int(counts[i])
+                for i in np.flatnonzero(counts)}
+
+    def _add_ids(self, ids, all_ids, index):
+        for key in ids:
+            if key not in index:
+                index[key] = len(all_ids)
+                all_ids.append(key)
+        return [index[key] for key in ids]
+
+    def _ids(self, indexes, all_ids):
+        return [all_ids[i] for i in indexes.tolist()]
+
+    def _indexes(self, ids, index):
+        """Indexes of the given ids, -1 for unknown ids."""
+        return np.array([index.get(key, -1) for key in ids], dtype=np.int64)
+
+    def _known_indexes(self, ids, index):
+        indexes = self._indexes(ids, index)
+        return indexes[indexes >= 0]
+
+    def _positions(self, ids, index):
+        """Position of each index in the given ids, -1 if absent."""
+        positions = np.full(len(index), -1, dtype=np.int32)
+        indexes = self._indexes(ids, index)
+        known = indexes >= 0
+        positions[indexes[known]] = np.flatnonzero(known)
+        return positions
+
+    def _table(self, ids, index):
+        """Boolean table of the given ids, indexed like the index."""
+        table = np.zeros(len(index), dtype=bool)
+        table[self._known_indexes(ids, index)] = True
+        return table
+
+    def _select(self, shot_ids, point_ids):
+        """Sorted positions of the observations of the given shots and points.
+
+        All shots or all points are selected when None.
+        """
+        if shot_ids is not None:
+            positions, _ = self._shot_observations(
+                self._known_indexes(shot_ids, self.shot_index))
+            if point_ids is not None:
+                table = self._table(point_ids, self.point_index)
+                positions = positions[table[self.point[positions]]]
+        elif point_ids is not None:
+            positions, _ = self._point_observations(
+                self._known_indexes(point_ids, self.point_index))
+        else:
+            return np.flatnonzero(~self.removed[:self.size])
+        return np.unique(positions)
+
+    def _residual_positions(self, point_ids):
+        positions = self._select(None, point_ids)
+        return positions[~np.isnan(self.residual[positions, 0])]
+
+    def _shot_observations(self, shots):
+        self._build_tables()
+        return self._slice(shots, self._shot_order, self._shot_offsets)
+
+    def _point_observations(self, points):
+        self._build_tables()
+        return self._slice(points, self._point_order, self._point_offsets)
+
+    def _slice(self, indexes, order, offsets):
+        """Positions of the observations of the given indexes in a table.
+
+        Also returns, for each observation, the position of its index in
+        the given indexes. Removed observations are skipped.
+        """
+        starts = offsets[indexes]
+        lengths = offsets[indexes + 1] - starts
+        ends = np.cumsum(lengths)
+        steps = np.arange(ends[-1] if len(ends) else 0) - np.repeat(
+            ends - lengths, lengths)
+        positions = order[np.repeat(starts, lengths) + steps]
+        owners = np.repeat(np.arange(len(indexes)), lengths)
+        kept = ~self.removed[positions]
+        return positions[kept], owners[kept]
+
+    def _build_tables(self):
+        """Sort observations by shot and by point, if not done yet."""
+        if self._shot_order is not None:
+            return
+        self._shot_order, self._shot_offsets = self._offset_table(
+            self.shot[:self.size], len(self.shot_ids))
+        self._point_order, self._point_offsets = self._offset_table(
+            self.point[:self.size], len(self.point_ids))
+
+    def _offset_table(self, keys, num_keys):
+        """Observations sorted by key, and the offset of each key."""
+        order = np.argsort(keys, kind='stable')
+        offsets = np.zeros(num_keys + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys, minlength=num_keys), out=offsets[1:])
+        return order, offsets
+
+    def _invalidate_tables(self):
+        self._shot_order = self._shot_offsets = None
+        self._point_order = self._point_offsets = None
+
+    def _remove(self, positions):
+        positions = np.unique(positions)
+        positions = positions[~self.removed[positions]]
+        self.removed[positions] = True
+        self.num_removed += len(positions)
+        if self.num_removed > self.size // 2:
+            self._compact()
+
+    def _compact(self):
+        keep = ~self.removed[:self.size]
+        self.size = int(keep.sum())
+        self.num_removed = 0
+        self.shot = self.shot[:len(keep)][keep]
+        self.point = self.point[:len(keep)][keep]
+        self.feature = self.feature[:len(keep)][keep]
+        self.scale = self.scale[:len(keep)][keep]
+        self.feature_id = self.feature_id[:len(keep)][keep]
+        self.residual = self.residual[:len(keep)][keep]
+        self.removed = self.removed[:len(keep)][keep]
+        self._invalidate_tables()
+
+    def _reserve(self, count):
+        capacity = len(self.shot)
+        if self.size + count <= capacity:
+            return
+        capacity = max(2 * capacity, self.size + count)
+        self.shot = np.resize(self.shot, capacity)
+        self.point = np.resize(self.point, capacity)
+        self.feature = np.resize(self.feature, (capacity, 2))
+        self.scale = np.resize(self.scale, capacity)
+        self.feature_id = np.resize(self.feature_id, capacity)
+        self.residual = np.resize(self.residual, (capacity, 3))
+        self.removed = np.resize(self.removed, capacity)
@@ -773,7 +773,6 @@ class Point(object):
         id (int): identification number.
         color (list(int)): list containing the RGB values.
         coordinates (list(real)): list containing the 3D position.
-        reprojection_errors (dict(real)): the reprojection error per shot.
     """
 
     def __init__(self):
@@ -781,7 +780,6 @@ class Point(object):
         self.id = None
         self.color = None
         self.coordinates = None
-        self.reprojection_errors = {}
 
 
 class GroundControlPoint(object):
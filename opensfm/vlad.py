@@ -3,19 +3,34 @@ import numpy as np
 from repoze.lru import LRUCache
 
 from opensfm import bow
+from opensfm import feature_loader
 
 
 def unnormalized_vlad(features, centers):
     """ Compute unnormalized VLAD histograms from a set of
         features in relation to centers.
 
+        Features are assigned to their nearest center using
+        |f - c|^2 = |f|^2 - 2 f.c + |c|^2, where |f|^2 doesn't
+        change the nearest center, so that all assignments come
+        from a single matrix product.
+
         Returns the unnormalized VLAD vector.
     """
-    vlad = np.zeros(centers.shape, dtype=np.float32)
-    for f in features:
-        i = np.argmin(np.linalg.norm(f-centers, axis=1))
-        vlad[i, :] += f-centers[i]
-    vlad = np.ndarray.flatten(vlad)
+    features = np.asarray(features, dtype=np.float64)
+    centers = np.asarray(centers, dtype=np.float64)
+    vlad = np.zeros(centers.shape)
+    if len(features) == 0:
+        return np.ndarray.flatten(vlad.astype(np.float32))
+
+    distances = (centers**2).sum(axis=1) - 2 * features.dot(centers.T)
+    assignments = np.argmin(distances, axis=1)
+
+    # Sum of residuals is the sum of features minus count times center
+    np.add.at(vlad, assignments, features)
+    counts = np.bincount(assignments, minlength=len(centers))
+    vlad -= counts[:, np.newaxis] * centers
+    vlad = np.ndarray.flatten(vlad.astype(np.float32))
     return vlad
 
 
@@ -63,13 +78,28 @@ class VladCache(object):
             self.word_cache.put('words', words)
         return words
 
-    def vlad_histogram(self, image, features, words):
+    def vlad_histogram(self, data, image):
+        """ Return the VLAD vector of an image, or None if it
+            has no features.
+
+            VLAD vectors are stored in the dataset, so that they
+            are only computed once.
+        """
         vlad = self.vlad_cache.get(image)
+        if vlad is not None:
+            return vlad
+
+        vlad = data.load_vlad(image)
         if vlad is None:
-            vlad = unnormalized_vlad(features, words)
+            _, features, _ = feature_loader.instance.load_points_features_colors(
+                data, image, masked=True)
+            if features is None:
+                return None
+            vlad = unnormalized_vlad(features, self.load_words(data))
             vlad = signed_square_root_normalize(vlad)
-            self.vlad_cache.put(image, vlad)
+            data.save_vlad(image, vlad)
+        self.vlad_cache.put(image, vlad)
         return vlad
 
 
-instance = VladCache()
\ No newline at end of file
+instance = VladCache()